@@ -0,0 +1,92 @@
+import basedatos
+
+# --- RESÚMENES PARA INFORMES (TABLAS `resumen_*`) ---
+#
+# Usuarios por país, popularidad de cada objetivo y registros por día. Los triggers
+# creados en la migración 7 los mantienen al día en la misma transacción que cada
+# alta de usuario, cambio de país o cambio de objetivos (registro, seleccionar_objetivos,
+# completar_objetivo e importar-usuarios), así que los informes solo leen estas tablas
+# pequeñas y su coste no crece con el número de usuarios.
+
+
+def reconstruir_resumenes(conn):
+    """
+    Recalcula los tres resúmenes desde usuarios y objetivos en una sola transacción: la
+    migración 7 los llena con los datos que ya había y `flask reconstruir-resumenes` los
+    rehace si un informe no cuadra con las tablas de origen.
+    Devuelve el número de filas de cada resumen.
+    """
+    with basedatos.transaccion(conn):
+        conn.execute('DELETE FROM resumen_paises')
+        conn.execute('''
+            INSERT INTO resumen_paises (pais, usuarios)
+            SELECT pais, COUNT(*) FROM usuarios GROUP BY pais
+        ''')
+        conn.execute('DELETE FROM resumen_registros_dia')
+        conn.execute('''
+            INSERT INTO resumen_registros_dia (dia, usuarios)
+            SELECT date(fecha_registro), COUNT(*) FROM usuarios GROUP BY date(fecha_registro)
+        ''')
+        conn.execute('DELETE FROM resumen_objetivos')
+        conn.execute('''
+            INSERT INTO resumen_objetivos (objetivo, usuarios, completados)
+            SELECT objetivo_texto, COUNT(*), SUM(completado != 0) FROM objetivos GROUP BY objetivo_texto
+        ''')
+    return {
+        tabla: conn.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+        for tabla in ('resumen_paises', 'resumen_registros_dia', 'resumen_objetivos')
+    }
+
+
+def ordenar_objetivos(objetivos):
+    """Objetivos de más a menos usuarios (y por nombre a igualdad de usuarios)."""
+    return sorted(objetivos, key=lambda objetivo: (-objetivo['usuarios'], objetivo['objetivo']))
+
+
+def resumen_objetivos(conn):
+    """Popularidad de cada objetivo: usuarios que lo tienen y cuántos lo han completado."""
+    filas = conn.execute(
+        'SELECT objetivo, usuarios, completados FROM resumen_objetivos WHERE usuarios > 0'
+    ).fetchall()
+    return ordenar_objetivos({'objetivo': fila[0], 'usuarios': fila[1], 'completados': fila[2]} for fila in filas)
+
+
+def informe(conn, dias=30):
+    """Usuarios por país, objetivos por popularidad y registros de los últimos `dias` días."""
+    paises = conn.execute(
+        'SELECT pais, usuarios FROM resumen_paises WHERE usuarios > 0 ORDER BY usuarios DESC, pais'
+    ).fetchall()
+    registros = conn.execute('''
+        SELECT dia, usuarios FROM resumen_registros_dia
+        WHERE dia >= date('now', ?) AND usuarios > 0 ORDER BY dia
+    ''', (f'-{int(dias) - 1} days',)).fetchall()
+    return {
+        'usuarios': sum(fila[1] for fila in paises),
+        'paises': [{'pais': fila[0], 'usuarios': fila[1]} for fila in paises],
+        'objetivos': resumen_objetivos(conn),
+        'registros_por_dia': [{'dia': fila[0], 'usuarios': fila[1]} for fila in registros],
+    }
+
+
+def combinar_informes(informes):
+    """
+    Suma los informes de varios archivos con usuarios distintos (las particiones del
+    almacenamiento particionado), con el mismo formato y orden que `informe`.
+    """
+    paises, objetivos, registros = {}, {}, {}
+    for parcial in informes:
+        for fila in parcial['paises']:
+            paises[fila['pais']] = paises.get(fila['pais'], 0) + fila['usuarios']
+        for fila in parcial['objetivos']:
+            total = objetivos.setdefault(fila['objetivo'], {'objetivo': fila['objetivo'], 'usuarios': 0, 'completados': 0})
+            total['usuarios'] += fila['usuarios']
+            total['completados'] += fila['completados']
+        for fila in parcial['registros_por_dia']:
+            registros[fila['dia']] = registros.get(fila['dia'], 0) + fila['usuarios']
+    return {
+        'usuarios': sum(paises.values()),
+        'paises': [{'pais': pais, 'usuarios': usuarios}
+                   for pais, usuarios in sorted(paises.items(), key=lambda item: (-item[1], item[0]))],
+        'objetivos': ordenar_objetivos(objetivos.values()),
+        'registros_por_dia': [{'dia': dia, 'usuarios': usuarios} for dia, usuarios in sorted(registros.items())],
+    }
@@ -1,216 +1,190 @@
+import contextlib
+import os
 import sqlite3
 import datetime
 from functools import wraps
-from flask import Flask, request, render_template, redirect, flash, make_response
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Blueprint, current_app, request, render_template, redirect, flash, make_response, jsonify, after_this_request
+import click
+from flask.cli import with_appcontext
 import jwt
-
-# --- CONFIGURACIÓN DE LA APLICACIÓN ---
-app = Flask(__name__)
-# ¡IMPORTANTE! Carga esta clave desde una variable de entorno en producción.
-app.config['SECRET_KEY'] = 'tu-super-secreto-y-largo-string-aleatorio' 
-app.config['DATABASE'] = 'db.db'
-
-# --- GESTIÓN Y CREACIÓN DE LA BASE DE DATOS ---
-
-def crear_tablas():
-    """
-    Se conecta a la base de datos y crea las tablas si no existen.
-    Esta función se ejecuta una vez al iniciar la aplicación.
-    """
-    conn = sqlite3.connect(app.config['DATABASE'])
-    cursor = conn.cursor()
-
-    # Crear la tabla de usuarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            pais TEXT NOT NULL,
-            objetivos TEXT,
-            fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-        );
-    ''')
-
-    # Crear la tabla de objetivos (aunque no se usa directamente en esta versión para almacenar múltiples objetivos)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS objetivos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            id_usuario INTEGER NOT NULL,
-            objetivo_texto TEXT NOT NULL,
-            completado BOOLEAN NOT NULL DEFAULT 0,
-            fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (id_usuario) REFERENCES usuarios (id)
-        );
-    ''')
-
-    conn.commit()
-    conn.close()
-    print("Base de datos y tablas verificadas/creadas en 'db.db'.")
-
-# Ejecuta la función para asegurar que las tablas existan al iniciar
-crear_tablas()
+import basedatos
+import contrasenas
+import tokens
+import objetivos as repo_objetivos
+import recomendaciones
+import historial
+import metricas
+import perfilado
+import estaticos
+import plantillas
+import compresion
+import disponibilidad
+import limites
+import carga_masiva
+import analitica
+import migraciones
+import repositorio
+from basedatos import get_db
+from repositorio import get_repositorio
+from cache import CacheLRU
+from contrasenas import PoolSaturado
+
+# Las páginas web se registran en este blueprint y la API JSON en `api`; crear_app() los
+# monta en cada aplicación que construye.
+web = Blueprint('web', __name__)
+
+
+def cache_usuarios():
+    """Caché de las filas de usuario usadas por token_required (una por aplicación)."""
+    return current_app.extensions['senda7_cache_usuarios']
+
+
+def cache_objetivos():
+    """Caché de los objetivos de cada usuario, por versión de sus objetivos (una por aplicación)."""
+    return current_app.extensions['senda7_cache_objetivos']
 
 
 # --- DECORADOR PARA AUTENTICACIÓN JWT ---
 
 def token_required(f):
     """
-    Decorador que verifica la validez de un token JWT en las cabeceras (o en este caso, cookies).
+    Decorador que verifica la validez de un token JWT en la cabecera Authorization (API)
+    o en las cookies (web).
+    Si el token está a punto de caducar se emite uno nuevo de forma transparente, y si ya ha
+    caducado se intenta renovar con el refresh token antes de mandar al usuario al login.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.cookies.get('token')
+        token_cabecera = tokens.token_de_cabecera(request)
+        if token_cabecera:
+            token, refresh_token = token_cabecera, None
+        else:
+            token = request.cookies.get(tokens.COOKIE_TOKEN)
+            refresh_token = request.cookies.get(tokens.COOKIE_REFRESH)
 
-        if not token:
-            flash("Se requiere un token para acceder a esta página. Por favor, inicia sesión.", "warning")
-            return redirect('/login')
+        if not token and not refresh_token:
+            return respuesta_no_autorizado("Se requiere un token para acceder a esta página. Por favor, inicia sesión.", "warning")
 
         try:
-            # Decodificar el token con la clave secreta y algoritmo
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            
-            # Conexión a la BD dentro del decorador para obtener el usuario actual
-            conn = sqlite3.connect(app.config['DATABASE'])
-            conn.row_factory = sqlite3.Row # Permite acceder a las columnas como diccionario
-            current_user = conn.execute(
-                'SELECT * FROM usuarios WHERE id = ?', (data['user_id'],)
-            ).fetchone()
-            conn.close()
-            
-            if not current_user:
-                flash("Token inválido. Usuario no encontrado.", "danger")
-                return redirect('/login')
+            if not token:
+                raise jwt.ExpiredSignatureError("Sin token de acceso")
+            # Decodificar el token (los tokens ya verificados se recuerdan hasta su caducidad)
+            with metricas.medir('jwt'):
+                data = tokens.decodificar_token(token)
+            user_id = data['user_id']
+            renovar = tokens.debe_renovarse(data)
 
         except jwt.ExpiredSignatureError:
-            flash("Tu sesión ha expirado. Por favor, inicia sesión de nuevo.", "warning")
-            # Redirige al login y borra la cookie si ha expirado
-            response = redirect('/login')
-            response.delete_cookie('token')
-            return response
+            # Se intenta renovar la sesión con el refresh token antes de pedir la contraseña
+            user_id = None
+            if refresh_token and current_app.config['REFRESH_TOKEN_ENABLED']:
+                user_id = tokens.usar_refresh_token(refresh_token)
+            if user_id is None:
+                return respuesta_no_autorizado("Tu sesión ha expirado. Por favor, inicia sesión de nuevo.", "warning")
+            renovar = True
         except jwt.InvalidTokenError:
-            flash("Token inválido. Por favor, inicia sesión de nuevo.", "danger")
-            # Redirige al login y borra la cookie si es inválido
-            response = redirect('/login')
-            response.delete_cookie('token')
-            return response
-
-        # Si el token es válido, pasa el objeto de usuario a la función decorada
-        return f(current_user, *args, **kwargs)
-
-    return decorated
-
-def generar_recomendacion(materia, horas, objetivo):
-    recomendaciones = []
-
-    recomendaciones.append(f"¡Excelente elección estudiando {materia}! Aquí tienes algunas recomendaciones para alcanzar tu objetivo de {objetivo}:")
-
-    # Recomendaciones basadas en horas de estudio
-    if horas < 2:
-        recomendaciones.append("Con menos de 2 horas al día, te recomendamos enfocarte en tareas clave y utilizar técnicas de estudio eficientes.")
-    elif horas < 4:
-        recomendaciones.append("Con 2 a 4 horas al día, puedes profundizar en el material y practicar con ejercicios adicionales.")
-    else:
-        recomendaciones.append("Con más de 4 horas al día, asegúrate de incluir descansos regulares para mantener la concentración y evitar el agotamiento.")
-
-    # Recomendaciones generales
-    recomendaciones.append("- Utiliza el método Pomodoro: 25 minutos de estudio seguidos de 5 minutos de descanso.")
-    recomendaciones.append("- Realiza resúmenes y repite la información en voz alta para reforzar el aprendizaje.")
-    recomendaciones.append("- Haz pruebas prácticas regularmente para evaluar tu comprensión.")
-    recomendaciones.append("- Revisa tus notas al final de cada sesión para consolidar el conocimiento.")
-
-    recomendaciones.append(f"Recuerda que el objetivo de {objetivo} es alcanzable con dedicación y una buena estrategia de estudio. ¡Buena suerte!")
-
-    return "\n".join(recomendaciones)
-
-def generar_recomendacion_tiempo(tareas, prioridades, bloques):
-    recomendaciones = []
-    recomendaciones.append("¡Excelente trabajo planificando tu tiempo! Aquí tienes algunas recomendaciones para mejorar tu gestión del tiempo:")
-
-    # Recomendaciones basadas en el número de bloques
-    if bloques < 4:
-        recomendaciones.append("Con menos de 4 bloques de tiempo, te recomendamos priorizar tareas importantes y evitar distracciones.")
-    elif bloques < 8:
-        recomendaciones.append("Con 4 a 8 bloques de tiempo, puedes abordar tareas más detalladas y complejas.")
-    else:
-        recomendaciones.append("Con más de 8 bloques de tiempo, asegúrate de incluir descansos regulares para mantener la productividad.")
-
-    # Otras recomendaciones generales
-    recomendaciones.append("- Utiliza la técnica Pomodoro para mantener la concentración.")
-    recomendaciones.append("- Revisa tus prioridades diariamente y ajústalas según sea necesario.")
-    recomendaciones.append("- Considera el uso de herramientas de gestión de tareas para mantenerte organizado.")
-
-    recomendaciones.append("Recuerda que la gestión efectiva del tiempo es clave para el éxito académico. ¡Buena suerte!")
-
-    return "\n".join(recomendaciones)
-
-def generar_recomendacion_emocional(emociones, estrategias, actividades):
-    recomendaciones = []
-    recomendaciones.append("¡Es fantástico que te enfoques en tu bienestar emocional! Aquí tienes algunas recomendaciones para mejorar tu bienestar:")
-
-    # Recomendaciones basadas en las estrategias y actividades
-    recomendaciones.append("- Practica regularmente las estrategias de manejo emocional que has mencionado.")
-    recomendaciones.append("- Incorpora actividades de relajación en tu rutina diaria para reducir el estrés.")
-    recomendaciones.append("- Considera la posibilidad de hablar con un profesional si sientes que tus emociones son abrumadoras.")
-
-    recomendaciones.append("Recuerda que el bienestar emocional es fundamental para una vida equilibrada. ¡Cuídate!")
-
-    return "\n".join(recomendaciones)
-
-def generar_recomendacion_espiritual(practicas, reflexiones, metas):
-    recomendaciones = []
-    recomendaciones.append("¡Es maravilloso que te enfoques en tu crecimiento espiritual! Aquí tienes algunas recomendaciones para avanzar en tu camino espiritual:")
-
-    # Recomendaciones basadas en las prácticas y reflexiones
-    recomendaciones.append("- Dedica tiempo diariamente a tus prácticas espirituales.")
-    recomendaciones.append("- Reflexiona sobre tus reflexiones diarias y cómo puedes aplicarlas en tu vida.")
-    recomendaciones.append("- Establece metas espirituales alcanzables y revísalas regularmente.")
-
-    recomendaciones.append("Recuerda que el crecimiento espiritual es un viaje continuo. ¡Sigue adelante!")
+            return respuesta_no_autorizado("Token inválido. Por favor, inicia sesión de nuevo.", "danger")
 
-    return "\n".join(recomendaciones)
+        # Primero se busca el usuario en la caché; solo si falla se consulta la BD
+        current_user = cache_usuarios().obtener(user_id)
+        if current_user is None:
+            current_user = get_repositorio().usuario_por_id(user_id)
+            if current_user:
+                cache_usuarios().guardar(user_id, current_user)
 
-def generar_recomendacion_habitos(habitos, acciones, duracion):
-    recomendaciones = []
-    recomendaciones.append("¡Es genial que te enfoques en desarrollar nuevos hábitos! Aquí tienes algunas recomendaciones para facilitar el proceso:")
+        if not current_user:
+            return respuesta_no_autorizado("Token inválido. Usuario no encontrado.", "danger")
 
-    # Recomendaciones basadas en la duración y acciones
-    recomendaciones.append(f"- Comienza con una duración de {duracion} minutos y aumenta gradualmente según sea necesario.")
-    recomendaciones.append("- Realiza las acciones diarias de manera consistente para consolidar el hábito.")
-    recomendaciones.append("- Establece recordatorios o alarmas para no olvidar tus hábitos diarios.")
+        if renovar:
+            nuevo_token = tokens.emitir_token(user_id)
 
-    recomendaciones.append("Recuerda que el desarrollo de hábitos lleva tiempo y esfuerzo. ¡Persevera!")
+            @after_this_request
+            def renovar_token(response):
+                # Los clientes de la API reciben el token nuevo en una cabecera; la web, en la cookie
+                if token_cabecera:
+                    response.headers[tokens.CABECERA_TOKEN_RENOVADO] = nuevo_token
+                    return response
+                return tokens.establecer_cookies(response, nuevo_token)
 
-    return "\n".join(recomendaciones)
-
-def generar_recomendacion_reflexion_proposito(reflexion, proposito):
-    recomendaciones = []
-    recomendaciones.append("¡Es importante reflexionar sobre tu propósito! Aquí tienes algunas recomendaciones para profundizar en tu reflexión y propósito:")
+        # Si el token es válido, pasa el objeto de usuario a la función decorada
+        return f(current_user, *args, **kwargs)
 
-    # Recomendaciones basadas en la reflexión y propósito
-    recomendaciones.append("- Tómate un tiempo cada semana para revisar tus reflexiones y ajustar tu propósito según sea necesario.")
-    recomendaciones.append("- Considera la posibilidad de compartir tus reflexiones con alguien de confianza para obtener perspectivas adicionales.")
-    recomendaciones.append("- Establece acciones concretas basadas en tu propósito para avanzar hacia tus metas.")
+    return decorated
 
-    recomendaciones.append("Recuerda que la reflexión constante y el propósito claro son fundamentales para una vida significativa. ¡Sigue reflexionando!")
+def respuesta_no_autorizado(mensaje, categoria):
+    """Respuesta de autenticación fallida: JSON 401 para la API, redirección al login para la web."""
+    if request.blueprint == 'api':
+        return jsonify(error=mensaje), 401
+    flash(mensaje, categoria)
+    # Redirige al login y borra las cookies de sesión
+    return tokens.borrar_cookies(redirect('/login'))
 
-    return "\n".join(recomendaciones)
+def objetivos_usuario(id_usuario):
+    """
+    Devuelve los objetivos del usuario y su progreso, usando la caché de objetivos.
+    El progreso sale de los contadores del usuario, nunca de un COUNT(*). En la misma
+    lectura llega la versión de sus objetivos, que cualquier trabajador sube al cambiarlos:
+    la lista en caché solo se usa si se guardó con esa misma versión.
+    """
+    repo = get_repositorio()
+    completados, total, version = repo.cargar_progreso_version(id_usuario)
+    lista = cache_objetivos().obtener(id_usuario, version=version)
+    if lista is None:
+        lista = repo.cargar_objetivos(id_usuario)
+        cache_objetivos().guardar(id_usuario, lista, version=version)
+    return {
+        'objetivos': lista,
+        'completados': completados,
+        'total': total,
+        'porcentaje': repo_objetivos.porcentaje_progreso(completados, total),
+    }
+
+def recomendar_y_guardar(current_user, categoria, **datos):
+    """Genera la recomendación y la guarda (de forma diferida) en el historial del usuario."""
+    recomendacion = recomendaciones.generar(categoria, **datos)
+    historial.registrar(current_user['id'], categoria, datos, recomendacion)
+    return recomendacion
+
+def procesar_formulario(current_user, categoria):
+    """Valida los datos enviados y devuelve la recomendación, o el mensaje de error de validación."""
+    limite = limites.excedido('recomendaciones', current_user)
+    if limite:
+        return limite
+    datos, error = recomendaciones.validar(categoria, request.form)
+    if error:
+        return error
+    return recomendar_y_guardar(current_user, categoria, **datos)
+
+def mensaje_usuario_ocupado(usuario):
+    return f"El usuario '{usuario}' ya está registrado. Intenta con otro."
+
+def respuesta_servidor_ocupado(plantilla):
+    """Respuesta rápida cuando el pool de hashing está saturado, en lugar de encolar la petición."""
+    flash("El servidor está muy ocupado en este momento. Inténtalo de nuevo en unos segundos.", "warning")
+    response = make_response(render_template(plantilla), 503)
+    response.headers['Retry-After'] = '2'
+    return response
 
 # --- RUTAS DE LA APLICACIÓN ---
 
-@app.route('/')
+@web.route('/')
 def home():
     """Página de inicio que redirige al registro."""
     return redirect('/registro')
 
-@app.route('/registro', methods=['GET', 'POST'])
+@web.route('/registro', methods=['GET', 'POST'])
 def registro():
     """
     Página de registro de nuevos usuarios.
     Ahora, al registrarse exitosamente, inicia sesión automáticamente y redirige a /bienvenida.
     """
     if request.method == 'POST':
+        # Antes de validar y de calcular el hash, que es lo caro
+        limite = limites.excedido('registro')
+        if limite:
+            flash(limite, 'warning')
+            return render_template('registro.html')
+
         usuario = request.form['usuario']
         password = request.form['password']
         confirmar = request.form['confirmar']
@@ -223,131 +197,134 @@ def registro():
         if password != confirmar:
             errores.append("Las contraseñas no coinciden.")
         
-        conn = sqlite3.connect(app.config['DATABASE'])
-        conn.row_factory = sqlite3.Row # Para obtener el usuario por su nombre más tarde
-        
-        usuario_existente = conn.execute(
-            'SELECT id FROM usuarios WHERE usuario = ?', (usuario,)
-        ).fetchone()
-
-        if usuario_existente:
-            errores.append(f"El usuario '{usuario}' ya está registrado. Intenta con otro.")
+        # El índice en memoria evita calcular el hash para un nombre que ya sabemos ocupado
+        if usuario and disponibilidad.get_indice().existe(usuario, get_repositorio()):
+            errores.append(mensaje_usuario_ocupado(usuario))
 
         if errores:
-            conn.close()
             for error in errores:
                 flash(error, 'danger')
             return render_template('registro.html')
 
         try:
-            # Insertar el nuevo usuario
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO usuarios (usuario, password, pais) VALUES (?, ?, ?)",
-                (usuario, generate_password_hash(password), pais),
-            )
-            conn.commit()
-
-            # Obtener el ID del usuario recién registrado
-            new_user_id = cursor.lastrowid
-            
-            # Obtener el objeto de usuario completo para generar el token
-            new_user = conn.execute(
-                'SELECT * FROM usuarios WHERE id = ?', (new_user_id,)
-            ).fetchone()
-
-            if new_user:
-                # Generar el token JWT para el nuevo usuario
-                token = jwt.encode({
-                    'user_id': new_user['id'],
-                    'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1) # Token válido por 1 hora
-                }, app.config['SECRET_KEY'], algorithm="HS256")
-                
-                # Crear la respuesta de redirección y establecer la cookie
-                response = make_response(redirect('/bienvenida'))
-                response.set_cookie('token', token, httponly=True, samesite='Lax') # httponly para seguridad, samesite para protección CSRF
-                
-                flash(f"¡Registro exitoso! Bienvenido, {new_user['Usuario']}.", 'success')
-                return response
-            else:
-                flash("Error al recuperar el usuario registrado para iniciar sesión.", "danger")
-                return render_template('registro.html')
+            # El hash se calcula en el pool de procesos, fuera del hilo de la petición
+            password_hash = contrasenas.generar_hash(password)
+        except PoolSaturado:
+            return respuesta_servidor_ocupado('registro.html')
 
+        try:
+            new_user = get_repositorio().crear_usuario(usuario, password_hash, pais)
+        except repositorio.UsuarioDuplicado:
+            flash(mensaje_usuario_ocupado(usuario), 'danger')
+            return render_template('registro.html')
         except sqlite3.Error as e:
             flash(f"Error en la base de datos: {e}", "danger")
             print(e)
             return render_template('registro.html')
-        finally:
-            conn.close()
+
+        disponibilidad.get_indice().agregar(usuario)
+
+        # Generar el token JWT (y el refresh token) para el nuevo usuario
+        token = tokens.emitir_token(new_user['id'])
+        refresh_token = tokens.crear_refresh_token(new_user['id']) if current_app.config['REFRESH_TOKEN_ENABLED'] else None
+
+        # Crear la respuesta de redirección y establecer las cookies (httponly y samesite)
+        response = make_response(redirect('/bienvenida'))
+        tokens.establecer_cookies(response, token, refresh_token)
+
+        flash(f"¡Registro exitoso! Bienvenido, {new_user['usuario']}.", 'success')
+        return response
 
     return render_template('registro.html')
 
+@web.route('/registro/disponible')
+def registro_disponible():
+    """
+    Comprueba si un nombre de usuario está libre, para avisar mientras se rellena el registro.
+    Responde desde el índice en memoria; el registro lo vuelve a comprobar al insertar.
+    """
+    usuario = request.args.get('usuario', '')
+    if not usuario:
+        return jsonify(error="El parámetro 'usuario' es obligatorio."), 400
+    ocupado = disponibilidad.get_indice().existe(usuario, get_repositorio())
+    return jsonify(usuario=usuario, disponible=not ocupado)
+
+
+def autenticar(usuario, password):
+    """
+    Comprueba usuario y contraseña (en el pool de hashing) y devuelve la fila del usuario o None.
+    Si el hash guardado usa parámetros antiguos, se regenera con los actuales.
+    Puede lanzar PoolSaturado.
+    """
+    user = get_repositorio().usuario_por_nombre(usuario)
+
+    if user is None or not contrasenas.verificar_hash(user['password'], password):
+        return None
+
+    if contrasenas.necesita_rehash(user['password']):
+        try:
+            get_repositorio().actualizar_password(user['id'], contrasenas.generar_hash(password))
+            cache_usuarios().invalidar(user['id'])
+        except (PoolSaturado, sqlite3.Error) as e:
+            # No es crítico: se volverá a intentar en el próximo inicio de sesión
+            print(f"No se pudo actualizar el hash del usuario {user['id']}: {e}")
 
-@app.route('/login', methods=['GET', 'POST'])
+    return user
+
+@web.route('/login', methods=['GET', 'POST'])
 def login():
     """
     Página de inicio de sesión.
     Ahora, al iniciar sesión exitosamente, redirige a /bienvenida.
     """
     if request.method == 'POST':
+        limite = limites.excedido('login')
+        if limite:
+            flash(limite, 'warning')
+            return render_template('login.html')
+
         usuario_form = request.form['usuario']
         password_form = request.form['password']
         
-        conn = sqlite3.connect(app.config['DATABASE'])
-        conn.row_factory = sqlite3.Row
-        user = conn.execute(
-            'SELECT * FROM usuarios WHERE usuario = ?', (usuario_form,)
-        ).fetchone()
-        conn.close()
-
-        if not user or not check_password_hash(user['password'], password_form):
+        try:
+            user = autenticar(usuario_form, password_form)
+        except PoolSaturado:
+            return respuesta_servidor_ocupado('login.html')
+
+        if not user:
             flash('Usuario o contraseña incorrectos.', 'danger')
             return render_template('login.html')
 
-        # Generar el token JWT
-        token = jwt.encode({
-            'user_id': user['id'],
-            'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1) # Token válido por 1 hora
-        }, app.config['SECRET_KEY'], algorithm="HS256")
+        # Generar el token JWT y el refresh token
+        token = tokens.emitir_token(user['id'])
+        refresh_token = tokens.crear_refresh_token(user['id']) if current_app.config['REFRESH_TOKEN_ENABLED'] else None
         
-        # Crear la respuesta de redirección y establecer la cookie
+        # Crear la respuesta de redirección y establecer las cookies
         response = make_response(redirect('/panel')) # Redirige a bienvenida
-        response.set_cookie('token', token, httponly=True, samesite='Lax')
-        flash(f"¡Bienvenido de nuevo, {user['Usuario']}!", 'success')
+        tokens.establecer_cookies(response, token, refresh_token)
+        flash(f"¡Bienvenido de nuevo, {user['usuario']}!", 'success')
         return response
 
     return render_template('login.html')
 
-@app.route('/bienvenida')
+@web.route('/bienvenida')
 @token_required
 def bienvenida(current_user):
     """Página de bienvenida después de iniciar sesión o registrarse."""
-    return render_template('bienvenida.html', nombre_usuario=current_user['Usuario'])
+    return render_template('bienvenida.html', nombre_usuario=current_user['usuario'])
 
-@app.route('/panel')
+@web.route('/panel')
 @token_required
 def panel(current_user):
     """Panel de usuario, ruta protegida por JWT."""
-    db = sqlite3.connect(app.config['DATABASE'])
-    cursor = db.cursor()
-    try:
-        # Obtener los objetivos del usuario actual
-        cursor.execute("SELECT objetivos FROM usuarios WHERE usuario = ?", (current_user['Usuario'],))
-        result = cursor.fetchone()
-        if result:
-            objetivos = result[0].split(";")
-        else:
-            objetivos = "No se encontraron objetivos para este usuario."
-    except sqlite3.Error as e:
-        flash("Error al acceder a la base de datos.")
-        objetivos = "Error al cargar los objetivos."
-    finally:
-        cursor.close()
-    
-    return render_template('panel.html', nombre_usuario=current_user['Usuario'], objetivos=objetivos)
+    # Los objetivos y el progreso se leen de la caché; solo se consulta la BD tras un cambio
+    datos = objetivos_usuario(current_user['id'])
+
+    return render_template('panel.html', nombre_usuario=current_user['usuario'], objetivos=datos['objetivos'],
+                           porcentaje=datos['porcentaje'])
 
 
-@app.route('/seleccionar_objetivos', methods=['GET', 'POST'])
+@web.route('/seleccionar_objetivos', methods=['GET', 'POST'])
 @token_required
 def seleccionar_objetivos(current_user):
     """Página para establecer objetivos, ruta protegida."""
@@ -361,174 +338,509 @@ def seleccionar_objetivos(current_user):
             flash("Selecciona al menos dos objetivos.")
             return redirect('/panel')
         if objetivos_seleccionados:
-            objetivos_str = ";".join(objetivos_seleccionados)
-            conn = sqlite3.connect(app.config['DATABASE'])
             try:
-                # Actualizar el campo 'objetivos' del usuario actual
-                conn.execute('UPDATE usuarios SET objetivos = ? WHERE id = ?', 
-                             (objetivos_str, current_user['id']))
-                conn.commit()
+                # Guardar solo la diferencia con los objetivos actuales del usuario
+                get_repositorio().guardar_objetivos(current_user['id'], objetivos_seleccionados)
+                cache_objetivos().invalidar(current_user['id'])
                 flash('Objetivo guardado correctamente.', 'success')
                 return redirect('/panel')
             except sqlite3.Error as e:
                 flash(f"Error al guardar el objetivo: {e}", "danger")
-            finally:
-                conn.close()
         else:
             flash("Debes escribir un objetivo.", "warning")
 
     # Obtener el objetivo actual del usuario para mostrarlo en el formulario
-    current_objetivo = current_user['objetivos'] if current_user and 'objetivos' in current_user else ''
-    return render_template('objetivos.html', nombre_usuario=current_user['Usuario'], current_objetivo=current_objetivo)
+    current_objetivo = [objetivo['texto'] for objetivo in objetivos_usuario(current_user['id'])['objetivos']]
+    return render_template('objetivos.html', nombre_usuario=current_user['usuario'], current_objetivo=current_objetivo)
 
-@app.route('/organizacion', methods=['GET', 'POST'])
+@web.route('/completar_objetivo', methods=['POST'])
+@token_required
+def completar_objetivo(current_user):
+    """Marca o desmarca un objetivo del usuario como completado."""
+    objetivo = request.form.get('objetivo')
+    completado = request.form.get('completado', '1') == '1'
+    try:
+        if not objetivo or not get_repositorio().marcar_completado(current_user['id'], objetivo, completado):
+            flash("Objetivo no encontrado.", "warning")
+        cache_objetivos().invalidar(current_user['id'])
+    except sqlite3.Error as e:
+        flash(f"Error al actualizar el objetivo: {e}", "danger")
+    return redirect('/panel')
+
+@web.route('/organizacion', methods=['GET', 'POST'])
 @token_required
 def organizacion(current_user):
     """Página de organización, ruta protegida."""
     recomendacion = None
     if request.method == 'POST':
-        # Obtener datos del formulario
-        materia = request.form.get('materia')
-        horas = request.form.get('horas')
-        objetivo = request.form.get('objetivo')
-
-        # Validar datos
-        if not materia or not horas or not objetivo:
-            recomendacion = "Por favor, completa todos los campos del formulario."
-        else:
-            try:
-                horas = int(horas)
-                if horas <= 0:
-                    recomendacion = "Por favor, ingresa un número de horas válido."
-                else:
-                    # Lógica de recomendación
-                    recomendacion = generar_recomendacion(materia, horas, objetivo)
-            except ValueError:
-                recomendacion = "Por favor, ingresa un número válido para las horas de estudio."
-
-    return render_template('organizacion.html', recomendacion=recomendacion, nombre_usuario=current_user['Usuario'])
-
-@app.route('/bienestar_emocional', methods=['GET', 'POST'])
+        # Validación y recomendación compartidas con la API
+        recomendacion = procesar_formulario(current_user, 'organizacion')
+
+    return render_template('organizacion.html', recomendacion=recomendacion, nombre_usuario=current_user['usuario'])
+
+@web.route('/bienestar_emocional', methods=['GET', 'POST'])
 @token_required
 def bienestar_emocional(current_user):
     """Página de bienestar emocional, ruta protegida."""
     recomendacion = None
     if request.method == 'POST':
-        emociones = request.form.get('emociones')
-        estrategias = request.form.get('estrategias')
-        actividades = request.form.get('actividades')
+        # Validación y recomendación compartidas con la API
+        recomendacion = procesar_formulario(current_user, 'bienestar_emocional')
 
-        # Validación básica
-        if not emociones or not estrategias or not actividades:
-            recomendacion = "Por favor, completa todos los campos."
-        else:
-            # Lógica de recomendación
-            recomendacion = generar_recomendacion_emocional(emociones, estrategias, actividades)
-
-    return render_template('bienestar_emocional.html', recomendacion=recomendacion, nombre_usuario=current_user['Usuario'])
+    return render_template('bienestar_emocional.html', recomendacion=recomendacion, nombre_usuario=current_user['usuario'])
 
 # Endpoint para la gestión de tiempo
-@app.route('/gestion_tiempo', methods=['GET', 'POST'])
+@web.route('/gestion_tiempo', methods=['GET', 'POST'])
 @token_required
 def gestion_tiempo(current_user):
     """Página de gestión de tiempo, ruta protegida."""
     recomendacion = None
     if request.method == 'POST':
-        tareas = request.form.get('tareas')
-        prioridades = request.form.get('prioridades')
-        bloques = request.form.get('bloques')
-
-        # Validación básica
-        if not tareas or not prioridades or not bloques:
-            recomendacion = "Por favor, completa todos los campos."
-        else:
-            try:
-                bloques = int(bloques)
-                if bloques <= 0:
-                    recomendacion = "Por favor, ingresa un número válido de bloques de tiempo."
-                else:
-                    # Lógica de recomendación
-                    recomendacion = generar_recomendacion_tiempo(tareas, prioridades, bloques)
-            except ValueError:
-                recomendacion = "Por favor, ingresa un número válido para los bloques de tiempo."
+        # Validación y recomendación compartidas con la API
+        recomendacion = procesar_formulario(current_user, 'gestion_tiempo')
 
-    return render_template('gestion_tiempo.html', recomendacion=recomendacion, nombre_usuario=current_user['Usuario'])
+    return render_template('gestion_tiempo.html', recomendacion=recomendacion, nombre_usuario=current_user['usuario'])
 
 # Endpoint para el crecimiento espiritual
-@app.route('/crecimiento_espiritual', methods=['GET', 'POST'])
+@web.route('/crecimiento_espiritual', methods=['GET', 'POST'])
 @token_required
 def crecimiento_espiritual(current_user):
     """Página de crecimiento espiritual, ruta protegida."""
     recomendacion = None
     if request.method == 'POST':
-        practicas = request.form.get('practicas')
-        reflexiones = request.form.get('reflexiones')
-        metas = request.form.get('metas')
-
-        # Validación básica
-        if not practicas or not reflexiones or not metas:
-            recomendacion = "Por favor, completa todos los campos."
-        else:
-            # Lógica de recomendación
-            recomendacion = generar_recomendacion_espiritual(practicas, reflexiones, metas)
+        # Validación y recomendación compartidas con la API
+        recomendacion = procesar_formulario(current_user, 'crecimiento_espiritual')
 
-    return render_template('crecimiento_espiritual.html', recomendacion=recomendacion, nombre_usuario=current_user['Usuario'])
+    return render_template('crecimiento_espiritual.html', recomendacion=recomendacion, nombre_usuario=current_user['usuario'])
 
 # Endpoint para el desarrollo de hábitos
-@app.route('/desarrollo_habitos', methods=['GET', 'POST'])
+@web.route('/desarrollo_habitos', methods=['GET', 'POST'])
 @token_required
 def desarrollo_habitos(current_user):
     """Página de desarrollo de hábitos, ruta protegida."""
     recomendacion = None
     if request.method == 'POST':
-        habitos = request.form.get('habitos')
-        acciones = request.form.get('acciones')
-        duracion = request.form.get('duracion')
+        # Validación y recomendación compartidas con la API
+        recomendacion = procesar_formulario(current_user, 'desarrollo_habitos')
 
-        # Validación básica
-        if not habitos or not acciones or not duracion:
-            recomendacion = "Por favor, completa todos los campos."
-        else:
-            try:
-                duracion = int(duracion)
-                if duracion <= 0:
-                    recomendacion = "Por favor, ingresa un número válido para la duración del hábito."
-                else:
-                    # Lógica de recomendación
-                    recomendacion = generar_recomendacion_habitos(habitos, acciones, duracion)
-            except ValueError:
-                recomendacion = "Por favor, ingresa un número válido para la duración del hábito."
-
-    return render_template('desarrollo_habitos.html', recomendacion=recomendacion, nombre_usuario=current_user['Usuario'])
+    return render_template('desarrollo_habitos.html', recomendacion=recomendacion, nombre_usuario=current_user['usuario'])
 
 # Endpoint para la reflexión y propósito
-@app.route('/reflexion_proposito', methods=['GET', 'POST'])
+@web.route('/reflexion_proposito', methods=['GET', 'POST'])
 @token_required
 def reflexion_proposito(current_user):
     """Página de reflexión y propósito, ruta protegida."""
     recomendacion = None
     if request.method == 'POST':
-        reflexion = request.form.get('reflexion')
-        proposito = request.form.get('proposito')
-
-        # Validación básica
-        if not reflexion or not proposito:
-            recomendacion = "Por favor, completa todos los campos."
-        else:
-            # Lógica de recomendación
-            recomendacion = generar_recomendacion_reflexion_proposito(reflexion, proposito)
+        # Validación y recomendación compartidas con la API
+        recomendacion = procesar_formulario(current_user, 'reflexion_proposito')
 
-    return render_template('reflexion_proposito.html', recomendacion=recomendacion, nombre_usuario=current_user['Usuario'])
+    return render_template('reflexion_proposito.html', recomendacion=recomendacion, nombre_usuario=current_user['usuario'])
 
-@app.route('/logout')
+@web.route('/historial')
+@token_required
+def ver_historial(current_user):
+    """Historial paginado de formularios enviados y recomendaciones, ruta protegida."""
+    antes = request.args.get('antes', type=int)
+    registros, siguiente = get_repositorio().cargar_historial(
+        current_user['id'], antes=antes, limite=current_app.config['HISTORY_PAGE_SIZE']
+    )
+    return render_template('historial.html', nombre_usuario=current_user['usuario'],
+                           registros=registros, siguiente=siguiente)
+
+@web.route('/estadisticas/cache')
+@token_required
+def estadisticas_cache(current_user):
+    """Contadores de aciertos y fallos de las cachés en memoria, para dimensionarlas."""
+    return jsonify(usuarios=cache_usuarios().estadisticas(), objetivos=cache_objetivos().estadisticas(),
+                   recomendaciones=recomendaciones.get_motor().estadisticas(),
+                   historial=historial.get_escritor().estadisticas(),
+                   indice_usuarios=disponibilidad.get_indice().estadisticas())
+
+@web.route('/metrics')
+def exportar_metricas():
+    """Métricas de todos los trabajadores en el formato de texto de Prometheus."""
+    extension = current_app.extensions['senda7_metricas']
+    respuesta = make_response(metricas.exportar_prometheus(extension.instantanea_global()))
+    respuesta.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return respuesta
+
+@web.route('/logout')
 def logout():
-    """Cierra la sesión eliminando la cookie del token."""
-    response = redirect('/login')
-    response.delete_cookie('token')
+    """Cierra la sesión revocando el refresh token y eliminando las cookies."""
+    refresh_token = request.cookies.get(tokens.COOKIE_REFRESH)
+    if refresh_token:
+        tokens.revocar_refresh_token(refresh_token)
+    response = tokens.borrar_cookies(redirect('/login'))
     flash("Has cerrado sesión correctamente.", 'info')
     return response
 
+# --- API JSON (v1) ---
+# Misma validación, autenticación (token_required con cabecera Authorization: Bearer)
+# y lógica que las páginas, pero sin renderizar plantillas.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def error_api(mensaje, estado):
+    return jsonify(error=mensaje), estado
+
+def cuerpo_json():
+    """Cuerpo JSON de la petición si es un objeto; None si falta, no es JSON o es de otro tipo."""
+    datos = request.get_json(silent=True)
+    return datos if isinstance(datos, dict) else None
+
+@api.route('/login', methods=['POST'])
+def api_login():
+    """Inicio de sesión para clientes de la API; devuelve el token de acceso y el refresh token."""
+    limite = limites.excedido('login')
+    if limite:
+        return error_api(limite, 429)
+    datos = cuerpo_json()
+    if datos is None:
+        return error_api("El cuerpo debe ser un objeto JSON.", 400)
+    if not all(isinstance(datos.get(campo), str) and datos[campo] for campo in ('usuario', 'password')):
+        return error_api("Los campos 'usuario' y 'password' son obligatorios y deben ser texto.", 400)
+
+    try:
+        user = autenticar(datos['usuario'], datos['password'])
+    except PoolSaturado:
+        response = make_response(error_api("El servidor está muy ocupado. Inténtalo de nuevo en unos segundos.", 503))
+        response.headers['Retry-After'] = '2'
+        return response
+
+    if not user:
+        return error_api("Usuario o contraseña incorrectos.", 401)
+
+    refresh_token = tokens.crear_refresh_token(user['id']) if current_app.config['REFRESH_TOKEN_ENABLED'] else None
+    return jsonify(
+        token=tokens.emitir_token(user['id']),
+        refresh_token=refresh_token,
+        expira_en=int(current_app.config['TOKEN_LIFETIME'].total_seconds()),
+    )
+
+@api.route('/token/renovar', methods=['POST'])
+def api_renovar_token():
+    """Emite un token de acceso nuevo a partir de un refresh token válido."""
+    datos = cuerpo_json()
+    if datos is None:
+        return error_api("El cuerpo debe ser un objeto JSON.", 400)
+    refresh_token = datos.get('refresh_token')
+    if refresh_token is not None and not isinstance(refresh_token, str):
+        return error_api("El campo 'refresh_token' debe ser texto.", 400)
+    user_id = tokens.usar_refresh_token(refresh_token) if refresh_token and current_app.config['REFRESH_TOKEN_ENABLED'] else None
+    if user_id is None:
+        return error_api("Refresh token inválido o caducado.", 401)
+    return jsonify(token=tokens.emitir_token(user_id), expira_en=int(current_app.config['TOKEN_LIFETIME'].total_seconds()))
+
+@api.route('/panel')
+@token_required
+def api_panel(current_user):
+    """Datos del panel: usuario, objetivos y progreso."""
+    datos = objetivos_usuario(current_user['id'])
+    return jsonify(
+        usuario=current_user['usuario'],
+        pais=current_user['pais'],
+        objetivos=datos['objetivos'],
+        progreso={'completados': datos['completados'], 'total': datos['total'], 'porcentaje': datos['porcentaje']},
+    )
+
+def recomendacion_api(current_user, categoria, entrada):
+    """Valida y genera una recomendación; devuelve (resultado, código de estado)."""
+    if not isinstance(categoria, str):
+        return {'categoria': categoria, 'error': "La categoría debe ser un texto."}, 400
+    if categoria not in recomendaciones.get_motor().categorias:
+        return {'categoria': categoria, 'error': "Categoría desconocida."}, 404
+    if not isinstance(entrada, dict):
+        return {'categoria': categoria, 'error': "Los datos deben ser un objeto JSON."}, 400
+    datos, error = recomendaciones.validar(categoria, entrada)
+    if error:
+        return {'categoria': categoria, 'error': error}, 400
+    return {'categoria': categoria, 'recomendacion': recomendar_y_guardar(current_user, categoria, **datos)}, 200
+
+@api.route('/recomendaciones/<categoria>', methods=['POST'])
+@token_required
+def api_recomendacion(current_user, categoria):
+    """Genera la recomendación de una categoría a partir de un objeto JSON con sus campos."""
+    limite = limites.excedido('recomendaciones', current_user)
+    if limite:
+        return error_api(limite, 429)
+    resultado, estado = recomendacion_api(current_user, categoria, request.get_json(silent=True))
+    return jsonify(resultado), estado
+
+@api.route('/recomendaciones', methods=['POST'])
+@token_required
+def api_recomendaciones_lote(current_user):
+    """
+    Genera varias recomendaciones en una sola petición.
+    Cuerpo: {"peticiones": [{"categoria": "...", "datos": {...}}, ...]}.
+    Cada resultado lleva su propio 'error' si su entrada no es válida.
+    """
+    peticiones = (cuerpo_json() or {}).get('peticiones')
+    if not isinstance(peticiones, list):
+        return error_api("Se esperaba una lista 'peticiones'.", 400)
+    if len(peticiones) > current_app.config['API_BATCH_MAX']:
+        return error_api(f"Como máximo {current_app.config['API_BATCH_MAX']} peticiones por lote.", 413)
+    # Cada recomendación del lote cuenta para el límite como una petición
+    limite = limites.excedido('recomendaciones', current_user, coste=len(peticiones))
+    if limite:
+        return error_api(limite, 429)
+
+    resultados = []
+    for peticion in peticiones:
+        if not isinstance(peticion, dict):
+            resultados.append({'error': "Cada petición debe ser un objeto JSON."})
+            continue
+        resultado, _ = recomendacion_api(current_user, peticion.get('categoria'), peticion.get('datos'))
+        resultados.append(resultado)
+    return jsonify(resultados=resultados)
+
+@api.route('/informes/resumen')
+@token_required
+def api_informe_resumen(current_user):
+    """
+    Usuarios por país, popularidad de los objetivos y registros por día de los últimos
+    `dias` días. Solo lee las tablas de resumen, así que no recorre usuarios ni objetivos.
+    """
+    dias = request.args.get('dias', 30, type=int)
+    if not 1 <= dias <= current_app.config['REPORT_MAX_DAYS']:
+        return error_api(f"'dias' debe estar entre 1 y {current_app.config['REPORT_MAX_DAYS']}.", 400)
+    return jsonify(get_repositorio().informe(dias))
+
+# --- COMANDOS ---
+
+@click.command('migrar')
+@with_appcontext
+def migrar_command():
+    """Aplica las migraciones pendientes del esquema (antes de arrancar los trabajadores)."""
+    aplicadas = repositorio.migrar(current_app.config)
+    if not any(aplicadas.values()):
+        print(f"La base de datos ya está en la versión {migraciones.VERSION_ACTUAL}.")
+
+@click.command('reconciliar-progreso')
+@with_appcontext
+def reconciliar_progreso_command():
+    """Reconstruye los contadores de progreso de todos los usuarios (en cada partición, si las hay)."""
+    usuarios = 0
+    for ruta in repositorio.rutas(current_app.config):
+        with contextlib.closing(sqlite3.connect(ruta)) as conn:
+            usuarios += repo_objetivos.reconciliar_progreso(conn)
+    print(f"Contadores de progreso reconstruidos para {usuarios} usuarios.")
+
+@click.command('reconstruir-resumenes')
+@with_appcontext
+def reconstruir_resumenes_command():
+    """Recalcula las tablas de resumen de los informes desde usuarios y objetivos (y en cada partición)."""
+    for ruta in repositorio.rutas(current_app.config):
+        with contextlib.closing(sqlite3.connect(ruta)) as conn:
+            filas = analitica.reconstruir_resumenes(conn)
+        for tabla, cantidad in filas.items():
+            print(f"{ruta} {tabla}: {cantidad} filas.")
+
+@click.command('repartir-datos')
+@with_appcontext
+def repartir_datos_command():
+    """Copia a las particiones los usuarios de DATABASE que aún no tienen, con sus objetivos, sesiones e historial."""
+    if current_app.config['STORAGE_BACKEND'] != 'particionado':
+        raise click.ClickException("Solo tiene sentido con STORAGE_BACKEND = 'particionado'.")
+    repositorio.migrar(current_app.config)
+    for ruta, copiados in repositorio.repartir(current_app.config).items():
+        print(f"{ruta}: " + ", ".join(f"{filas} filas de {tabla}" for tabla, filas in copiados.items()) + " copiadas.")
+
+@click.command('informe-perfiles')
+@click.argument('salida', default='informe_perfiles')
+@with_appcontext
+def informe_perfiles_command(salida):
+    """Combina los volcados de PROFILE_DIR en un informe por endpoint (.txt, .prof y .folded)."""
+    resumen = perfilado.informe(current_app.config['PROFILE_DIR'], salida)
+    if not resumen:
+        print(f"No hay perfiles en '{current_app.config['PROFILE_DIR']}'.")
+    for endpoint, peticiones in resumen.items():
+        print(f"{endpoint}: {peticiones} peticiones -> {os.path.join(salida, endpoint)}.txt")
+
+@click.command('importar-usuarios')
+@click.argument('archivo')
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help="por defecto, según la extensión")
+@click.option('--lote', default=1000, show_default=True, help="usuarios por transacción")
+@click.option('--procesos', type=int, help="procesos para los hashes (por defecto, uno por CPU)")
+@click.option('--duplicados', type=click.Choice(carga_masiva.DUPLICADOS), default='omitir', show_default=True)
+@with_appcontext
+def importar_usuarios_command(archivo, formato, lote, procesos, duplicados):
+    """
+    Importa usuarios desde CSV (con cabecera) o JSON Lines ('-' para la entrada estándar).
+    Cada fila lleva 'usuario', 'pais' y 'password' en claro o 'password_hash' ya calculado.
+    """
+    try:
+        formato = carga_masiva.formato_de(archivo, formato)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--formato')
+    try:
+        with carga_masiva.abrir(archivo) as entrada:
+            informe = carga_masiva.importar_usuarios(
+                get_db(), carga_masiva.leer_filas(entrada, formato), current_app.config['PASSWORD_HASH_METHOD'],
+                tam_lote=lote, procesos=procesos, duplicados=duplicados,
+            )
+    except sqlite3.IntegrityError as e:
+        # Los lotes anteriores ya están guardados; el que falla se deshace entero
+        raise click.ClickException(f"Importación detenida: {e}")
+    print(f"Importación terminada: {informe.insertadas} insertados, {informe.actualizadas} actualizados, "
+          f"{informe.duplicadas} duplicados y {informe.invalidas} filas inválidas.")
+    if current_app.config['STORAGE_BACKEND'] == 'particionado':
+        print("Ejecuta 'flask repartir-datos' para copiar los usuarios nuevos a las particiones.")
+
+@click.command('exportar-usuarios')
+@click.argument('archivo', default='-')
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help="por defecto, según la extensión")
+@click.option('--incluir-hash', is_flag=True, help="añade 'password_hash' (para importar en otra instancia)")
+@with_appcontext
+def exportar_usuarios_command(archivo, formato, incluir_hash):
+    """Exporta los usuarios a CSV o JSON Lines ('-' para la salida estándar, en JSON Lines por defecto)."""
+    try:
+        formato = carga_masiva.formato_de(archivo, formato or ('jsonl' if archivo == '-' else None))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--formato')
+    with carga_masiva.abrir(archivo, 'w') as salida:
+        exportados = carga_masiva.exportar_usuarios(get_db(), salida, formato, incluir_hash=incluir_hash)
+    if archivo != '-':
+        print(f"{exportados} usuarios exportados a {archivo}.")
+
+# --- FÁBRICA DE LA APLICACIÓN ---
+
+def _comprobar_esquema():
+    # Una vez por proceso, en la primera petición: crear_app no puede comprobarlo porque
+    # también crea la aplicación de `flask migrar`
+    if current_app.extensions.get('senda7_esquema_comprobado'):
+        return
+    if current_app.config['STORAGE_BACKEND'] != 'memoria':
+        migraciones.comprobar(repositorio.rutas(current_app.config))
+    current_app.extensions['senda7_esquema_comprobado'] = True
+
+
+def crear_app(config=None):
+    """
+    Crea y configura una aplicación: valores por defecto, `config` (si se indica) por encima,
+    extensiones, blueprints y comandos. No toca el esquema de la base de datos; las
+    migraciones se aplican antes con repositorio.migrar() (ver el comando `migrar`).
+    """
+    app = Flask(__name__)
+    # ¡IMPORTANTE! Carga esta clave desde una variable de entorno en producción.
+    app.config['SECRET_KEY'] = 'tu-super-secreto-y-largo-string-aleatorio' 
+    app.config['DATABASE'] = 'db.db'
+    # Pool de conexiones SQLite (WAL, synchronous=NORMAL, busy timeout y caché de sentencias)
+    app.config['DB_POOL_SIZE'] = 8
+    app.config['DB_BUSY_TIMEOUT_MS'] = 5000
+    app.config['DB_CACHED_STATEMENTS'] = 128
+    # Caché en memoria de las filas de usuario usadas por token_required
+    app.config['USER_CACHE_SIZE'] = 4096
+    app.config['USER_CACHE_TTL'] = 60  # segundos
+
+    # Hash de contraseñas en un pool de procesos acotado (None = un trabajador por CPU)
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+    app.config['HASH_POOL_WORKERS'] = None
+    app.config['HASH_POOL_QUEUE'] = 16  # operaciones en espera antes de responder "inténtalo de nuevo"
+    app.config['HASH_TIMEOUT'] = 5.0  # segundos
+
+    # Sesiones: el token de acceso se renueva al acercarse su caducidad, y el refresh token
+    # (revocable) permite renovarlo sin volver a pedir la contraseña
+    app.config['TOKEN_LIFETIME'] = datetime.timedelta(hours=1)
+    app.config['TOKEN_REFRESH_MARGIN'] = datetime.timedelta(minutes=15)
+    app.config['REFRESH_TOKEN_ENABLED'] = True
+    app.config['REFRESH_TOKEN_LIFETIME'] = datetime.timedelta(days=30)
+    app.config['TOKEN_MEMO_SIZE'] = 8192
+
+    # Reglas de recomendación (se cargan y compilan una sola vez al arrancar)
+    app.config['RECOMMENDATION_RULES'] = os.path.join(app.root_path, 'recomendaciones.json')
+    app.config['RECOMMENDATION_CACHE_SIZE'] = 2048
+
+    # Historial de formularios: se escribe en segundo plano, en lotes
+    app.config['HISTORY_FLUSH_INTERVAL'] = 1.0  # segundos
+    app.config['HISTORY_BATCH_SIZE'] = 200
+    app.config['HISTORY_QUEUE_SIZE'] = 10000
+    app.config['HISTORY_QUEUE_TIMEOUT'] = 0.5  # espera máxima con la cola llena antes de escribir directamente
+    app.config['HISTORY_PAGE_SIZE'] = 20
+
+    # Métricas por endpoint (/metrics). Con varios procesos, METRICS_DIR debe ser un directorio
+    # compartido donde cada trabajador vuelca sus contadores para que /metrics los sume.
+    app.config['METRICS_DIR'] = os.environ.get('SENDA7_METRICS_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = 5.0  # segundos entre volcados de cada proceso
+
+    # Perfilado por muestreo (desactivado por defecto: sin fracción ni secreto no hay ningún hook)
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('SENDA7_PROFILE_SAMPLE_RATE', 0.0))
+    app.config['PROFILE_SECRET'] = os.environ.get('SENDA7_PROFILE_SECRET')  # perfila peticiones con la cabecera PROFILE_HEADER
+    app.config['PROFILE_HEADER'] = 'X-Senda7-Perfil'
+    app.config['PROFILE_DIR'] = os.environ.get('SENDA7_PROFILE_DIR', 'perfiles')
+    app.config['PROFILE_MAX_FILES'] = 200
+
+    # Archivos estáticos con huella en el nombre, precomprimidos y cacheables un año
+    app.config['STATIC_FINGERPRINT'] = True
+    app.config['STATIC_MAX_AGE'] = 365 * 24 * 3600  # segundos
+
+    # Plantillas compiladas en disco (compartidas por los trabajadores) y fragmentos cacheados
+    app.config['TEMPLATE_BYTECODE_DIR'] = os.path.join(app.instance_path, 'jinja_cache')
+    app.config['TEMPLATE_FRAGMENT_CACHE_SIZE'] = 256
+
+    # ETag/304 para las páginas HTML y gzip a partir de cierto tamaño
+    app.config['COMPRESS_MIN_SIZE'] = 1024  # bytes
+    app.config['COMPRESS_LEVEL'] = 6
+
+    # Índice en memoria de nombres de usuario para /registro/disponible
+    app.config['USERNAME_INDEX_EXACT'] = True  # False: filtro de Bloom y los posibles positivos se confirman en SQLite
+    app.config['USERNAME_INDEX_CAPACITY'] = 100000  # usuarios antes de redimensionar el filtro
+    app.config['USERNAME_INDEX_FP_RATE'] = 0.01
+    app.config['USERNAME_INDEX_SYNC_INTERVAL'] = 1.0  # segundos entre lecturas de los usuarios nuevos
+
+    # Límite de peticiones (cubeta de fichas por IP y por usuario) compartido entre trabajadores
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('SENDA7_RATE_LIMIT', '1') != '0'
+    app.config['RATE_LIMIT_DB'] = None  # por defecto, '<DATABASE sin extensión>.limites.db'
+    app.config['RATE_LIMITS'] = {
+        # grupo: {clave: (peticiones, segundos)}; la ráfaga máxima es el número de peticiones
+        'login': {'ip': (10, 60)},
+        'registro': {'ip': (5, 300)},
+        'recomendaciones': {'ip': (600, 60), 'usuario': (120, 60)},
+    }
+
+    # Almacenamiento de usuarios, objetivos y sesiones: 'sqlite', 'memoria' (pruebas) o 'particionado'
+    app.config['STORAGE_BACKEND'] = os.environ.get('SENDA7_STORAGE', 'sqlite')
+    app.config['STORAGE_SHARDS'] = 4  # particiones (no se puede cambiar una vez que tienen datos)
+    app.config['STORAGE_SHARD_PATHS'] = None  # por defecto, '<DATABASE sin extensión>.particionN.db'
+
+    # API JSON
+    app.config['API_BATCH_MAX'] = 100  # recomendaciones por petición en el endpoint por lotes
+    app.config['REPORT_MAX_DAYS'] = 366  # días de registros que puede pedir /informes/resumen
+
+    if config:
+        app.config.update(config)
+
+    basedatos.init_app(app)
+    repositorio.init_app(app)
+    app.before_request(_comprobar_esquema)
+    app.extensions['senda7_cache_usuarios'] = CacheLRU(app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+    # Los objetivos de cada usuario se cachean con los mismos límites que su fila
+    app.extensions['senda7_cache_objetivos'] = CacheLRU(app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+    contrasenas.init_app(app)
+    tokens.init_app(app)
+    recomendaciones.init_app(app)
+    historial.init_app(app, repositorio.get_repositorio(app))
+    metricas.init_app(app)
+    perfilado.init_app(app)
+    estaticos.init_app(app)
+    plantillas.init_app(app)
+    compresion.init_app(app)
+    disponibilidad.init_app(app)
+    limites.init_app(app)
+
+    app.register_blueprint(web)
+    app.register_blueprint(api)
+    for comando in (migrar_command, reconciliar_progreso_command, reconstruir_resumenes_command,
+                    repartir_datos_command, informe_perfiles_command, importar_usuarios_command,
+                    exportar_usuarios_command):
+        app.cli.add_command(comando)
+    return app
+
+
+# Aplicación por defecto (flask --app app, servidores WSGI y benchmarks)
+app = crear_app()
+
 if __name__ == '__main__':
-    # Asegurarse de que la base de datos y las tablas existan al iniciar
-    crear_tablas() 
+    # El esquema se pone al día una sola vez, antes de arrancar el servidor
+    repositorio.migrar(app.config)
     app.run(debug=True)
\ No newline at end of file
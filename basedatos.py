@@ -0,0 +1,183 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import queue
+from urllib.request import pathname2url
+from flask import g, current_app
+from metricas import ConexionMedida
+
+# --- POOL DE CONEXIONES SQLITE ---
+
+# Pragmas que se aplican a cada conexión nueva del pool.
+# WAL permite que los lectores no se bloqueen mientras hay un escritor, y
+# synchronous=NORMAL es seguro en modo WAL y evita un fsync en cada commit.
+PRAGMAS_CONEXION = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+)
+# Las conexiones de solo lectura no pueden cambiar el modo del journal ni escribir
+PRAGMAS_LECTURA = (
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones SQLite reutilizables entre peticiones.
+    Cada conexión se configura una sola vez (pragmas, busy timeout y caché de sentencias)
+    y se devuelve al pool al terminar el contexto de la aplicación.
+    Con `solo_lectura`, las conexiones se abren en modo 'ro' (cualquier escritura falla).
+    """
+
+    def __init__(self, ruta, tamano=8, busy_timeout_ms=5000, cache_sentencias=128, espera=10.0,
+                 solo_lectura=False):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_sentencias = cache_sentencias
+        self.espera = espera
+        self.solo_lectura = solo_lectura
+        self._libres = queue.LifoQueue(maxsize=tamano)
+        self._creadas = 0
+        self._lock = threading.Lock()
+
+    def _crear_conexion(self):
+        if self.solo_lectura:
+            destino = f"file:{pathname2url(os.path.abspath(self.ruta))}?mode=ro"
+        else:
+            destino = self.ruta
+        conn = sqlite3.connect(
+            destino,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cache_sentencias,
+            check_same_thread=False,  # La conexión puede cambiar de hilo al volver al pool
+            factory=ConexionMedida,  # Cuenta y cronometra las consultas de cada petición
+            uri=self.solo_lectura,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        for pragma in PRAGMAS_LECTURA if self.solo_lectura else PRAGMAS_CONEXION:
+            conn.execute(pragma)
+        return conn
+
+    def conexion_dedicada(self):
+        """Crea una conexión configurada igual que las del pool pero fuera de él (p. ej. para hilos de fondo)."""
+        return self._crear_conexion()
+
+    def obtener(self):
+        """Devuelve una conexión libre, creando una nueva si aún no se alcanzó el tamaño máximo."""
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._creadas < self.tamano:
+                self._creadas += 1
+                crear = True
+            else:
+                crear = False
+
+        if crear:
+            try:
+                return self._crear_conexion()
+            except sqlite3.Error:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+
+        try:
+            return self._libres.get(timeout=self.espera)
+        except queue.Empty:
+            raise sqlite3.OperationalError("No hay conexiones libres en el pool de la base de datos.")
+
+    def devolver(self, conn):
+        """Devuelve la conexión al pool, descartando cualquier transacción pendiente."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexión dañada: se descarta y se libera su hueco en el pool
+            self._descartar(conn)
+            return
+        try:
+            self._libres.put_nowait(conn)
+        except queue.Full:
+            self._descartar(conn)
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._creadas -= 1
+
+    def cerrar_todas(self):
+        """Cierra todas las conexiones libres del pool."""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+
+@contextlib.contextmanager
+def transaccion(conn):
+    """
+    Como `with conn:`, pero si ya hay una transacción abierta (p. ej. la de migrar(), que
+    confirma cada paso junto con su PRAGMA user_version) usa un SAVEPOINT dentro de ella
+    en lugar de confirmarla.
+    """
+    if not conn.in_transaction:
+        with conn:
+            yield conn
+        return
+    conn.execute('SAVEPOINT transaccion')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK TO transaccion')
+        conn.execute('RELEASE transaccion')
+        raise
+    conn.execute('RELEASE transaccion')
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+def init_app(app):
+    """Crea el pool de conexiones de la aplicación y registra su liberación al final de cada contexto."""
+    app.extensions['senda7_pool'] = PoolConexiones(
+        app.config['DATABASE'],
+        tamano=app.config.get('DB_POOL_SIZE', 8),
+        busy_timeout_ms=app.config.get('DB_BUSY_TIMEOUT_MS', 5000),
+        cache_sentencias=app.config.get('DB_CACHED_STATEMENTS', 128),
+    )
+    app.teardown_appcontext(cerrar_db)
+
+
+def get_pool(app=None):
+    """Devuelve el pool de conexiones de la aplicación indicada o de la actual."""
+    app = app or current_app
+    return app.extensions['senda7_pool']
+
+
+def get_db():
+    """
+    Devuelve la conexión asociada al contexto actual de la aplicación.
+    La misma conexión se reutiliza durante toda la petición (decorador y ruta).
+    """
+    if 'db' not in g:
+        g.db = get_pool().obtener()
+    return g.db
+
+
+def cerrar_db(exc=None):
+    """Devuelve la conexión del contexto actual al pool."""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().devolver(conn)
@@ -0,0 +1,72 @@
+"""
+Tiempo de arranque de un trabajador.
+
+En procesos nuevos (como un trabajador recién creado) se mide:
+  - importación: `import app` (incluye crear la aplicación);
+  - primera petición: desde el inicio hasta responder GET /login con el cliente de pruebas.
+La base de datos temporal se prepara antes, de modo que se mide un arranque sobre un
+esquema ya existente, que es el caso de cada trabajador en producción.
+
+Uso:
+    python benchmarks/bench_arranque.py --repeticiones 15
+    python benchmarks/bench_arranque.py --salida arranque.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from comun import RAIZ, argumentos_resultados, finalizar, metrica, percentil
+
+TRABAJADOR = f'''
+import json, sys, time
+inicio = time.perf_counter()
+sys.path.insert(0, {RAIZ!r})
+import app as modulo_app
+importado = time.perf_counter()
+respuesta = modulo_app.app.test_client().get('/login')
+listo = time.perf_counter()
+assert respuesta.status_code == 200, respuesta.status_code
+print(json.dumps({{'importacion': importado - inicio, 'primera_peticion': listo - inicio}}))
+'''
+
+PREPARAR = f'''
+import sys
+sys.path.insert(0, {RAIZ!r})
+import app as modulo_app
+# Antes de las migraciones versionadas, el esquema se creaba al importar app
+if hasattr(modulo_app, 'migraciones'):
+    modulo_app.migraciones.migrar(modulo_app.app.config['DATABASE'])
+'''
+
+
+def ejecutar(codigo, directorio):
+    salida = subprocess.run([sys.executable, '-c', codigo], cwd=directorio, check=True,
+                            capture_output=True, text=True).stdout
+    return salida.strip().splitlines()[-1] if salida.strip() else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=15)
+    argumentos_resultados(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ejecutar(PREPARAR, directorio)
+        muestras = [json.loads(ejecutar(TRABAJADOR, directorio)) for _ in range(args.repeticiones)]
+
+    metricas = {}
+    for clave in ('importacion', 'primera_peticion'):
+        valores = sorted(muestra[clave] * 1000 for muestra in muestras)
+        mediana, p95 = statistics.median(valores), percentil(valores, 95)
+        print(f"{clave:<18} mediana {mediana:7.1f} ms   p95 {p95:7.1f} ms")
+        metricas[f'{clave}.mediana_ms'] = metrica(mediana, 'ms', False)
+        metricas[f'{clave}.p95_ms'] = metrica(p95, 'ms', False)
+    sys.exit(finalizar('arranque', {'repeticiones': args.repeticiones}, metricas, args))
+
+
+if __name__ == '__main__':
+    main()
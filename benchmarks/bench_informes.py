@@ -0,0 +1,108 @@
+"""
+Informes desde las tablas de resumen frente a GROUP BY sobre usuarios y objetivos.
+
+Sobre una base de datos temporal se insertan usuarios por tramos (repartidos entre
+países, días de registro y objetivos) y, tras cada tramo, se mide:
+  - el informe de /api/v1/informes/resumen (analitica.informe, solo tablas resumen_*);
+  - las mismas cifras con GROUP BY sobre las tablas completas, como antes.
+También se mide el coste de los triggers en las altas (inserciones por segundo con
+y sin ellos) y que reconstruir-resumenes da las mismas cifras que los triggers.
+
+Uso:
+    python benchmarks/bench_informes.py --usuarios 100000 --tramos 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from comun import RAIZ, argumentos_resultados, finalizar, metrica, preparar_app
+
+PAISES = ('GE', 'ES', 'CM', 'GA', 'FR', 'MX', 'AR', 'CO')
+OBJETIVOS = ('organizacion', 'tiempo', 'estudio', 'concentracion', 'descanso')
+
+SQL_COMPLETO = (
+    'SELECT pais, COUNT(*) FROM usuarios GROUP BY pais',
+    '''SELECT objetivo_texto, COUNT(*), SUM(completado != 0) FROM objetivos GROUP BY objetivo_texto''',
+    '''SELECT date(fecha_registro), COUNT(*) FROM usuarios
+       WHERE fecha_registro >= date('now', '-29 days') GROUP BY date(fecha_registro)''',
+)
+
+
+def insertar(conn, desde, cantidad):
+    """Inserta usuarios con un objetivo cada uno; devuelve usuarios por segundo."""
+    usuarios = [(f'informe{i}', 'x', PAISES[i % len(PAISES)], f'-{i % 90} days')
+                for i in range(desde, desde + cantidad)]
+    inicio = time.perf_counter()
+    with conn:
+        conn.executemany(
+            "INSERT INTO usuarios (usuario, password, pais, fecha_registro) VALUES (?, ?, ?, datetime('now', ?))",
+            usuarios)
+        conn.execute('''
+            INSERT INTO objetivos (id_usuario, objetivo_texto, completado)
+            SELECT id, ?, id % 3 = 0 FROM usuarios WHERE id > ?
+        ''', (OBJETIVOS[desde % len(OBJETIVOS)], desde))
+    return cantidad / (time.perf_counter() - inicio)
+
+
+def cronometrar(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=100000)
+    parser.add_argument('--tramos', type=int, default=4)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    argumentos_resultados(parser)
+    args = parser.parse_args()
+
+    tramo = args.usuarios // args.tramos
+    metricas = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        app = preparar_app(directorio)
+        import analitica
+        import basedatos
+        conn = basedatos.get_pool(app).obtener()
+
+        altas = []
+        print(f"{'usuarios':>10} {'resúmenes':>12} {'GROUP BY':>12}")
+        for numero in range(args.tramos):
+            altas.append(insertar(conn, numero * tramo, tramo))
+            resumen = cronometrar(lambda: analitica.informe(conn, dias=30), args.repeticiones)
+            completo = cronometrar(lambda: [conn.execute(sql).fetchall() for sql in SQL_COMPLETO], args.repeticiones)
+            total = (numero + 1) * tramo
+            print(f"{total:>10} {resumen:>9.3f} ms {completo:>9.3f} ms")
+            metricas[f'informe.{total}.resumen_ms'] = metrica(resumen, 'ms', False)
+            metricas[f'informe.{total}.group_by_ms'] = metrica(completo, 'ms', False)
+
+        incremental = analitica.informe(conn, dias=90)
+        analitica.reconstruir_resumenes(conn)
+        coinciden = incremental == analitica.informe(conn, dias=90)
+
+        # Las mismas altas sin los triggers de resumen
+        disparadores = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%resumen%'").fetchall()
+        for (nombre,) in disparadores:
+            conn.execute(f'DROP TRIGGER {nombre}')
+        sin_triggers = insertar(conn, args.tramos * tramo, tramo)
+        basedatos.get_pool(app).devolver(conn)
+        os.chdir(RAIZ)
+
+    con_triggers = sum(altas) / len(altas)
+    print(f"\naltas con triggers de resumen  {con_triggers:>12,.0f} usuarios/s")
+    print(f"altas sin triggers de resumen  {sin_triggers:>12,.0f} usuarios/s")
+    print(f"reconstruir-resumenes coincide con los triggers: {'sí' if coinciden else 'NO'}")
+    metricas['altas_con_triggers.usuarios_s'] = metrica(con_triggers, 'usuarios/s', True)
+    metricas['altas_sin_triggers.usuarios_s'] = metrica(sin_triggers, 'usuarios/s', True)
+    parametros = {'usuarios': args.usuarios, 'tramos': args.tramos, 'repeticiones': args.repeticiones}
+    codigo = finalizar('informes', parametros, metricas, args)
+    sys.exit(codigo or (0 if coinciden else 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Microbenchmarks aislados (operaciones/segundo), sin servidor HTTP.
+
+- token_required: el decorador completo con un token válido en la cookie
+  (memoria de tokens y caché de usuarios calientes) y con ambas desactivadas.
+- recomendaciones: el motor de reglas con y sin caché.
+- base de datos: obtener/devolver una conexión del pool, leer un usuario,
+  cargar sus objetivos y su progreso.
+- disponibilidad de nombres: índice en memoria (conjunto exacto y filtro de Bloom)
+  frente a la consulta en SQLite, con nombres libres (el caso habitual al
+  registrarse) y ocupados.
+- límite de peticiones: una comprobación (UPSERT en la base de datos compartida).
+
+Uso:
+    python benchmarks/bench_micro.py --segundos 1
+    python benchmarks/bench_micro.py --salida micro.json
+    python benchmarks/bench_micro.py --referencia micro.json --umbral 0.10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from comun import RAIZ, argumentos_resultados, finalizar, metrica, preparar_app
+from bench_recomendaciones import entradas
+
+
+def ops_por_segundo(funcion, segundos):
+    """Repite la función en tandas hasta cubrir el tiempo pedido y devuelve llamadas por segundo."""
+    funcion()  # calentamiento
+    llamadas, tanda = 0, 100
+    inicio = time.perf_counter()
+    while True:
+        for _ in range(tanda):
+            funcion()
+        llamadas += tanda
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= segundos:
+            return llamadas / transcurrido
+
+
+def bench_token_required(app, token, segundos):
+    from app import token_required
+
+    @token_required
+    def vista(current_user):
+        return current_user['id']
+
+    def llamar():
+        with app.test_request_context('/panel', headers={'Cookie': f'token={token}'}):
+            vista()
+
+    resultados = {'token_required.caliente': ops_por_segundo(llamar, segundos)}
+
+    memo = app.extensions['senda7_tokens_memo']
+    cache_usuarios = app.extensions['senda7_cache_usuarios']
+
+    def llamar_en_frio():
+        memo.limpiar()
+        cache_usuarios.limpiar()
+        llamar()
+
+    resultados['token_required.frio'] = ops_por_segundo(llamar_en_frio, segundos)
+    return resultados
+
+
+def bench_recomendaciones(segundos):
+    from recomendaciones import MotorRecomendaciones
+    ruta = os.path.join(RAIZ, 'recomendaciones.json')
+    datos = entradas(10000)
+    resultados = {}
+    for nombre, tam_cache in (('sin_cache', 0), ('con_cache', 1024)):
+        motor = MotorRecomendaciones.desde_archivo(ruta, tam_cache=tam_cache)
+        posicion = iter(range(10 ** 12))
+
+        def generar():
+            categoria, campos = datos[next(posicion) % len(datos)]
+            motor.generar(categoria, **campos)
+        resultados[f'recomendaciones.{nombre}'] = ops_por_segundo(generar, segundos)
+    return resultados
+
+
+def bench_base_datos(app, id_usuario, segundos):
+    import basedatos
+    import objetivos as repo_objetivos
+    pool = basedatos.get_pool(app)
+
+    def ciclo_pool():
+        pool.devolver(pool.obtener())
+
+    conn = pool.obtener()
+    try:
+        return {
+            'db.pool_obtener_devolver': ops_por_segundo(ciclo_pool, segundos),
+            'db.usuario_por_id': ops_por_segundo(
+                lambda: conn.execute('SELECT * FROM usuarios WHERE id = ?', (id_usuario,)).fetchone(), segundos),
+            'db.cargar_objetivos': ops_por_segundo(
+                lambda: repo_objetivos.cargar_objetivos(conn, id_usuario), segundos),
+            'db.cargar_progreso': ops_por_segundo(
+                lambda: repo_objetivos.cargar_progreso_version(conn, id_usuario), segundos),
+        }
+    finally:
+        pool.devolver(conn)
+
+
+def bench_disponibilidad(app, segundos, usuarios=10000):
+    import basedatos
+    import disponibilidad
+    import repositorio
+    pool = basedatos.get_pool(app)
+    conn = pool.obtener()
+    try:
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO usuarios (usuario, password, pais) VALUES (?, 'x', 'GE')",
+                             [(f'disponible{i}',) for i in range(usuarios)])
+        repo = repositorio.get_repositorio(app)
+        indices = {'exacto': disponibilidad.get_indice(app),
+                   'bloom': disponibilidad.IndiceUsuarios(capacidad=usuarios * 2, exacto=False)}
+        for indice in indices.values():
+            indice.sincronizar(repo)
+        libres = [f'libre{i}' for i in range(1000)]
+        ocupados = [f'disponible{i}' for i in range(1000)]
+        resultados = {}
+        for caso, nombres in (('libre', libres), ('ocupado', ocupados)):
+            posicion = iter(range(10 ** 12))
+            for modo, indice in indices.items():
+                resultados[f'disponibilidad.{modo}_{caso}'] = ops_por_segundo(
+                    lambda: indice.existe(nombres[next(posicion) % 1000], repo), segundos)
+            resultados[f'disponibilidad.sqlite_{caso}'] = ops_por_segundo(
+                lambda: conn.execute('SELECT 1 FROM usuarios WHERE usuario = ?',
+                                     (nombres[next(posicion) % 1000],)).fetchone(), segundos)
+        return resultados
+    finally:
+        pool.devolver(conn)
+
+
+def bench_limite(directorio, segundos):
+    from limites import LimitadorPeticiones
+    limitador = LimitadorPeticiones(os.path.join(directorio, 'bench.limites.db'), {'bench': {'ip': (10 ** 9, 1)}})
+    posicion = iter(range(10 ** 12))
+    return {'limite.consumir': ops_por_segundo(
+        lambda: limitador.consumir('bench', 'ip', f'10.0.{next(posicion) % 1000}'), segundos)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segundos', type=float, default=1.0, help="duración de cada microbenchmark")
+    argumentos_resultados(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        app = preparar_app(directorio)
+        import tokens
+        cliente = app.test_client()
+        cliente.post('/registro', data={'usuario': 'micro', 'password': 'micro', 'confirmar': 'micro', 'pais': 'GE'})
+        cliente.post('/seleccionar_objetivos', data={'objetivos': ['organizacion', 'tiempo', 'bienestar']})
+        token = cliente.get_cookie('token').value
+        with app.app_context():
+            id_usuario = tokens.decodificar_token(token)['user_id']
+
+        resultados = {}
+        resultados.update(bench_token_required(app, token, args.segundos))
+        resultados.update(bench_recomendaciones(args.segundos))
+        resultados.update(bench_base_datos(app, id_usuario, args.segundos))
+        resultados.update(bench_disponibilidad(app, args.segundos))
+        resultados.update(bench_limite(directorio, args.segundos))
+        os.chdir(RAIZ)
+
+    for nombre, valor in resultados.items():
+        print(f"{nombre:<35} {valor:>14,.0f} ops/s")
+    metricas = {nombre: metrica(valor, 'ops/s', True) for nombre, valor in resultados.items()}
+    sys.exit(finalizar('micro', {'segundos': args.segundos}, metricas, args))
+
+
+if __name__ == '__main__':
+    main()
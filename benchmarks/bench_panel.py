@@ -0,0 +1,73 @@
+"""
+Benchmark de peticiones por segundo sobre /panel.
+
+Levanta la aplicación en un servidor WSGI local con hilos, usando una base de datos
+temporal (no toca db.db), registra un usuario de prueba y lanza peticiones
+concurrentes a /panel con su token.
+
+Uso:
+    python benchmarks/bench_panel.py --hilos 8 --segundos 10
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from comun import RAIZ, Cliente, preparar_app, iniciar_servidor
+
+
+def crear_usuario(puerto):
+    cliente = Cliente(puerto)
+    cliente.peticion('POST', '/registro', {'usuario': 'bench', 'password': 'bench', 'confirmar': 'bench', 'pais': 'GE'})
+    cliente.peticion('POST', '/seleccionar_objetivos', {'objetivos': ['organizacion', 'tiempo', 'emocional']})
+    cliente.cerrar()
+    return cliente.cookies
+
+
+def trabajador(puerto, cookies, fin, contador, lock):
+    cliente = Cliente(puerto)
+    cliente.cookies = dict(cookies)
+    hechas = 0
+    while time.perf_counter() < fin:
+        respuesta = cliente.peticion('GET', '/panel')
+        if respuesta.status != 200:
+            raise RuntimeError(f"/panel devolvió {respuesta.status}")
+        hechas += 1
+    cliente.cerrar()
+    with lock:
+        contador[0] += hechas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        app = preparar_app(directorio)
+        servidor = iniciar_servidor(app)
+        cookies = crear_usuario(servidor.port)
+
+        contador, lock = [0], threading.Lock()
+        fin = time.perf_counter() + args.segundos
+        hilos = [
+            threading.Thread(target=trabajador, args=(servidor.port, cookies, fin, contador, lock))
+            for _ in range(args.hilos)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        servidor.shutdown()
+
+        print(f"/panel: {contador[0]} peticiones en {duracion:.2f}s con {args.hilos} hilos "
+              f"-> {contador[0] / duracion:.1f} req/s")
+        os.chdir(RAIZ)
+
+
+if __name__ == '__main__':
+    main()
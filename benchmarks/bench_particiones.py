@@ -0,0 +1,119 @@
+"""
+Escrituras concurrentes con el backend 'sqlite' (un archivo) frente al 'particionado'.
+
+Sobre una base de datos temporal se crean usuarios y varios procesos, cada uno con su
+propia aplicación (como los trabajadores de servidor.py), alternan durante el tiempo
+pedido los objetivos de usuarios al azar, abren sesiones y guardan un lote de historial
+(guardar_objetivos, crear_sesion y guardar_historial del repositorio, lo que hacen
+/seleccionar_objetivos, /login y el escritor diferido del historial). Con un solo
+archivo todas las escrituras esperan el mismo bloqueo; con particiones, solo las de
+usuarios de la misma partición. También se mide la lectura del panel (usuario,
+objetivos y progreso con las conexiones de solo lectura) mientras dura la carga.
+
+Con synchronous=NORMAL cada commit es muy corto, así que la diferencia crece con el
+número de procesos y de CPU y con --synchronous FULL (un fsync por commit).
+
+Uso:
+    python benchmarks/bench_particiones.py --procesos 4 --segundos 10
+    python benchmarks/bench_particiones.py --particiones 8 --synchronous FULL
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+from comun import RAIZ, argumentos_resultados, finalizar, metrica, percentil, preparar_app
+
+OBJETIVOS = (['organizacion', 'tiempo'], ['tiempo', 'estudio'], ['estudio', 'descanso', 'organizacion'])
+
+
+def trabajar(config, usuarios, segundos, synchronous, inicio, resultados):
+    import basedatos
+    import repositorio
+    from app import crear_app
+    app = crear_app(config)
+    # Las conexiones de los pools se abren al usarlas, así que todas toman este pragma
+    basedatos.PRAGMAS_CONEXION += (f"PRAGMA synchronous = {synchronous}",)
+    repo = repositorio.get_repositorio(app)
+    azar = random.Random(os.getpid())
+    escrituras, lecturas = 0, []
+    inicio.wait()
+    fin = time.perf_counter() + segundos
+    with app.app_context():
+        while time.perf_counter() < fin:
+            id_usuario = azar.randint(1, usuarios)
+            repo.guardar_objetivos(id_usuario, azar.choice(OBJETIVOS))
+            repo.crear_sesion(repo.prefijo_sesion(id_usuario) + secrets.token_hex(16), id_usuario, time.time() + 3600)
+            repo.guardar_historial([(id_usuario, 'estudio', '{}', 'bench', time.strftime('%Y-%m-%d %H:%M:%S'))])
+            escrituras += 3
+            antes = time.perf_counter()
+            repo.usuario_por_id(id_usuario)
+            repo.cargar_objetivos(id_usuario)
+            repo.cargar_progreso_version(id_usuario)
+            lecturas.append(time.perf_counter() - antes)
+    repo.cerrar()
+    resultados.put((escrituras, lecturas))
+
+
+def medir(backend, args):
+    with tempfile.TemporaryDirectory() as directorio:
+        config = {'STORAGE_BACKEND': backend, 'STORAGE_SHARDS': args.particiones}
+        app = preparar_app(directorio, **config)
+        import repositorio
+        repo = repositorio.get_repositorio(app)
+        with app.app_context():
+            for numero in range(args.usuarios):
+                repo.crear_usuario(f'particion{numero}', 'x', 'GE')
+        repo.cerrar()
+
+        contexto = multiprocessing.get_context('fork')
+        inicio, resultados = contexto.Event(), contexto.Queue()
+        procesos = [contexto.Process(target=trabajar, args=(dict(config, RATE_LIMIT_ENABLED=False), args.usuarios,
+                                                            args.segundos, args.synchronous, inicio, resultados))
+                    for _ in range(args.procesos)]
+        for proceso in procesos:
+            proceso.start()
+        time.sleep(1.0)  # que todos hayan creado su aplicación
+        inicio.set()
+        escrituras, lecturas = 0, []
+        for _ in procesos:
+            propias, muestras = resultados.get()
+            escrituras += propias
+            lecturas.extend(muestras)
+        for proceso in procesos:
+            proceso.join()
+        os.chdir(RAIZ)
+
+    lecturas.sort()
+    return escrituras / args.segundos, percentil(lecturas, 50) * 1000, percentil(lecturas, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--particiones', type=int, default=4)
+    parser.add_argument('--synchronous', choices=('NORMAL', 'FULL'), default='NORMAL')
+    argumentos_resultados(parser)
+    args = parser.parse_args()
+
+    metricas = {}
+    for backend in ('sqlite', 'particionado'):
+        escrituras, p50, p99 = medir(backend, args)
+        print(f"{backend:<13} {escrituras:>10,.0f} escrituras/s   panel p50 {p50:6.2f} ms   p99 {p99:6.2f} ms")
+        metricas[f'{backend}.escrituras_s'] = metrica(escrituras, 'escrituras/s', True)
+        metricas[f'{backend}.panel_p50_ms'] = metrica(p50, 'ms', False)
+        metricas[f'{backend}.panel_p99_ms'] = metrica(p99, 'ms', False)
+
+    parametros = {'procesos': args.procesos, 'segundos': args.segundos, 'usuarios': args.usuarios,
+                  'particiones': args.particiones, 'synchronous': args.synchronous}
+    sys.exit(finalizar('particiones', parametros, metricas, args))
+
+
+if __name__ == '__main__':
+    main()
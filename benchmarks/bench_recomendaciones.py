@@ -0,0 +1,61 @@
+"""
+Microbenchmark del motor de recomendaciones (recomendaciones/segundo).
+
+Genera recomendaciones de las seis categorías con entradas variadas, con la
+caché LRU del motor activada y desactivada (tamaño 0), sin levantar la app.
+
+Uso:
+    python benchmarks/bench_recomendaciones.py --iteraciones 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from comun import RAIZ
+
+sys.path.insert(0, RAIZ)
+from recomendaciones import MotorRecomendaciones  # noqa: E402
+
+
+def entradas(n, semilla=7):
+    """Entradas de ejemplo con pocos valores de texto distintos, como en un uso real."""
+    azar = random.Random(semilla)
+    materias = ['matemáticas', 'historia', 'física', 'química', 'inglés']
+    generadores = [
+        lambda: ('organizacion', dict(materia=azar.choice(materias), horas=azar.randint(1, 10), objetivo='aprobar')),
+        lambda: ('gestion_tiempo', dict(tareas='estudiar', prioridades='examen', bloques=azar.randint(1, 12))),
+        lambda: ('bienestar_emocional', dict(emociones='estrés', estrategias='respirar', actividades='yoga')),
+        lambda: ('crecimiento_espiritual', dict(practicas='meditar', reflexiones='diario', metas='paz')),
+        lambda: ('desarrollo_habitos', dict(habitos='leer', acciones='10 páginas', duracion=azar.choice([10, 15, 20, 30]))),
+        lambda: ('reflexion_proposito', dict(reflexion='¿qué quiero?', proposito='ayudar')),
+    ]
+    return [azar.choice(generadores)() for _ in range(n)]
+
+
+def medir(motor, datos):
+    inicio = time.perf_counter()
+    for categoria, campos in datos:
+        motor.generar(categoria, **campos)
+    return len(datos) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iteraciones', type=int, default=200000)
+    args = parser.parse_args()
+
+    ruta = os.path.join(RAIZ, 'recomendaciones.json')
+    datos = entradas(args.iteraciones)
+
+    sin_cache = medir(MotorRecomendaciones.desde_archivo(ruta, tam_cache=0), datos)
+    motor = MotorRecomendaciones.desde_archivo(ruta, tam_cache=1024)
+    con_cache = medir(motor, datos)
+
+    print(f"sin caché: {sin_cache:,.0f} recomendaciones/s")
+    print(f"con caché: {con_cache:,.0f} recomendaciones/s ({motor.estadisticas()['tasa_aciertos']:.1%} aciertos)")
+
+
+if __name__ == '__main__':
+    main()
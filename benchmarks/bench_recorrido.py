@@ -0,0 +1,130 @@
+"""
+Prueba de carga del recorrido completo de un usuario.
+
+Levanta la aplicación en un servidor WSGI local sobre una base de datos temporal
+(no toca db.db). Cada usuario virtual repite el recorrido: registro, login,
+seleccionar_objetivos, panel y los seis formularios de recomendación, hasta
+agotar el tiempo. Se informa del rendimiento global y, por ruta, de las
+peticiones por segundo y las latencias p50/p95/p99.
+
+Uso:
+    python benchmarks/bench_recorrido.py --usuarios 8 --segundos 20
+    python benchmarks/bench_recorrido.py --salida base.json
+    python benchmarks/bench_recorrido.py --referencia base.json --umbral 0.15
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from comun import RAIZ, Cliente, argumentos_resultados, finalizar, iniciar_servidor, metrica, percentil, preparar_app
+
+FORMULARIOS = [
+    ('/organizacion', {'materia': 'matemáticas', 'horas': '3', 'objetivo': 'aprobar'}),
+    ('/gestion_tiempo', {'tareas': 'estudiar', 'prioridades': 'examen', 'bloques': '5'}),
+    ('/bienestar_emocional', {'emociones': 'estrés', 'estrategias': 'respirar', 'actividades': 'yoga'}),
+    ('/crecimiento_espiritual', {'practicas': 'meditar', 'reflexiones': 'diario', 'metas': 'paz'}),
+    ('/desarrollo_habitos', {'habitos': 'leer', 'acciones': '10 páginas', 'duracion': '20'}),
+    ('/reflexion_proposito', {'reflexion': '¿qué quiero?', 'proposito': 'ayudar'}),
+]
+OBJETIVOS = ['organizacion', 'tiempo', 'bienestar', 'habitos']
+
+
+class Medidor:
+    """Latencias por ruta y errores (estado distinto del esperado), compartidos entre hilos."""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.recorridos = 0
+        self._lock = threading.Lock()
+
+    def peticion(self, cliente, metodo, ruta, datos=None, esperado=200):
+        inicio = time.perf_counter()
+        respuesta = cliente.peticion(metodo, ruta, datos)
+        duracion = time.perf_counter() - inicio
+        clave = f"{metodo} {ruta}"
+        with self._lock:
+            self.latencias[clave].append(duracion)
+            if respuesta.status != esperado:
+                self.errores[clave] += 1
+        return respuesta
+
+
+def recorrido(puerto, nombre, medidor):
+    cliente = Cliente(puerto)
+    medidor.peticion(cliente, 'POST', '/registro',
+                     {'usuario': nombre, 'password': nombre, 'confirmar': nombre, 'pais': 'GE'}, esperado=302)
+    cliente.cerrar()
+
+    cliente = Cliente(puerto)
+    medidor.peticion(cliente, 'POST', '/login', {'usuario': nombre, 'password': nombre}, esperado=302)
+    medidor.peticion(cliente, 'POST', '/seleccionar_objetivos', {'objetivos': OBJETIVOS}, esperado=302)
+    medidor.peticion(cliente, 'GET', '/panel')
+    for ruta, datos in FORMULARIOS:
+        medidor.peticion(cliente, 'POST', ruta, datos)
+    cliente.cerrar()
+    with medidor._lock:
+        medidor.recorridos += 1
+
+
+def usuario_virtual(puerto, numero, fin, medidor):
+    for vuelta in itertools.count():
+        if time.perf_counter() >= fin:
+            break
+        recorrido(puerto, f"carga{numero}_{vuelta}_{os.getpid()}", medidor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=8, help="usuarios virtuales concurrentes")
+    parser.add_argument('--segundos', type=float, default=20.0)
+    argumentos_resultados(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        app = preparar_app(directorio)
+        servidor = iniciar_servidor(app)
+        medidor = Medidor()
+        inicio = time.perf_counter()
+        fin = inicio + args.segundos
+        hilos = [
+            threading.Thread(target=usuario_virtual, args=(servidor.port, numero, fin, medidor))
+            for numero in range(args.usuarios)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        servidor.shutdown()
+        os.chdir(RAIZ)
+
+    total = sum(len(muestras) for muestras in medidor.latencias.values())
+    metricas = {
+        'total.req_s': metrica(total / duracion, 'req/s', True),
+        'total.recorridos_s': metrica(medidor.recorridos / duracion, 'recorridos/s', True),
+    }
+    print(f"{total} peticiones y {medidor.recorridos} recorridos en {duracion:.1f}s "
+          f"con {args.usuarios} usuarios -> {total / duracion:.1f} req/s")
+    print(f"\n{'ruta':<32}{'peticiones':>11}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errores':>9}")
+    for clave, muestras in sorted(medidor.latencias.items()):
+        muestras.sort()
+        p50, p95, p99 = (percentil(muestras, p) * 1000 for p in (50, 95, 99))
+        print(f"{clave:<32}{len(muestras):>11}{len(muestras) / duracion:>9.1f}"
+              f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{medidor.errores[clave]:>9}")
+        metricas[f"{clave}.req_s"] = metrica(len(muestras) / duracion, 'req/s', True)
+        for p, valor in (('p50', p50), ('p95', p95), ('p99', p99)):
+            metricas[f"{clave}.{p}_ms"] = metrica(valor, 'ms', False)
+    metricas['total.errores'] = metrica(sum(medidor.errores.values()), 'peticiones', False)
+
+    parametros = {'usuarios': args.usuarios, 'segundos': args.segundos}
+    sys.exit(finalizar('recorrido', parametros, metricas, args))
+
+
+if __name__ == '__main__':
+    main()
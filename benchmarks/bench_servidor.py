@@ -0,0 +1,181 @@
+"""
+Servidor de desarrollo (python app.py) frente al servidor preforkeado (servidor.py).
+
+Cada servidor se arranca en su propio proceso sobre una base de datos temporal.
+Se registran usuarios con objetivos y, durante el tiempo pedido, varios clientes
+concurrentes alternan GET /panel y POST /organizacion (recomendación). Se informa,
+por servidor, de las peticiones por segundo, las latencias p50/p99 y la memoria
+del árbol de procesos (RSS sumado y PSS, que reparte las páginas compartidas).
+
+Uso:
+    python benchmarks/bench_servidor.py --clientes 16 --segundos 15
+    python benchmarks/bench_servidor.py --trabajadores 3 --hilos 4 --salida servidor.json
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from comun import RAIZ, Cliente, argumentos_resultados, finalizar, metrica, percentil
+
+PUERTO_DESARROLLO = 5000  # app.run() sin argumentos
+PUERTO_PRODUCCION = 8765
+RECOMENDACION = ('/organizacion', {'materia': 'matemáticas', 'horas': '3', 'objetivo': 'aprobar'})
+
+
+def esperar_puerto(puerto, limite=30.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El servidor no escucha en el puerto {puerto}")
+
+
+def arbol(pid):
+    """El proceso y todos sus descendientes."""
+    hijos = {}
+    for entrada in os.listdir('/proc'):
+        if entrada.isdigit():
+            try:
+                with open(f'/proc/{entrada}/stat') as archivo:
+                    padre = int(archivo.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+            hijos.setdefault(padre, []).append(int(entrada))
+    pendientes, resultado = [pid], []
+    while pendientes:
+        actual = pendientes.pop()
+        resultado.append(actual)
+        pendientes.extend(hijos.get(actual, []))
+    return resultado
+
+
+def memoria(pid):
+    """(RSS, PSS) en MB del árbol de procesos, según /proc/<pid>/smaps_rollup."""
+    rss = pss = 0
+    for proceso in arbol(pid):
+        try:
+            with open(f'/proc/{proceso}/smaps_rollup') as archivo:
+                for linea in archivo:
+                    campo, _, valor = linea.partition(':')
+                    if campo == 'Rss':
+                        rss += int(valor.split()[0])
+                    elif campo == 'Pss':
+                        pss += int(valor.split()[0])
+        except OSError:
+            continue
+    return rss / 1024, pss / 1024
+
+
+def preparar_usuarios(puerto, cantidad):
+    clientes = []
+    for numero in range(cantidad):
+        nombre = f"servidor{numero}"
+        cliente = Cliente(puerto)
+        cliente.peticion('POST', '/registro', {'usuario': nombre, 'password': nombre,
+                                               'confirmar': nombre, 'pais': 'GE'})
+        cliente.peticion('POST', '/seleccionar_objetivos', {'objetivos': ['organizacion', 'tiempo']})
+        clientes.append(cliente)
+    return clientes
+
+
+def cargar(clientes, segundos):
+    latencias = {'GET /panel': [], f'POST {RECOMENDACION[0]}': []}
+    errores = [0]
+    lock = threading.Lock()
+    fin = time.perf_counter() + segundos
+
+    def trabajar(cliente):
+        propias = {clave: [] for clave in latencias}
+        fallos = 0
+        while time.perf_counter() < fin:
+            for metodo, ruta, datos in (('GET', '/panel', None), ('POST', *RECOMENDACION)):
+                inicio = time.perf_counter()
+                respuesta = cliente.peticion(metodo, ruta, datos)
+                propias[f'{metodo} {ruta}'].append(time.perf_counter() - inicio)
+                fallos += respuesta.status != 200
+        with lock:
+            for clave, muestras in propias.items():
+                latencias[clave].extend(muestras)
+            errores[0] += fallos
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajar, args=(cliente,)) for cliente in clientes]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return latencias, errores[0], time.perf_counter() - inicio
+
+
+def medir(nombre, orden, puerto, args):
+    with tempfile.TemporaryDirectory() as directorio:
+        # Sin límite de peticiones: todos los clientes salen de la misma IP
+        entorno = dict(os.environ, SENDA7_METRICS_DIR=os.path.join(directorio, 'metricas'), SENDA7_RATE_LIMIT='0')
+        proceso = subprocess.Popen(orden, cwd=directorio, env=entorno, start_new_session=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            esperar_puerto(puerto)
+            clientes = preparar_usuarios(puerto, args.clientes)
+            memoria_inicial = memoria(proceso.pid)
+            latencias, errores, duracion = cargar(clientes, args.segundos)
+            memoria_final = memoria(proceso.pid)
+            for cliente in clientes:
+                cliente.cerrar()
+        finally:
+            os.killpg(proceso.pid, signal.SIGTERM)
+            proceso.wait(timeout=60)
+
+    total = sum(len(muestras) for muestras in latencias.values())
+    metricas = {
+        f'{nombre}.req_s': metrica(total / duracion, 'req/s', True),
+        f'{nombre}.errores': metrica(errores, 'peticiones', False),
+        f'{nombre}.rss_mb': metrica(memoria_final[0], 'MB', False),
+        f'{nombre}.pss_mb': metrica(memoria_final[1], 'MB', False),
+    }
+    print(f"\n{nombre}: {total / duracion:.1f} req/s, {errores} errores, memoria RSS "
+          f"{memoria_inicial[0]:.1f} -> {memoria_final[0]:.1f} MB, PSS "
+          f"{memoria_inicial[1]:.1f} -> {memoria_final[1]:.1f} MB")
+    for clave, muestras in sorted(latencias.items()):
+        muestras.sort()
+        p50, p99 = percentil(muestras, 50) * 1000, percentil(muestras, 99) * 1000
+        print(f"  {clave:<22}{len(muestras) / duracion:>9.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms")
+        metricas[f'{nombre}.{clave}.req_s'] = metrica(len(muestras) / duracion, 'req/s', True)
+        metricas[f'{nombre}.{clave}.p50_ms'] = metrica(p50, 'ms', False)
+        metricas[f'{nombre}.{clave}.p99_ms'] = metrica(p99, 'ms', False)
+    return metricas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=16, help="clientes concurrentes con conexión persistente")
+    parser.add_argument('--segundos', type=float, default=15.0)
+    parser.add_argument('--trabajadores', type=int, default=0, help="trabajadores de servidor.py (por defecto, los suyos)")
+    parser.add_argument('--hilos', type=int, default=4, help="hilos por trabajador de servidor.py")
+    argumentos_resultados(parser)
+    args = parser.parse_args()
+
+    produccion = [sys.executable, os.path.join(RAIZ, 'servidor.py'),
+                  '--puerto', str(PUERTO_PRODUCCION), '--hilos', str(args.hilos)]
+    if args.trabajadores:
+        produccion += ['--trabajadores', str(args.trabajadores)]
+
+    metricas = {}
+    metricas.update(medir('desarrollo', [sys.executable, os.path.join(RAIZ, 'app.py')], PUERTO_DESARROLLO, args))
+    metricas.update(medir('produccion', produccion, PUERTO_PRODUCCION, args))
+
+    parametros = {'clientes': args.clientes, 'segundos': args.segundos,
+                  'trabajadores': args.trabajadores, 'hilos': args.hilos}
+    sys.exit(finalizar('servidor', parametros, metricas, args))
+
+
+if __name__ == '__main__':
+    main()
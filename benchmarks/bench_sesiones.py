@@ -0,0 +1,95 @@
+"""
+Prueba de carga de la caducidad de sesiones.
+
+Simula usuarios activos que navegan continuamente por /panel con tokens de vida
+muy corta. Cuando un usuario es enviado a /login vuelve a iniciar sesión (pagando
+el hash de la contraseña). Se cuentan los inicios de sesión por segundo para
+comparar el comportamiento sin renovación (token fijo) y con renovación deslizante.
+Al terminar se comprueba que ningún inicio de sesión ha vuelto a calcular y guardar el
+hash recién creado en el registro (termina con código 1 si alguno lo hizo).
+
+Uso:
+    python benchmarks/bench_sesiones.py --usuarios 20 --segundos 12 --vida 3
+    python benchmarks/bench_sesiones.py --sin-renovacion
+    python benchmarks/bench_sesiones.py --metodo-hash scrypt
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from comun import RAIZ, Cliente, preparar_app, iniciar_servidor
+
+
+def usuario_activo(puerto, nombre, inicio, fin, logins, lock):
+    cliente = Cliente(puerto)
+    cliente.peticion('POST', '/login', {'usuario': nombre, 'password': nombre})
+    while time.perf_counter() < fin:
+        respuesta = cliente.peticion('GET', '/panel')
+        if respuesta.status == 302:
+            cliente.peticion('POST', '/login', {'usuario': nombre, 'password': nombre})
+            with lock:
+                logins[int(time.perf_counter() - inicio)] += 1
+        time.sleep(0.05)
+    cliente.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--segundos', type=float, default=12.0)
+    parser.add_argument('--vida', type=float, default=3.0, help="vida del token de acceso en segundos")
+    parser.add_argument('--sin-renovacion', action='store_true', help="comportamiento anterior: token fijo")
+    parser.add_argument('--metodo-hash', default=None,
+                        help="PASSWORD_HASH_METHOD (p. ej. 'scrypt', abreviado); por defecto, el de la aplicación")
+    args = parser.parse_args()
+
+    vida = datetime.timedelta(seconds=args.vida)
+    config = {'TOKEN_LIFETIME': vida, 'TOKEN_REFRESH_MARGIN': vida / 2}
+    if args.sin_renovacion:
+        config.update(TOKEN_REFRESH_MARGIN=datetime.timedelta(0), REFRESH_TOKEN_ENABLED=False)
+    if args.metodo_hash:
+        config['PASSWORD_HASH_METHOD'] = args.metodo_hash
+
+    with tempfile.TemporaryDirectory() as directorio:
+        app = preparar_app(directorio, **config)
+        servidor = iniciar_servidor(app)
+        nombres = [f'usuario{i}' for i in range(args.usuarios)]
+        for nombre in nombres:
+            cliente = Cliente(servidor.port)
+            cliente.peticion('POST', '/registro', {'usuario': nombre, 'password': nombre, 'confirmar': nombre, 'pais': 'GE'})
+            cliente.cerrar()
+        import repositorio
+        repo = repositorio.get_repositorio(app)
+        hashes = {nombre: repo.usuario_por_nombre(nombre)['password'] for nombre in nombres}
+
+        logins, lock = Counter(), threading.Lock()
+        inicio = time.perf_counter()
+        fin = inicio + args.segundos
+        hilos = [
+            threading.Thread(target=usuario_activo, args=(servidor.port, nombre, inicio, fin, logins, lock))
+            for nombre in nombres
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        servidor.shutdown()
+        rehasheados = sum(repo.usuario_por_nombre(nombre)['password'] != hashes[nombre] for nombre in nombres)
+
+        modo = "sin renovación" if args.sin_renovacion else "con renovación deslizante"
+        print(f"{modo}: {sum(logins.values())} reinicios de sesión en {args.segundos:.0f}s "
+              f"({args.usuarios} usuarios, token de {args.vida:.0f}s)")
+        for segundo in range(int(args.segundos) + 1):
+            print(f"  t={segundo:>3}s  {'#' * logins[segundo]} {logins[segundo] or ''}")
+        print(f"hashes recalculados al iniciar sesión: {rehasheados} (deben ser 0)")
+        os.chdir(RAIZ)
+    sys.exit(1 if rehasheados else 0)
+
+
+if __name__ == '__main__':
+    main()
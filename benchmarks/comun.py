@@ -0,0 +1,151 @@
+"""
+Utilidades compartidas por los benchmarks: aplicación sobre una base de datos
+temporal, servidor WSGI local silencioso, un cliente HTTP mínimo con cookies y
+el guardado de resultados en JSON con comparación contra una referencia.
+"""
+import datetime
+import http.client
+import json
+import math
+import os
+import platform
+import sys
+import threading
+from urllib.parse import urlencode
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def preparar_app(directorio, **config):
+    """
+    Crea una aplicación con el directorio temporal como directorio actual (ahí se crea db.db)
+    y aplica las migraciones, como haría el proceso principal antes de arrancar los trabajadores.
+    El límite de peticiones se desactiva salvo que se pida: toda la carga sale de la misma IP.
+    """
+    config.setdefault('RATE_LIMIT_ENABLED', False)
+    os.chdir(directorio)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import app as modulo_app
+    import repositorio
+    app = modulo_app.crear_app(config)
+    repositorio.migrar(app.config)
+    return app
+
+
+def iniciar_servidor(app):
+    """Arranca la app en un servidor WSGI con hilos en un puerto libre y lo devuelve."""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class ManejadorSilencioso(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=ManejadorSilencioso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+class Cliente:
+    """Cliente HTTP con conexión persistente y cookies, sin seguir redirecciones."""
+
+    def __init__(self, puerto):
+        self.conn = http.client.HTTPConnection('127.0.0.1', puerto)
+        self.cookies = {}
+
+    def peticion(self, metodo, ruta, datos=None, cabeceras=None):
+        cabeceras = dict(cabeceras or {})
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode(datos, doseq=True)
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            cabeceras['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        self.conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+        respuesta = self.conn.getresponse()
+        respuesta.read()
+        for cabecera in respuesta.headers.get_all('Set-Cookie') or []:
+            nombre, valor = cabecera.split(';', 1)[0].split('=', 1)
+            if valor and 'Max-Age=0' not in cabecera and 'expires=Thu, 01 Jan 1970' not in cabecera:
+                self.cookies[nombre] = valor
+            else:
+                self.cookies.pop(nombre, None)
+        return respuesta
+
+    def cerrar(self):
+        self.conn.close()
+
+
+# --- RESULTADOS Y COMPARACIÓN CON UNA REFERENCIA ---
+
+def percentil(muestras_ordenadas, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not muestras_ordenadas:
+        return 0.0
+    rango = math.ceil(p / 100 * len(muestras_ordenadas))
+    return muestras_ordenadas[min(max(rango, 1), len(muestras_ordenadas)) - 1]
+
+
+def argumentos_resultados(parser):
+    """Añade las opciones comunes de guardado y comparación de resultados."""
+    parser.add_argument('--salida', help="archivo JSON donde guardar los resultados")
+    parser.add_argument('--referencia', help="resultados JSON anteriores con los que comparar")
+    parser.add_argument('--umbral', type=float, default=0.10,
+                        help="empeoramiento relativo tolerado antes de marcar una regresión (por defecto 0.10)")
+
+
+def metrica(valor, unidad, mayor_es_mejor):
+    return {'valor': valor, 'unidad': unidad, 'mayor_es_mejor': mayor_es_mejor}
+
+
+def comparar(metricas, referencia, umbral):
+    """
+    Compara cada métrica con la de la referencia. Devuelve una lista de
+    (nombre, anterior, actual, cambio relativo, es_regresión) con las métricas comunes.
+    """
+    filas = []
+    for nombre, actual in metricas.items():
+        anterior = referencia.get(nombre)
+        if not anterior or not anterior['valor']:
+            continue
+        cambio = (actual['valor'] - anterior['valor']) / anterior['valor']
+        empeora = -cambio if actual['mayor_es_mejor'] else cambio
+        filas.append((nombre, anterior['valor'], actual['valor'], cambio, empeora > umbral))
+    return filas
+
+
+def finalizar(nombre, parametros, metricas, args):
+    """
+    Guarda los resultados (si se pidió --salida) y los compara con --referencia.
+    Devuelve el código de salida del proceso: 1 si hay alguna regresión por encima del umbral.
+    """
+    resultados = {
+        'benchmark': nombre,
+        'fecha': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'parametros': parametros,
+        'metricas': metricas,
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.salida}")
+
+    if not args.referencia:
+        return 0
+    with open(args.referencia, encoding='utf-8') as archivo:
+        referencia = json.load(archivo)
+    if referencia.get('benchmark') != nombre:
+        print(f"La referencia es de otro benchmark ({referencia.get('benchmark')}); no se compara.")
+        return 0
+
+    filas = comparar(metricas, referencia['metricas'], args.umbral)
+    regresiones = 0
+    print(f"\nComparación con {args.referencia} (umbral {args.umbral:.0%}):")
+    for nombre_metrica, anterior, actual, cambio, regresion in filas:
+        marca = 'REGRESIÓN' if regresion else ''
+        print(f"  {nombre_metrica:<45} {anterior:>12.2f} -> {actual:>12.2f}  {cambio:+7.1%} {marca}")
+        regresiones += regresion
+    print(f"{regresiones} regresiones." if regresiones else "Sin regresiones.")
+    return 1 if regresiones else 0
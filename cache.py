@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- CACHÉ LRU CON CADUCIDAD ---
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    """
+    Caché en memoria acotada por número de entradas (LRU) y con caducidad opcional (TTL).
+    Es segura entre hilos y lleva la cuenta de aciertos y fallos para poder dimensionarla.
+    Una entrada guardada con `version` solo se devuelve a quien pide esa misma versión.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave, defecto=None, version=None):
+        """Devuelve el valor de la clave o `defecto` si no está, ha caducado o es de otra versión."""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is not _AUSENTE:
+                valor, caduca, guardada = entrada
+                if (caduca is None or caduca > ahora) and guardada == version:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+            self.fallos += 1
+            return defecto
+
+    def guardar(self, clave, valor, ttl=None, version=None):
+        """Guarda el valor; `ttl` permite indicar una caducidad distinta a la de la caché."""
+        ttl = self.ttl if ttl is None else ttl
+        caduca = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._datos[clave] = (valor, caduca, version)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def invalidar(self, clave):
+        """Elimina la entrada de la clave, si existe."""
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        """Vacía la caché sin reiniciar los contadores."""
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        """Devuelve los contadores de uso de la caché."""
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+                'tasa_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,228 @@
+import contextlib
+import csv
+import itertools
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash
+
+# --- IMPORTACIÓN Y EXPORTACIÓN MASIVA DE USUARIOS ---
+#
+# Para dar de alta una promoción entera sin pasar usuario a usuario por /registro.
+# La importación lee el archivo en streaming y lo procesa por lotes:
+#  1. descarta las filas incompletas y los nombres repetidos dentro del lote;
+#  2. consulta de una vez qué nombres del lote ya existen, para no calcular su hash;
+#  3. calcula los hashes que faltan en paralelo en un pool de procesos (las filas que
+#     ya traen `password_hash`, p. ej. de una exportación, no se vuelven a hashear);
+#  4. inserta el lote con executemany en una sola transacción.
+# La exportación recorre la tabla con un cursor de SQLite (las filas se leen a medida
+# que se piden, con fetchmany), así que la memoria no depende del número de usuarios.
+
+CAMPOS_EXPORTACION = ('id', 'usuario', 'pais', 'fecha_registro')
+DUPLICADOS = ('omitir', 'actualizar', 'error')
+CAMPOS_IMPORTACION = ('usuario', 'pais', 'password', 'password_hash')
+# Hash de werkzeug: método$sal$hash, con los métodos que sabe verificar (scrypt y pbkdf2)
+FORMATO_HASH = re.compile(r'(scrypt(:\d+:\d+:\d+)?|pbkdf2(:\w+(:\d+)?)?)\$[^$]+\$[0-9a-f]+')
+
+SQL_INSERTAR = {
+    'omitir': '''
+        INSERT INTO usuarios (usuario, password, pais) VALUES (?, ?, ?)
+        ON CONFLICT (usuario) DO NOTHING
+    ''',
+    'actualizar': '''
+        INSERT INTO usuarios (usuario, password, pais) VALUES (?, ?, ?)
+        ON CONFLICT (usuario) DO UPDATE SET password = excluded.password, pais = excluded.pais
+    ''',
+    'error': 'INSERT INTO usuarios (usuario, password, pais) VALUES (?, ?, ?)',
+}
+
+
+def _hash(password, metodo):
+    return generate_password_hash(password, method=metodo)
+
+
+@contextlib.contextmanager
+def abrir(ruta, modo='r'):
+    """Abre el archivo en texto UTF-8 sin traducir saltos de línea (lo que pide csv); '-' es stdin/stdout."""
+    if ruta == '-':
+        yield sys.stdin if modo == 'r' else sys.stdout
+        return
+    with open(ruta, modo, encoding='utf-8', newline='') as archivo:
+        yield archivo
+
+
+def formato_de(ruta, formato=None):
+    """Formato indicado o, si no, el de la extensión del archivo ('csv' o 'jsonl')."""
+    if formato:
+        return formato
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"No se reconoce el formato de '{ruta}'; indica 'csv' o 'jsonl'.")
+
+
+def leer_filas(archivo, formato):
+    """Genera (número de línea, dict) de un archivo CSV con cabecera o JSON Lines."""
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+    else:
+        for numero, linea in enumerate(archivo, 1):
+            if linea.strip():
+                try:
+                    yield numero, json.loads(linea)
+                except ValueError:
+                    yield numero, None
+
+
+class Informe:
+    """Contadores de una importación, con una línea de progreso por lote."""
+
+    def __init__(self, salida=sys.stderr):
+        self.leidas = 0
+        self.insertadas = 0
+        self.actualizadas = 0
+        self.duplicadas = 0
+        self.invalidas = 0
+        self.hashes = 0
+        self.salida = salida
+        self.inicio = time.perf_counter()
+
+    def progreso(self):
+        transcurrido = time.perf_counter() - self.inicio
+        print(f"{self.leidas} filas leídas: {self.insertadas} insertadas, {self.actualizadas} actualizadas, "
+              f"{self.duplicadas} duplicadas, {self.invalidas} inválidas "
+              f"({self.leidas / transcurrido if transcurrido else 0:.0f} filas/s)", file=self.salida)
+
+
+def _invalida(numero, motivo, informe):
+    informe.invalidas += 1
+    print(f"Línea {numero}: {motivo}; se omite.", file=informe.salida)
+
+
+def _validar(numero, fila, informe):
+    """Devuelve (usuario, password, password_hash, pais) o None si la fila no sirve."""
+    if not isinstance(fila, dict):
+        _invalida(numero, "no es un objeto válido", informe)
+        return None
+    # En JSON Lines puede llegar cualquier tipo: todos los campos deben ser texto
+    if any(fila.get(campo) is not None and not isinstance(fila.get(campo), str) for campo in CAMPOS_IMPORTACION):
+        _invalida(numero, f"{', '.join(repr(campo) for campo in CAMPOS_IMPORTACION)} deben ser texto", informe)
+        return None
+    usuario = (fila.get('usuario') or '').strip()
+    pais = (fila.get('pais') or '').strip()
+    password = fila.get('password') or ''
+    password_hash = fila.get('password_hash') or ''
+    if not usuario or not pais or not (password or password_hash):
+        _invalida(numero, "faltan 'usuario', 'pais' o la contraseña", informe)
+        return None
+    if password_hash and not FORMATO_HASH.fullmatch(password_hash):
+        _invalida(numero, "'password_hash' no es un hash de werkzeug (método$sal$hash)", informe)
+        return None
+    return usuario, password, password_hash, pais
+
+
+def _existentes(conn, nombres):
+    existentes = set()
+    # SQLite admite un número limitado de parámetros por sentencia
+    for inicio in range(0, len(nombres), 500):
+        tramo = nombres[inicio:inicio + 500]
+        marcadores = ','.join('?' * len(tramo))
+        existentes.update(fila[0] for fila in conn.execute(
+            f'SELECT usuario FROM usuarios WHERE usuario IN ({marcadores})', tramo))
+    return existentes
+
+
+def importar_usuarios(conn, filas, metodo_hash, tam_lote=1000, procesos=None, duplicados='omitir', informe=None):
+    """
+    Importa usuarios desde un iterable de (número de línea, dict) con 'usuario', 'pais' y
+    'password' (en claro) o 'password_hash' (ya calculado).
+    `duplicados`: 'omitir' los nombres que ya existen, 'actualizar' su contraseña y país,
+    o 'error' para abortar el lote (sqlite3.IntegrityError) sin tocar los anteriores.
+    Devuelve el Informe con los contadores.
+    """
+    if duplicados not in DUPLICADOS:
+        raise ValueError(f"'duplicados' debe ser uno de {DUPLICADOS}.")
+    informe = informe or Informe()
+    sql = SQL_INSERTAR[duplicados]
+    filas = iter(filas)
+    procesos = procesos or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        while True:
+            bloque = list(itertools.islice(filas, tam_lote))
+            if not bloque:
+                break
+            informe.leidas += len(bloque)
+
+            lote = {}
+            for numero, fila in bloque:
+                datos = _validar(numero, fila, informe)
+                if datos is None:
+                    continue
+                if datos[0] in lote:
+                    informe.duplicadas += 1
+                    continue
+                lote[datos[0]] = datos
+
+            existentes = _existentes(conn, list(lote))
+            if duplicados == 'omitir':
+                informe.duplicadas += len(existentes)
+                for usuario in existentes:
+                    del lote[usuario]
+            elif duplicados == 'error' and existentes:
+                # Antes de gastar tiempo en los hashes del lote
+                raise sqlite3.IntegrityError(f"Usuarios ya registrados: {', '.join(sorted(existentes)[:10])}")
+
+            # Solo se hashean las contraseñas en claro, repartidas entre los procesos del pool
+            pendientes = [datos for datos in lote.values() if not datos[2]]
+            trozo = max(1, len(pendientes) // (4 * procesos))
+            hashes = dict(zip(
+                (datos[0] for datos in pendientes),
+                pool.map(_hash, [datos[1] for datos in pendientes], itertools.repeat(metodo_hash), chunksize=trozo),
+            ))
+            informe.hashes += len(hashes)
+
+            registros = [(usuario, password_hash or hashes[usuario], pais)
+                         for usuario, _, password_hash, pais in lote.values()]
+            with conn:
+                conn.executemany(sql, registros)
+
+            actualizadas = len(existentes) if duplicados == 'actualizar' else 0
+            informe.actualizadas += actualizadas
+            informe.insertadas += len(registros) - actualizadas
+            informe.progreso()
+    return informe
+
+
+def exportar_usuarios(conn, destino, formato, incluir_hash=False, tam_lote=1000):
+    """
+    Escribe los usuarios en `destino` (un archivo de texto abierto) en CSV o JSON Lines,
+    leyendo la tabla por tramos con el cursor. Devuelve el número de usuarios exportados.
+    Con `incluir_hash`, añade 'password_hash' para poder importarlos en otra instancia.
+    """
+    campos = CAMPOS_EXPORTACION + (('password_hash',) if incluir_hash else ())
+    columnas = ', '.join(CAMPOS_EXPORTACION) + (', password' if incluir_hash else '')
+    cursor = conn.execute(f'SELECT {columnas} FROM usuarios ORDER BY id')
+
+    escritor = csv.writer(destino) if formato == 'csv' else None
+    if escritor:
+        escritor.writerow(campos)
+    exportados = 0
+    while True:
+        filas = cursor.fetchmany(tam_lote)
+        if not filas:
+            break
+        if escritor:
+            escritor.writerows(tuple(fila) for fila in filas)
+        else:
+            destino.writelines(json.dumps(dict(zip(campos, fila)), ensure_ascii=False) + '\n' for fila in filas)
+        exportados += len(filas)
+    return exportados
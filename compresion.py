@@ -0,0 +1,52 @@
+import gzip
+import hashlib
+from flask import request
+
+# --- ETAGS Y COMPRESIÓN DE RESPUESTAS HTML ---
+#
+# Para las páginas HTML generadas en cada petición:
+#  - en GET se calcula un ETag fuerte a partir del contenido; si coincide con el
+#    If-None-Match del navegador se responde 304 sin cuerpo;
+#  - si el cuerpo supera COMPRESS_MIN_SIZE y el cliente acepta gzip, se comprime.
+# El ETag de la variante comprimida lleva el sufijo '-gz', ya que su contenido es distinto.
+
+TIPOS_DINAMICOS = ('text/html',)
+
+
+class Compresion:
+    def __init__(self, app):
+        self.min_tamano = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.nivel = app.config.get('COMPRESS_LEVEL', 6)
+        app.after_request(self.procesar)
+
+    def procesar(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in TIPOS_DINAMICOS):
+            return response
+
+        cuerpo = response.get_data()
+        comprimir = len(cuerpo) >= self.min_tamano and request.accept_encodings['gzip'] > 0
+
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            etag = hashlib.blake2b(cuerpo, digest_size=16).hexdigest() + ('-gz' if comprimir else '')
+            response.set_etag(etag)
+            # Las páginas son personales: solo el navegador las guarda, y siempre las revalida
+            response.headers.setdefault('Cache-Control', 'private, no-cache')
+            if etag in request.if_none_match:
+                response.status_code = 304
+                response.set_data(b'')
+                response.headers.pop('Content-Length', None)
+                return response
+
+        if comprimir:
+            response.set_data(gzip.compress(cuerpo, compresslevel=self.nivel))
+            response.headers['Content-Encoding'] = 'gzip'
+        if len(cuerpo) >= self.min_tamano:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def init_app(app):
+    app.extensions['senda7_compresion'] = Compresion(app)
+    return app.extensions['senda7_compresion']
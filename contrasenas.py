@@ -0,0 +1,132 @@
+import atexit
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from metricas import medir
+
+# --- HASH DE CONTRASEÑAS EN UN POOL DE PROCESOS ---
+
+# Parámetros por defecto; coinciden con los de los hashes ya guardados en db.db
+METODO_HASH_POR_DEFECTO = 'scrypt:32768:8:1'
+
+
+class PoolSaturado(Exception):
+    """Se lanza cuando la cola del pool de hashing está llena o la operación tarda demasiado."""
+
+
+def _generar(password, metodo):
+    return generate_password_hash(password, method=metodo)
+
+
+def _verificar(hash_guardado, password):
+    return check_password_hash(hash_guardado, password)
+
+
+@functools.lru_cache(maxsize=None)
+def metodo_completo(metodo):
+    """
+    Método tal como werkzeug lo escribe al principio del hash: completa los parámetros que
+    falten ('scrypt' -> 'scrypt:32768:8:1', 'pbkdf2:sha256' -> 'pbkdf2:sha256:<iteraciones>').
+    """
+    return generate_password_hash('x', method=metodo).split('$', 1)[0]
+
+
+class PoolHashing:
+    """
+    Ejecuta el hash y la verificación de contraseñas en un pool de procesos de tamaño fijo.
+    Un semáforo limita las operaciones en curso (trabajadores + cola); si está lleno,
+    se rechaza la petición en lugar de acumularla.
+    """
+
+    def __init__(self, trabajadores, max_cola, timeout):
+        self.trabajadores = trabajadores
+        self.timeout = timeout
+        self._plazas = threading.BoundedSemaphore(trabajadores + max_cola if trabajadores else max_cola)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.rechazadas = 0
+
+    def _get_executor(self):
+        # El pool se crea en el primer uso, para no heredarlo en procesos que nunca hashean
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.trabajadores)
+        return self._executor
+
+    def ejecutar(self, funcion, *args):
+        if not self._plazas.acquire(blocking=False):
+            self.rechazadas += 1
+            raise PoolSaturado("Demasiadas operaciones de contraseña en curso.")
+
+        if not self.trabajadores:
+            # Sin pool de procesos: se ejecuta en el hilo actual, con el mismo control de admisión
+            try:
+                return funcion(*args)
+            finally:
+                self._plazas.release()
+
+        try:
+            futuro = self._get_executor().submit(funcion, *args)
+        except Exception:
+            self._plazas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._plazas.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturesTimeout:
+            self.rechazadas += 1
+            raise PoolSaturado("La operación de contraseña ha tardado demasiado.")
+
+    def cerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+def init_app(app):
+    """Crea el pool de hashing de la aplicación según su configuración."""
+    trabajadores = app.config.get('HASH_POOL_WORKERS')
+    if trabajadores is None:
+        trabajadores = os.cpu_count() or 1
+    pool = PoolHashing(
+        trabajadores,
+        max_cola=app.config.get('HASH_POOL_QUEUE', 2 * max(trabajadores, 1)),
+        timeout=app.config.get('HASH_TIMEOUT', 5.0),
+    )
+    app.extensions['senda7_hashing'] = pool
+    # necesita_rehash compara con la forma completa: con un método abreviado en la
+    # configuración, cada inicio de sesión volvería a calcular y guardar el hash
+    app.extensions['senda7_metodo_hash'] = metodo_completo(
+        app.config.get('PASSWORD_HASH_METHOD', METODO_HASH_POR_DEFECTO))
+    atexit.register(pool.cerrar)
+
+
+def _pool():
+    return current_app.extensions['senda7_hashing']
+
+
+def _metodo():
+    return current_app.extensions['senda7_metodo_hash']
+
+
+def generar_hash(password):
+    """Genera el hash de la contraseña con los parámetros configurados. Puede lanzar PoolSaturado."""
+    with medir('hash'):
+        return _pool().ejecutar(_generar, password, _metodo())
+
+
+def verificar_hash(hash_guardado, password):
+    """Comprueba la contraseña contra el hash guardado. Puede lanzar PoolSaturado."""
+    with medir('hash'):
+        return _pool().ejecutar(_verificar, hash_guardado, password)
+
+
+def necesita_rehash(hash_guardado):
+    """Indica si el hash guardado usa parámetros distintos a los configurados actualmente."""
+    return hash_guardado.split('$', 1)[0] != _metodo()
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import threading
+import time
+from flask import current_app
+
+# --- ÍNDICE EN MEMORIA DE NOMBRES DE USUARIO ---
+#
+# Responde "¿está libre este nombre?" mientras el usuario rellena el registro sin ir
+# al repositorio de usuarios en cada consulta:
+#  - por defecto, con el conjunto exacto de los nombres registrados;
+#  - con USERNAME_INDEX_EXACT desactivado (muchos usuarios, poca memoria), con un filtro
+#    de Bloom de ~1,2 bytes por nombre: descarta sin consultar los nombres libres (lo
+#    habitual en un registro, sin falsos negativos) y solo los que da por posibles se
+#    confirman con usuario_por_nombre (en SQLite, una consulta por la clave UNIQUE).
+# Con el conjunto exacto no se consulta antes el filtro: en Python, calcular sus k
+# posiciones cuesta más que buscar en el conjunto.
+# El índice se carga al arrancar y se pone al día con los usuarios nuevos (id mayor que
+# el último leído) como mucho una vez por USERNAME_INDEX_SYNC_INTERVAL, así que también
+# ve los registros hechos por otros trabajadores. Es orientativo: quien decide es la
+# restricción UNIQUE de usuarios.usuario en el INSERT del registro (o el repositorio).
+
+
+class FiltroBloom:
+    """Filtro de Bloom sobre un bytearray, dimensionado para `capacidad` claves con la tasa de falsos positivos pedida."""
+
+    def __init__(self, capacidad, tasa_falsos=0.01):
+        self.capacidad = max(capacidad, 1)
+        self.num_bits = max(8, math.ceil(-self.capacidad * math.log(tasa_falsos) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacidad * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.claves = 0
+
+    def _posiciones(self, clave):
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de un solo digest
+        digest = hashlib.blake2b(clave.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def agregar(self, clave):
+        for posicion in self._posiciones(clave):
+            self.bits[posicion >> 3] |= 1 << (posicion & 7)
+        self.claves += 1
+
+    def __contains__(self, clave):
+        return all(self.bits[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+
+class IndiceUsuarios:
+    """
+    Nombres de usuario registrados, en un conjunto exacto o en un filtro de Bloom.
+    Las consultas reciben el repositorio y solo lo usan para ponerse al día o (con el
+    filtro) para confirmar un posible positivo.
+    """
+
+    def __init__(self, capacidad=100000, tasa_falsos=0.01, exacto=True, intervalo=1.0):
+        self.capacidad = capacidad
+        self.tasa_falsos = tasa_falsos
+        self.exacto = exacto
+        self.intervalo = intervalo
+        self._nombres = set() if exacto else None
+        self._filtro = None if exacto else FiltroBloom(capacidad, tasa_falsos)
+        self._ultimo_id = 0
+        self._sincronizado = None
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.descartados_filtro = 0
+        self.consultas_sqlite = 0
+        self.sincronizaciones = 0
+
+    def sincronizar(self, repo):
+        """Añade los usuarios registrados desde la última sincronización (en cualquier proceso)."""
+        with self._lock:
+            filas = repo.usuarios_desde(self._ultimo_id)
+            for _, usuario in filas:
+                self._agregar(usuario)
+            if filas:
+                self._ultimo_id = filas[-1][0]
+            if self._filtro is not None and self._filtro.claves > self._filtro.capacidad:
+                self._redimensionar(repo)
+            self._sincronizado = time.monotonic()
+            self.sincronizaciones += 1
+
+    def _redimensionar(self, repo):
+        # Pasada la capacidad, los falsos positivos se disparan: se rehace el filtro con el doble
+        nombres = [usuario for _, usuario in repo.usuarios_desde(0)]
+        self.capacidad = max(self.capacidad * 2, len(nombres) * 2)
+        filtro = FiltroBloom(self.capacidad, self.tasa_falsos)
+        for nombre in nombres:
+            filtro.agregar(nombre)
+        self._filtro = filtro
+
+    def _agregar(self, usuario):
+        if self._nombres is not None:
+            self._nombres.add(usuario)
+        else:
+            self._filtro.agregar(usuario)
+
+    def agregar(self, usuario):
+        """Registra un nombre recién insertado por este proceso (la sincronización lo volverá a ver, sin efecto)."""
+        with self._lock:
+            self._agregar(usuario)
+
+    def existe(self, usuario, repo):
+        """True si el nombre ya está registrado."""
+        self.consultas += 1
+        if self._sincronizado is None or time.monotonic() - self._sincronizado >= self.intervalo:
+            self.sincronizar(repo)
+        if self._nombres is not None:
+            return usuario in self._nombres
+        if usuario not in self._filtro:
+            self.descartados_filtro += 1
+            return False
+        self.consultas_sqlite += 1
+        return repo.usuario_por_nombre(usuario) is not None
+
+    def estadisticas(self):
+        estadisticas = {
+            'modo': 'exacto' if self._nombres is not None else 'filtro_bloom',
+            'usuarios': len(self._nombres) if self._nombres is not None else self._filtro.claves,
+            'consultas': self.consultas,
+            'consultas_sqlite': self.consultas_sqlite,
+            'sincronizaciones': self.sincronizaciones,
+        }
+        if self._filtro is not None:
+            estadisticas.update(capacidad=self.capacidad, bytes_filtro=len(self._filtro.bits),
+                                funciones_hash=self._filtro.num_hashes, descartados_filtro=self.descartados_filtro)
+        return estadisticas
+
+
+def init_app(app):
+    app.extensions['senda7_indice_usuarios'] = IndiceUsuarios(
+        capacidad=app.config.get('USERNAME_INDEX_CAPACITY', 100000),
+        tasa_falsos=app.config.get('USERNAME_INDEX_FP_RATE', 0.01),
+        exacto=app.config.get('USERNAME_INDEX_EXACT', True),
+        intervalo=app.config.get('USERNAME_INDEX_SYNC_INTERVAL', 1.0),
+    )
+    return app.extensions['senda7_indice_usuarios']
+
+
+def get_indice(app=None):
+    """Devuelve el índice de nombres de usuario de la aplicación indicada o de la actual."""
+    app = app or current_app
+    return app.extensions['senda7_indice_usuarios']
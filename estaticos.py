@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirven las variantes gzip
+    brotli = None
+
+# --- ARCHIVOS ESTÁTICOS CON HUELLA Y PRECOMPRIMIDOS ---
+#
+# Al arrancar se calcula un hash del contenido de cada archivo de static/ y
+# url_for('static', filename='estilos.css') pasa a generar /static/estilos.<hash>.css.
+# Como la URL cambia cuando cambia el contenido, esas respuestas pueden cachearse
+# un año con 'immutable' y el navegador no vuelve a pedirlas.
+# Los archivos de texto se comprimen una sola vez (gzip y, si está instalado, brotli)
+# y se sirve la variante que admita el cliente según Accept-Encoding.
+
+TIPOS_COMPRIMIBLES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+TAMANO_MINIMO_COMPRESION = 512  # bytes; por debajo, la compresión no compensa
+CACHE_INMUTABLE = 'public, max-age={}, immutable'
+
+
+class Recurso:
+    """Un archivo estático con su huella y, si es de texto, sus variantes comprimidas en memoria."""
+
+    def __init__(self, nombre, ruta):
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+        self.nombre = nombre
+        self.huella = hashlib.sha256(contenido).hexdigest()[:12]
+        base, extension = os.path.splitext(nombre)
+        self.nombre_huella = f"{base}.{self.huella}{extension}"
+        self.tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+        self.variantes = {}
+        if self.tipo.startswith(TIPOS_COMPRIMIBLES) and len(contenido) >= TAMANO_MINIMO_COMPRESION:
+            self.variantes['identity'] = contenido
+            self.variantes['gzip'] = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variantes['br'] = brotli.compress(contenido, quality=11)
+
+    def elegir_variante(self, aceptadas):
+        """Devuelve la codificación más pequeña que acepte el cliente ('br', 'gzip' o 'identity')."""
+        for codificacion in ('br', 'gzip'):
+            if codificacion in self.variantes and aceptadas[codificacion] > 0:
+                return codificacion
+        return 'identity'
+
+
+class Estaticos:
+    def __init__(self, app):
+        self.carpeta = app.static_folder
+        self.response_class = app.response_class
+        self.max_age = app.config.get('STATIC_MAX_AGE', 365 * 24 * 3600)
+        self.por_nombre = {}
+        self.por_huella = {}
+        self.cargar()
+
+        app.url_defaults(self._url_con_huella)
+        self._servir_original = app.view_functions['static']
+        app.view_functions['static'] = self.servir
+
+    def cargar(self):
+        """Calcula las huellas y las variantes comprimidas de todos los archivos estáticos."""
+        for directorio, _, archivos in os.walk(self.carpeta):
+            for archivo in archivos:
+                ruta = os.path.join(directorio, archivo)
+                nombre = os.path.relpath(ruta, self.carpeta).replace(os.sep, '/')
+                recurso = Recurso(nombre, ruta)
+                self.por_nombre[nombre] = recurso
+                self.por_huella[recurso.nombre_huella] = recurso
+
+    def _url_con_huella(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            recurso = self.por_nombre.get(values['filename'])
+            if recurso is not None:
+                values['filename'] = recurso.nombre_huella
+
+    def servir(self, filename):
+        recurso = self.por_huella.get(filename)
+        if recurso is None:
+            # Nombre sin huella (enlaces antiguos o escritos a mano): comportamiento normal de Flask
+            return self._servir_original(filename=filename)
+
+        if recurso.variantes:
+            codificacion = recurso.elegir_variante(request.accept_encodings)
+            response = self.response_class(recurso.variantes[codificacion], mimetype=recurso.tipo)
+            if codificacion != 'identity':
+                response.headers['Content-Encoding'] = codificacion
+            response.vary.add('Accept-Encoding')
+            response.set_etag(f"{recurso.huella}-{codificacion}")
+        else:
+            response = send_from_directory(self.carpeta, recurso.nombre, etag=recurso.huella)
+        response.headers['Cache-Control'] = CACHE_INMUTABLE.format(self.max_age)
+        return response.make_conditional(request)
+
+
+def init_app(app):
+    """Activa las URLs con huella y el servicio de variantes precomprimidas para static/."""
+    if not app.config.get('STATIC_FINGERPRINT', True) or not app.static_folder:
+        return None
+    app.extensions['senda7_estaticos'] = Estaticos(app)
+    return app.extensions['senda7_estaticos']
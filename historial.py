@@ -0,0 +1,206 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from flask import current_app
+
+# --- HISTORIAL DE FORMULARIOS CON ESCRITURA DIFERIDA ---
+
+_FIN = object()
+
+SQL_INSERTAR = '''
+    INSERT INTO historial (id_usuario, categoria, datos, recomendacion, fecha)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+
+class LoteIncompleto(sqlite3.Error):
+    """
+    Solo se guardó parte del lote (el repositorio particionado escribe cada partición en su
+    propia transacción); `pendientes` son los registros que no se guardaron.
+    """
+
+    def __init__(self, mensaje, pendientes):
+        super().__init__(mensaje)
+        self.pendientes = pendientes
+
+
+class EscritorDiferido:
+    """
+    Guarda los envíos de formularios en segundo plano.
+    Las peticiones solo añaden el registro a una cola en memoria; un hilo la vacía y
+    agrupa las inserciones en lotes (por tamaño o por intervalo) que pasa a `guardar`
+    (el guardar_historial del repositorio: una transacción por lote).
+    Si la cola está llena, la petición espera un poco (contrapresión) y, si sigue llena,
+    escribe el registro ella misma para no perderlo.
+    """
+
+    def __init__(self, guardar, intervalo=1.0, tam_lote=200, tam_cola=10000, espera_cola=0.5):
+        self.guardar = guardar
+        self.intervalo = intervalo
+        self.tam_lote = tam_lote
+        self.tam_cola = tam_cola
+        self.espera_cola = espera_cola
+        self.escritos = 0
+        self.escritos_sincronos = 0
+        self.perdidos = 0
+        self.lotes = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+
+    def _arrancar(self):
+        # El hilo no sobrevive a un fork: cada proceso arranca el suyo con su propia cola
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid():
+                return
+            self._cola = queue.Queue(maxsize=self.tam_cola)
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name='senda7-historial', daemon=True)
+            self._hilo.start()
+
+    def encolar(self, registro):
+        """Añade un registro (tupla con las columnas de SQL_INSERTAR) a la cola de escritura."""
+        if self._hilo is None or self._pid != os.getpid():
+            self._arrancar()
+        try:
+            self._cola.put(registro, timeout=self.espera_cola)
+        except queue.Full:
+            self._escribir_sincrono(registro)
+
+    def _escribir_sincrono(self, registro):
+        try:
+            self.guardar([registro])
+            self.escritos_sincronos += 1
+        except sqlite3.Error as e:
+            self.perdidos += 1
+            print(f"Error al guardar un registro del historial: {e}")
+
+    def _recoger_lote(self):
+        lote = []
+        fin = False
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tam_lote:
+            restante = limite - time.monotonic()
+            try:
+                registro = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if registro is _FIN:
+                fin = True
+                break
+            lote.append(registro)
+        return lote, fin
+
+    def _escribir_lote(self, lote):
+        try:
+            self.guardar(lote)
+            self.escritos += len(lote)
+            self.lotes += 1
+        except sqlite3.Error as e:
+            # Un registro inválido no debe hacer perder el lote entero: se reintenta uno a uno
+            # (solo lo que no llegó a guardarse, si se guardó una parte)
+            pendientes = getattr(e, 'pendientes', lote)
+            self.escritos += len(lote) - len(pendientes)
+            for registro in pendientes:
+                try:
+                    self.guardar([registro])
+                    self.escritos += 1
+                except sqlite3.Error as e:
+                    self.perdidos += 1
+                    print(f"Error al guardar un registro del historial: {e}")
+
+    def _bucle(self):
+        fin = False
+        while not fin:
+            lote, fin = self._recoger_lote()
+            if lote:
+                self._escribir_lote(lote)
+        # Al detenerse se vacía lo que quede en la cola
+        while True:
+            lote, _ = self._recoger_lote()
+            if not lote:
+                break
+            self._escribir_lote(lote)
+
+    def detener(self, espera=10.0):
+        """Escribe los registros pendientes y detiene el hilo (se llama al cerrar el proceso)."""
+        if self._hilo is None or self._pid != os.getpid():
+            return
+        self._cola.put(_FIN)
+        self._hilo.join(espera)
+        self._hilo = None
+
+    def estadisticas(self):
+        return {
+            'pendientes': self._cola.qsize() if self._hilo is not None else 0,
+            'escritos': self.escritos,
+            'escritos_sincronos': self.escritos_sincronos,
+            'perdidos': self.perdidos,
+            'lotes': self.lotes,
+        }
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+def init_app(app, repo):
+    """Crea el escritor diferido del historial (sobre el repositorio) y registra su vaciado al cerrar el proceso."""
+    escritor = EscritorDiferido(
+        repo.guardar_historial,
+        intervalo=app.config.get('HISTORY_FLUSH_INTERVAL', 1.0),
+        tam_lote=app.config.get('HISTORY_BATCH_SIZE', 200),
+        tam_cola=app.config.get('HISTORY_QUEUE_SIZE', 10000),
+        espera_cola=app.config.get('HISTORY_QUEUE_TIMEOUT', 0.5),
+    )
+    app.extensions['senda7_historial'] = escritor
+    atexit.register(escritor.detener)
+
+
+def get_escritor(app=None):
+    app = app or current_app
+    return app.extensions['senda7_historial']
+
+
+def registrar(id_usuario, categoria, datos, recomendacion):
+    """Guarda (de forma diferida) un envío de formulario y la recomendación generada."""
+    fecha = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    get_escritor().encolar(
+        (id_usuario, categoria, json.dumps(datos, ensure_ascii=False), recomendacion, fecha)
+    )
+
+
+def cargar_historial(conn, id_usuario, antes=None, limite=20):
+    """
+    Devuelve una página del historial del usuario, de más reciente a más antiguo
+    (los backends SQLite del repositorio; el de memoria pagina igual).
+    La paginación es por clave (id anterior al último mostrado), así que cada página
+    es una búsqueda en el índice (id_usuario, id) sin OFFSET.
+    Devuelve (filas, id para la página siguiente o None).
+    """
+    if antes is None:
+        filas = conn.execute(
+            'SELECT id, categoria, datos, recomendacion, fecha FROM historial '
+            'WHERE id_usuario = ? ORDER BY id DESC LIMIT ?',
+            (id_usuario, limite + 1),
+        ).fetchall()
+    else:
+        filas = conn.execute(
+            'SELECT id, categoria, datos, recomendacion, fecha FROM historial '
+            'WHERE id_usuario = ? AND id < ? ORDER BY id DESC LIMIT ?',
+            (id_usuario, antes, limite + 1),
+        ).fetchall()
+    siguiente = filas[limite - 1]['id'] if len(filas) > limite else None
+    registros = [
+        {
+            'categoria': fila['categoria'],
+            'datos': json.loads(fila['datos']),
+            'recomendacion': fila['recomendacion'],
+            'fecha': fila['fecha'],
+        }
+        for fila in filas[:limite]
+    ]
+    return registros, siguiente
@@ -0,0 +1,172 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, request, after_this_request
+import metricas
+
+# --- LÍMITE DE PETICIONES COMPARTIDO ENTRE TRABAJADORES ---
+#
+# Cubeta de fichas por (grupo de rutas, clave): cada petición limitada gasta una ficha
+# (o varias, p. ej. un lote de recomendaciones) y las fichas se reponen a ritmo
+# constante hasta la capacidad, que es la ráfaga permitida. Las claves son la IP y,
+# en las rutas autenticadas, el user_id del JWT; las reglas por grupo están en RATE_LIMITS.
+#
+# Las cubetas viven en una base de datos SQLite propia en modo WAL (RATE_LIMIT_DB),
+# que comparten todos los procesos del servidor. Cada cubeta se comprueba y se gasta con
+# un único UPSERT con RETURNING, atómico entre procesos; las de la IP y el usuario van en
+# la misma transacción, que se deshace si una de ellas rechaza la petición. Al ser un
+# archivo aparte, sus escrituras no compiten con las de la aplicación, y usa
+# synchronous=OFF: perder contadores en un corte de luz no importa.
+# Si el almacén no responde, la petición se deja pasar (mejor sin límite que caído).
+
+SQL_CONSUMIR = '''
+    INSERT INTO cubetas (clave, fichas, actualizado, permitido)
+    VALUES (:clave, :capacidad - :coste, :ahora, 1)
+    ON CONFLICT (clave) DO UPDATE SET
+        fichas = CASE WHEN min(:capacidad, fichas + (:ahora - actualizado) * :ritmo) >= :coste
+                      THEN min(:capacidad, fichas + (:ahora - actualizado) * :ritmo) - :coste
+                      ELSE min(:capacidad, fichas + (:ahora - actualizado) * :ritmo) END,
+        permitido = min(:capacidad, fichas + (:ahora - actualizado) * :ritmo) >= :coste,
+        actualizado = :ahora
+    RETURNING fichas, permitido
+'''
+
+
+class Regla:
+    """`peticiones` cada `segundos`, con ráfagas de hasta `peticiones`."""
+
+    def __init__(self, peticiones, segundos):
+        self.capacidad = float(peticiones)
+        self.ritmo = peticiones / segundos  # fichas por segundo
+        self.segundos = segundos
+
+
+class LimitadorPeticiones:
+    def __init__(self, ruta, reglas, busy_timeout_ms=1000, purgar_cada=1000):
+        self.ruta = ruta
+        self.reglas = {
+            grupo: {clave: Regla(*limite) for clave, limite in claves.items()}
+            for grupo, claves in reglas.items()
+        }
+        self.busy_timeout_ms = busy_timeout_ms
+        self.purgar_cada = purgar_cada
+        # Una cubeta sin uso durante su ventana más larga está llena: equivale a no tenerla
+        self.ventana_maxima = max((regla.segundos for claves in self.reglas.values() for regla in claves.values()),
+                                  default=0)
+        self._local = threading.local()
+        self._consumos = 0
+        self.errores = 0
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (no se heredan tras un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=self.busy_timeout_ms / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cubetas (
+                    clave TEXT PRIMARY KEY,
+                    fichas REAL NOT NULL,
+                    actualizado REAL NOT NULL,
+                    permitido BOOLEAN NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def consumir(self, grupo, tipo, identificador, coste=1):
+        """
+        Gasta `coste` fichas de la cubeta (grupo, tipo, identificador).
+        Devuelve 0 si la petición se permite o los segundos que hay que esperar si no.
+        """
+        rechazo = self._gastar(grupo, ((tipo, identificador),), coste)
+        return rechazo[1] if rechazo else 0
+
+    def comprobar(self, grupo, ip, id_usuario=None, coste=1):
+        """
+        Comprueba todas las claves del grupo (IP y usuario); solo se gastan fichas si todas
+        las permiten. Devuelve (tipo de la clave que se pasó del límite, segundos de espera) o None.
+        """
+        return self._gastar(grupo, (('ip', ip), ('usuario', id_usuario)), coste)
+
+    def _gastar(self, grupo, claves, coste):
+        cubetas = [(tipo, identificador, self.reglas.get(grupo, {}).get(tipo)) for tipo, identificador in claves]
+        cubetas = [(tipo, identificador, regla) for tipo, identificador, regla in cubetas
+                   if regla is not None and identificador is not None]
+        if not cubetas:
+            return None
+        rechazo = None
+        try:
+            conn = self._conexion()
+            # Con varias cubetas, todas en una transacción: si una rechaza la petición, se
+            # deshace lo gastado en las anteriores (un usuario limitado no agota la de su IP)
+            varias = len(cubetas) > 1
+            if varias:
+                conn.execute('BEGIN IMMEDIATE')
+            try:
+                ahora = time.time()
+                for tipo, identificador, regla in cubetas:
+                    # Un coste mayor que la ráfaga nunca cabría: se limita a la cubeta llena
+                    gasto = min(coste, regla.capacidad)
+                    fichas, permitido = conn.execute(SQL_CONSUMIR, {
+                        'clave': f"{grupo}|{tipo}|{identificador}", 'capacidad': regla.capacidad,
+                        'coste': gasto, 'ahora': ahora, 'ritmo': regla.ritmo,
+                    }).fetchone()
+                    if not permitido:
+                        rechazo = tipo, max(1, math.ceil((gasto - fichas) / regla.ritmo))
+                        break
+                if varias:
+                    conn.execute('ROLLBACK' if rechazo else 'COMMIT')
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            self._consumos += 1
+            if self._consumos % self.purgar_cada == 0:
+                conn.execute('DELETE FROM cubetas WHERE actualizado < ?', (time.time() - self.ventana_maxima,))
+        except sqlite3.Error as e:
+            self.errores += 1
+            print(f"Límite de peticiones no disponible ({e}); se deja pasar la petición.")
+            return None
+        return rechazo
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+def excedido(grupo, current_user=None, coste=1):
+    """
+    Aplica el límite del grupo a la petición actual (por IP y, si hay usuario, por su id).
+    Si se supera, cuenta el rechazo en las métricas, prepara la respuesta para que salga
+    con 429 y Retry-After, y devuelve el mensaje para el usuario; si no, devuelve None.
+    """
+    limitador = current_app.extensions.get('senda7_limites')
+    if limitador is None:
+        return None
+    with metricas.medir('limite'):
+        rechazo = limitador.comprobar(grupo, request.remote_addr,
+                                      current_user['id'] if current_user is not None else None, coste)
+    if rechazo is None:
+        return None
+    tipo, espera = rechazo
+    current_app.extensions['senda7_metricas'].registro.rechazar(grupo, tipo)
+
+    @after_this_request
+    def marcar_limite(response):
+        response.status_code = 429
+        response.headers['Retry-After'] = str(espera)
+        return response
+
+    return f"Demasiadas peticiones. Espera {espera} s antes de volver a intentarlo."
+
+
+def init_app(app):
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return None
+    ruta = app.config.get('RATE_LIMIT_DB') or f"{os.path.splitext(app.config['DATABASE'])[0]}.limites.db"
+    app.extensions['senda7_limites'] = LimitadorPeticiones(ruta, app.config.get('RATE_LIMITS', {}))
+    return app.extensions['senda7_limites']
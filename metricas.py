@@ -0,0 +1,298 @@
+import atexit
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request, has_app_context, template_rendered, before_render_template
+
+# --- MÉTRICAS DE PETICIONES (FORMATO TEXTO DE PROMETHEUS) ---
+#
+# Cada petición acumula en `g` el tiempo de sus componentes (decodificación del JWT,
+# consultas SQLite, hash de contraseñas y renderizado de plantillas). Al terminar, se
+# suman al registro del proceso junto con la latencia total en un histograma por endpoint.
+# Con METRICS_DIR configurado, cada proceso vuelca su registro a un archivo y /metrics
+# combina los de todos los trabajadores.
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RegistroMetricas:
+    """Contadores e histogramas de un proceso, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = {}    # "endpoint|metodo|estado" -> número de peticiones
+        self.latencia = {}      # endpoint -> [cubetas..., suma, total]
+        self.componentes = {}   # "endpoint|componente" -> [segundos, llamadas]
+        self.rechazos = {}      # "grupo|clave" -> peticiones rechazadas por el límite de peticiones
+
+    def observar(self, endpoint, metodo, estado, duracion, componentes):
+        with self._lock:
+            clave = f"{endpoint}|{metodo}|{estado}"
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+
+            histograma = self.latencia.get(endpoint)
+            if histograma is None:
+                histograma = self.latencia[endpoint] = [0] * (len(LIMITES_LATENCIA) + 2)
+            for indice, limite in enumerate(LIMITES_LATENCIA):
+                if duracion <= limite:
+                    histograma[indice] += 1
+                    break
+            histograma[-2] += duracion
+            histograma[-1] += 1
+
+            for componente, (segundos, llamadas) in componentes.items():
+                acumulado = self.componentes.setdefault(f"{endpoint}|{componente}", [0.0, 0])
+                acumulado[0] += segundos
+                acumulado[1] += llamadas
+
+    def rechazar(self, grupo, clave):
+        with self._lock:
+            clave = f"{grupo}|{clave}"
+            self.rechazos[clave] = self.rechazos.get(clave, 0) + 1
+
+    def instantanea(self):
+        with self._lock:
+            return {
+                'peticiones': dict(self.peticiones),
+                'rechazos': dict(self.rechazos),
+                'latencia': {endpoint: list(valores) for endpoint, valores in self.latencia.items()},
+                'componentes': {clave: list(valores) for clave, valores in self.componentes.items()},
+            }
+
+
+def combinar(instantaneas):
+    """Suma las instantáneas de varios procesos."""
+    total = {'peticiones': {}, 'rechazos': {}, 'latencia': {}, 'componentes': {}}
+    for instantanea in instantaneas:
+        for seccion in ('peticiones', 'rechazos'):
+            for clave, valor in instantanea.get(seccion, {}).items():
+                total[seccion][clave] = total[seccion].get(clave, 0) + valor
+        for seccion in ('latencia', 'componentes'):
+            for clave, valores in instantanea.get(seccion, {}).items():
+                acumulado = total[seccion].get(clave)
+                if acumulado is None:
+                    total[seccion][clave] = list(valores)
+                else:
+                    total[seccion][clave] = [a + b for a, b in zip(acumulado, valores)]
+    return total
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def exportar_prometheus(instantanea):
+    """Convierte una instantánea en el formato de texto de Prometheus."""
+    lineas = [
+        '# HELP senda7_peticiones_total Peticiones atendidas por endpoint, método y estado.',
+        '# TYPE senda7_peticiones_total counter',
+    ]
+    for clave, valor in sorted(instantanea['peticiones'].items()):
+        endpoint, metodo, estado = clave.split('|')
+        lineas.append(
+            f'senda7_peticiones_total{{endpoint="{_etiqueta(endpoint)}",metodo="{metodo}",estado="{estado}"}} {valor}'
+        )
+
+    lineas += [
+        '# HELP senda7_limite_rechazos_total Peticiones rechazadas con 429 por grupo de rutas y clave (ip, usuario).',
+        '# TYPE senda7_limite_rechazos_total counter',
+    ]
+    for clave, valor in sorted(instantanea.get('rechazos', {}).items()):
+        grupo, tipo = clave.split('|')
+        lineas.append(f'senda7_limite_rechazos_total{{grupo="{_etiqueta(grupo)}",clave="{tipo}"}} {valor}')
+
+    lineas += [
+        '# HELP senda7_latencia_segundos Latencia de las peticiones por endpoint.',
+        '# TYPE senda7_latencia_segundos histogram',
+    ]
+    for endpoint, valores in sorted(instantanea['latencia'].items()):
+        etiqueta = _etiqueta(endpoint)
+        acumulado = 0
+        for limite, cantidad in zip(LIMITES_LATENCIA, valores):
+            acumulado += cantidad
+            lineas.append(f'senda7_latencia_segundos_bucket{{endpoint="{etiqueta}",le="{limite}"}} {acumulado}')
+        lineas.append(f'senda7_latencia_segundos_bucket{{endpoint="{etiqueta}",le="+Inf"}} {valores[-1]}')
+        lineas.append(f'senda7_latencia_segundos_sum{{endpoint="{etiqueta}"}} {valores[-2]:.6f}')
+        lineas.append(f'senda7_latencia_segundos_count{{endpoint="{etiqueta}"}} {valores[-1]}')
+
+    lineas += [
+        '# HELP senda7_componente_segundos_total Tiempo acumulado por componente (jwt, db, hash, plantilla, limite).',
+        '# TYPE senda7_componente_segundos_total counter',
+    ]
+    llamadas = []
+    for clave, (segundos, numero) in sorted(instantanea['componentes'].items()):
+        endpoint, componente = clave.split('|')
+        etiquetas = f'endpoint="{_etiqueta(endpoint)}",componente="{componente}"'
+        lineas.append(f'senda7_componente_segundos_total{{{etiquetas}}} {segundos:.6f}')
+        llamadas.append(f'senda7_componente_llamadas_total{{{etiquetas}}} {numero}')
+    lineas += [
+        '# HELP senda7_componente_llamadas_total Llamadas por componente (p. ej. número de consultas SQLite).',
+        '# TYPE senda7_componente_llamadas_total counter',
+    ] + llamadas
+    return '\n'.join(lineas) + '\n'
+
+
+# --- MEDICIÓN DURANTE LA PETICIÓN ---
+
+def sumar(componente, segundos, llamadas=1):
+    """Suma tiempo a un componente de la petición actual (no hace nada fuera de una petición)."""
+    if not has_app_context():
+        return
+    componentes = g.get('_metricas')
+    if componentes is None:
+        return
+    acumulado = componentes.get(componente)
+    if acumulado is None:
+        componentes[componente] = [segundos, llamadas]
+    else:
+        acumulado[0] += segundos
+        acumulado[1] += llamadas
+
+
+@contextmanager
+def medir(componente):
+    """Mide el bloque y lo suma al componente indicado de la petición actual."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        sumar(componente, time.perf_counter() - inicio)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión SQLite que suma el número y el tiempo de sus consultas a las métricas de la petición."""
+
+    def execute(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            sumar('db', time.perf_counter() - inicio)
+
+    def executemany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            sumar('db', time.perf_counter() - inicio)
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+class Metricas:
+    def __init__(self, app):
+        self.registro = RegistroMetricas()
+        self.directorio = app.config.get('METRICS_DIR')
+        self.intervalo_volcado = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+        self._ultimo_volcado = 0.0
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+            atexit.register(self.volcar)
+
+        app.before_request(self._inicio)
+        app.after_request(self._fin)
+        before_render_template.connect(self._inicio_plantilla, app)
+        template_rendered.connect(self._fin_plantilla, app)
+
+    def _inicio(self):
+        g._metricas_inicio = time.perf_counter()
+        g._metricas = {}
+
+    def _fin(self, response):
+        inicio = g.pop('_metricas_inicio', None)
+        if inicio is not None:
+            self.registro.observar(
+                request.endpoint or 'desconocido', request.method, response.status_code,
+                time.perf_counter() - inicio, g.pop('_metricas', {}),
+            )
+            if self.directorio and time.monotonic() - self._ultimo_volcado > self.intervalo_volcado:
+                self.volcar()
+        return response
+
+    def _inicio_plantilla(self, sender, template, context, **extra):
+        g._metricas_plantilla = time.perf_counter()
+
+    def _fin_plantilla(self, sender, template, context, **extra):
+        inicio = g.pop('_metricas_plantilla', None)
+        if inicio is not None:
+            sumar('plantilla', time.perf_counter() - inicio)
+
+    def _archivo(self):
+        return os.path.join(self.directorio, f'metricas-{os.getpid()}.json')
+
+    def volcar(self):
+        """Escribe la instantánea del proceso en su archivo (de forma atómica)."""
+        self._ultimo_volcado = time.monotonic()
+        temporal = self._archivo() + '.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump(self.registro.instantanea(), archivo)
+        os.replace(temporal, self._archivo())
+
+    def instantanea_global(self):
+        """Instantánea combinada de todos los procesos (o solo de este si no hay METRICS_DIR)."""
+        propia = self.registro.instantanea()
+        if not self.directorio:
+            return propia
+        instantaneas = [propia]
+        for ruta in glob.glob(os.path.join(self.directorio, 'metricas-*.json')):
+            if ruta == self._archivo():
+                continue
+            instantanea = _leer(ruta)
+            if instantanea is not None:
+                instantaneas.append(instantanea)
+        return combinar(instantaneas)
+
+
+# --- ARCHIVOS DE LOS TRABAJADORES (SERVIDOR PREFORKEADO) ---
+#
+# Los archivos metricas-<pid>.json son de procesos vivos. Cuando el proceso principal
+# recoge un trabajador que ha terminado, suma su último volcado a ARCHIVO_TERMINADOS y
+# borra el suyo: los contadores no bajan al relanzarlo y un pid reutilizado empieza de
+# cero. Al arrancar (no en una recarga) se vacía el directorio.
+
+ARCHIVO_TERMINADOS = 'metricas-terminados.json'
+
+
+def _leer(ruta):
+    try:
+        with open(ruta) as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def limpiar_directorio(directorio):
+    """Borra los volcados de ejecuciones anteriores del servidor."""
+    for patron in ('metricas-*.json', 'metricas-*.json.tmp'):
+        for ruta in glob.glob(os.path.join(directorio, patron)):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+
+def archivar_proceso(directorio, pid):
+    """Suma el último volcado del proceso `pid` (ya terminado) al de los procesos terminados."""
+    ruta = os.path.join(directorio, f'metricas-{pid}.json')
+    instantanea = _leer(ruta)
+    if instantanea is not None:
+        acumulado = os.path.join(directorio, ARCHIVO_TERMINADOS)
+        anteriores = _leer(acumulado)
+        total = combinar([anteriores, instantanea] if anteriores is not None else [instantanea])
+        with open(acumulado + '.tmp', 'w') as archivo:
+            json.dump(total, archivo)
+        os.replace(acumulado + '.tmp', acumulado)
+    for sobrante in (ruta, ruta + '.tmp'):
+        try:
+            os.remove(sobrante)
+        except FileNotFoundError:
+            pass
+
+
+def init_app(app):
+    app.extensions['senda7_metricas'] = Metricas(app)
+    return app.extensions['senda7_metricas']
@@ -0,0 +1,382 @@
+import contextlib
+import os
+import sqlite3
+from urllib.request import pathname2url
+import objetivos as repo_objetivos
+import analitica
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivo, queda el bloqueo de escritura de SQLite
+    fcntl = None
+
+# --- MIGRACIONES DEL ESQUEMA ---
+#
+# El esquema se versiona con PRAGMA user_version: cada paso de MIGRACIONES lleva la
+# base de datos a la versión siguiente y se ejecuta una sola vez, en orden.
+# migrar() se llama antes de arrancar los trabajadores (python app.py, el comando
+# `flask --app app migrar` o el servidor de producción), nunca desde la aplicación:
+# un trabajador que arranca no toca el esquema. Si alguien arranca sin migrar (`flask
+# run`, un servidor WSGI), comprobar() lo detecta en la primera petición y lanza
+# EsquemaPendiente con la orden que hay que ejecutar.
+#
+# Los pasos usan IF NOT EXISTS y las migraciones de datos son idempotentes, así que
+# una base de datos anterior a las migraciones (user_version = 0 con las tablas ya
+# creadas) se pone al día sin perder nada, y un paso interrumpido puede repetirse.
+#
+# Cada paso se confirma junto con su PRAGMA user_version: las funciones a las que llama
+# abren su transacción con basedatos.transaccion, que aquí se queda en un SAVEPOINT.
+
+
+def _usuarios(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            pais TEXT NOT NULL,
+            objetivos TEXT,
+            fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _objetivos(conn):
+    # Una fila por objetivo seleccionado por cada usuario
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS objetivos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_usuario INTEGER NOT NULL,
+            objetivo_texto TEXT NOT NULL,
+            completado BOOLEAN NOT NULL DEFAULT 0,
+            fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_usuario) REFERENCES usuarios (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_objetivos_usuario_completado
+        ON objetivos (id_usuario, completado)
+    ''')
+
+
+def _progreso(conn):
+    # Contadores de progreso por usuario, mantenidos por triggers en la misma transacción
+    # que cada cambio en objetivos (el panel los lee sin hacer COUNT(*))
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progreso_usuarios (
+            id_usuario INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            completados INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (id_usuario) REFERENCES usuarios (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_objetivos_insert AFTER INSERT ON objetivos
+        BEGIN
+            INSERT INTO progreso_usuarios (id_usuario, total, completados)
+            VALUES (NEW.id_usuario, 1, NEW.completado != 0)
+            ON CONFLICT (id_usuario) DO UPDATE SET
+                total = total + 1,
+                completados = completados + (NEW.completado != 0);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_objetivos_delete AFTER DELETE ON objetivos
+        BEGIN
+            UPDATE progreso_usuarios SET
+                total = total - 1,
+                completados = completados - (OLD.completado != 0)
+            WHERE id_usuario = OLD.id_usuario;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_objetivos_completado AFTER UPDATE OF completado ON objetivos
+        WHEN (OLD.completado != 0) != (NEW.completado != 0)
+        BEGIN
+            UPDATE progreso_usuarios SET
+                completados = completados + (NEW.completado != 0) - (OLD.completado != 0)
+            WHERE id_usuario = NEW.id_usuario;
+        END
+    ''')
+    # Los objetivos anteriores a los triggers no están contados
+    repo_objetivos.reconciliar_progreso(conn)
+
+
+def _objetivos_texto(conn):
+    # Objetivos guardados como texto en usuarios.objetivos (los triggers cuentan las filas nuevas)
+    migrados = repo_objetivos.migrar_objetivos_texto(conn)
+    if migrados:
+        print(f"Objetivos de {migrados} usuarios migrados a la tabla 'objetivos'.")
+
+
+def _historial(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS historial (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_usuario INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            datos TEXT NOT NULL,
+            recomendacion TEXT NOT NULL,
+            fecha TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_usuario) REFERENCES usuarios (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_historial_usuario
+        ON historial (id_usuario, id)
+    ''')
+
+
+def _sesiones(conn):
+    # Refresh tokens revocables; solo se guarda su digest
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sesiones (
+            token_hash TEXT PRIMARY KEY,
+            id_usuario INTEGER NOT NULL,
+            caduca REAL NOT NULL,
+            revocado BOOLEAN NOT NULL DEFAULT 0,
+            FOREIGN KEY (id_usuario) REFERENCES usuarios (id)
+        )
+    ''')
+
+
+def _resumenes(conn):
+    # Resúmenes para los informes, mantenidos por triggers como los contadores de progreso
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resumen_paises (
+            pais TEXT PRIMARY KEY,
+            usuarios INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resumen_registros_dia (
+            dia TEXT PRIMARY KEY,
+            usuarios INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resumen_objetivos (
+            objetivo TEXT PRIMARY KEY,
+            usuarios INTEGER NOT NULL DEFAULT 0,
+            completados INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Para reconstruir los resúmenes (y consultas puntuales) sin recorrer la tabla entera
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_pais ON usuarios (pais)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_fecha_registro ON usuarios (fecha_registro)')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_usuarios_resumen_insert AFTER INSERT ON usuarios
+        BEGIN
+            INSERT INTO resumen_paises (pais, usuarios) VALUES (NEW.pais, 1)
+            ON CONFLICT (pais) DO UPDATE SET usuarios = usuarios + 1;
+            INSERT INTO resumen_registros_dia (dia, usuarios) VALUES (date(NEW.fecha_registro), 1)
+            ON CONFLICT (dia) DO UPDATE SET usuarios = usuarios + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_usuarios_resumen_pais AFTER UPDATE OF pais ON usuarios
+        WHEN OLD.pais IS NOT NEW.pais
+        BEGIN
+            UPDATE resumen_paises SET usuarios = usuarios - 1 WHERE pais = OLD.pais;
+            INSERT INTO resumen_paises (pais, usuarios) VALUES (NEW.pais, 1)
+            ON CONFLICT (pais) DO UPDATE SET usuarios = usuarios + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_usuarios_resumen_delete AFTER DELETE ON usuarios
+        BEGIN
+            UPDATE resumen_paises SET usuarios = usuarios - 1 WHERE pais = OLD.pais;
+            UPDATE resumen_registros_dia SET usuarios = usuarios - 1 WHERE dia = date(OLD.fecha_registro);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_objetivos_resumen_insert AFTER INSERT ON objetivos
+        BEGIN
+            INSERT INTO resumen_objetivos (objetivo, usuarios, completados)
+            VALUES (NEW.objetivo_texto, 1, NEW.completado != 0)
+            ON CONFLICT (objetivo) DO UPDATE SET
+                usuarios = usuarios + 1,
+                completados = completados + (NEW.completado != 0);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_objetivos_resumen_delete AFTER DELETE ON objetivos
+        BEGIN
+            UPDATE resumen_objetivos SET
+                usuarios = usuarios - 1,
+                completados = completados - (OLD.completado != 0)
+            WHERE objetivo = OLD.objetivo_texto;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_objetivos_resumen_completado AFTER UPDATE OF completado ON objetivos
+        WHEN (OLD.completado != 0) != (NEW.completado != 0)
+        BEGIN
+            UPDATE resumen_objetivos SET
+                completados = completados + (NEW.completado != 0) - (OLD.completado != 0)
+            WHERE objetivo = NEW.objetivo_texto;
+        END
+    ''')
+    # Los usuarios y objetivos anteriores a los triggers no están contados
+    analitica.reconstruir_resumenes(conn)
+
+
+def _version_objetivos(conn):
+    # Versión de los objetivos de cada usuario: la sube cualquier cambio en sus filas, venga
+    # del proceso que venga, para que las cachés de cada trabajador sepan si siguen al día
+    columnas = [fila[1] for fila in conn.execute('PRAGMA table_info(progreso_usuarios)')]
+    if 'version' not in columnas:
+        conn.execute('ALTER TABLE progreso_usuarios ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    for nombre in ('trg_objetivos_insert', 'trg_objetivos_delete', 'trg_objetivos_completado'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+    conn.execute('''
+        CREATE TRIGGER trg_objetivos_insert AFTER INSERT ON objetivos
+        BEGIN
+            INSERT INTO progreso_usuarios (id_usuario, total, completados, version)
+            VALUES (NEW.id_usuario, 1, NEW.completado != 0, 1)
+            ON CONFLICT (id_usuario) DO UPDATE SET
+                total = total + 1,
+                completados = completados + (NEW.completado != 0),
+                version = version + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_objetivos_delete AFTER DELETE ON objetivos
+        BEGIN
+            UPDATE progreso_usuarios SET
+                total = total - 1,
+                completados = completados - (OLD.completado != 0),
+                version = version + 1
+            WHERE id_usuario = OLD.id_usuario;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_objetivos_completado AFTER UPDATE OF completado ON objetivos
+        WHEN (OLD.completado != 0) != (NEW.completado != 0)
+        BEGIN
+            UPDATE progreso_usuarios SET
+                completados = completados + (NEW.completado != 0) - (OLD.completado != 0),
+                version = version + 1
+            WHERE id_usuario = NEW.id_usuario;
+        END
+    ''')
+
+
+def _objetivos_unicos(conn):
+    # Envíos simultáneos de seleccionar_objetivos podían repetir un objetivo. Se conserva la
+    # fila más antigua (completada si lo estaba alguna) y se borran las demás; los triggers
+    # descuentan las borradas de los contadores y de los resúmenes
+    conn.execute('''
+        UPDATE objetivos SET completado = 1
+        WHERE completado = 0 AND EXISTS (
+            SELECT 1 FROM objetivos AS otro
+            WHERE otro.id_usuario = objetivos.id_usuario AND otro.objetivo_texto = objetivos.objetivo_texto
+              AND otro.completado != 0
+        )
+    ''')
+    conn.execute('''
+        DELETE FROM objetivos WHERE id NOT IN (
+            SELECT MIN(id) FROM objetivos GROUP BY id_usuario, objetivo_texto
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_objetivos_usuario_texto
+        ON objetivos (id_usuario, objetivo_texto)
+    ''')
+
+
+# (versión, descripción, función). Solo se añaden pasos al final; nunca se editan los ya publicados.
+MIGRACIONES = (
+    (1, "Tabla de usuarios", _usuarios),
+    (2, "Objetivos como filas", _objetivos),
+    (3, "Contadores de progreso con triggers", _progreso),
+    (4, "Migrar objetivos guardados como texto", _objetivos_texto),
+    (5, "Historial de formularios", _historial),
+    (6, "Sesiones con refresh tokens", _sesiones),
+    (7, "Resúmenes para informes e índices de país y fecha de registro", _resumenes),
+    (8, "Versión de los objetivos de cada usuario para las cachés", _version_objetivos),
+    (9, "Un solo objetivo con el mismo texto por usuario", _objetivos_unicos),
+)
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+def version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+@contextlib.contextmanager
+def _bloqueo(ruta):
+    """Bloqueo exclusivo entre procesos mientras se migra (un archivo junto a la base de datos)."""
+    if fcntl is None or ruta == ':memory:':
+        yield
+        return
+    with open(f"{ruta}.migracion.lock", 'w') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def migrar(ruta, conn=None):
+    """
+    Aplica en orden las migraciones pendientes de la base de datos `ruta`.
+    Si varios procesos la llaman a la vez, uno migra y los demás esperan y no hacen nada.
+    Devuelve la lista de versiones aplicadas.
+    """
+    aplicadas = []
+    with _bloqueo(ruta):
+        propia = conn is None
+        if propia:
+            conn = sqlite3.connect(ruta, timeout=30)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA foreign_keys = ON')
+        try:
+            for numero, descripcion, paso in MIGRACIONES:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if version(conn) >= numero:
+                        conn.rollback()
+                        continue
+                    paso(conn)
+                    conn.execute(f'PRAGMA user_version = {numero}')
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                print(f"Migración {numero} aplicada: {descripcion}.")
+                aplicadas.append(numero)
+        finally:
+            if propia:
+                conn.close()
+    return aplicadas
+
+
+def pendientes(conn):
+    """Versiones que aún no se han aplicado a la base de datos de la conexión."""
+    actual = version(conn)
+    return [numero for numero, _, _ in MIGRACIONES if numero > actual]
+
+
+class EsquemaPendiente(RuntimeError):
+    """Una base de datos no existe o le faltan migraciones."""
+
+
+def comprobar(rutas):
+    """
+    Lanza EsquemaPendiente si alguna de las bases de datos no está en VERSION_ACTUAL.
+    Solo lee (abre cada archivo en modo 'ro'), así que no crea los que faltan.
+    """
+    for ruta in rutas:
+        try:
+            destino = f"file:{pathname2url(os.path.abspath(ruta))}?mode=ro"
+            with contextlib.closing(sqlite3.connect(destino, uri=True)) as conn:
+                faltan = pendientes(conn)
+        except sqlite3.OperationalError:
+            faltan = [numero for numero, _, _ in MIGRACIONES]
+        if faltan:
+            raise EsquemaPendiente(
+                f"A '{ruta}' le faltan las migraciones {', '.join(map(str, faltan))}: "
+                f"ejecuta `flask --app app migrar` antes de arrancar la aplicación."
+            )
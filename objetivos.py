@@ -0,0 +1,110 @@
+import sqlite3
+import basedatos
+
+# --- OBJETIVOS DE LOS USUARIOS (TABLA `objetivos`) ---
+
+
+def cargar_objetivos(conn, id_usuario):
+    """Devuelve los objetivos del usuario en el orden en que se crearon."""
+    filas = conn.execute(
+        'SELECT objetivo_texto, completado FROM objetivos WHERE id_usuario = ? ORDER BY id', (id_usuario,)
+    ).fetchall()
+    return [{'texto': fila[0], 'completado': bool(fila[1])} for fila in filas]
+
+
+def guardar_objetivos(conn, id_usuario, seleccionados):
+    """
+    Sustituye los objetivos del usuario por los seleccionados aplicando solo la diferencia:
+    se borran los que ya no están y se insertan los nuevos, todo en una única transacción.
+    Los objetivos que se mantienen conservan su fila (y su estado de completado).
+    """
+    seleccionados = list(dict.fromkeys(seleccionados))  # Sin duplicados, manteniendo el orden
+    with conn:
+        # La lectura va dentro de la transacción de escritura: dos envíos simultáneos no
+        # calculan la diferencia sobre la misma foto
+        conn.execute('BEGIN IMMEDIATE')
+        actuales = {objetivo['texto'] for objetivo in cargar_objetivos(conn, id_usuario)}
+        a_borrar = [(id_usuario, texto) for texto in actuales.difference(seleccionados)]
+        a_insertar = [(id_usuario, texto) for texto in seleccionados if texto not in actuales]
+        conn.executemany('DELETE FROM objetivos WHERE id_usuario = ? AND objetivo_texto = ?', a_borrar)
+        # El índice único (migración 9) es la última garantía contra filas repetidas
+        conn.executemany('INSERT OR IGNORE INTO objetivos (id_usuario, objetivo_texto) VALUES (?, ?)', a_insertar)
+
+
+def marcar_completado(conn, id_usuario, texto, completado=True):
+    """
+    Marca (o desmarca) un objetivo como completado. Los contadores de progreso_usuarios
+    se actualizan por trigger dentro de la misma transacción.
+    Devuelve True si el objetivo existía.
+    """
+    with conn:
+        cursor = conn.execute(
+            'UPDATE objetivos SET completado = ? WHERE id_usuario = ? AND objetivo_texto = ?',
+            (1 if completado else 0, id_usuario, texto),
+        )
+    return cursor.rowcount > 0
+
+
+# --- CONTADORES DE PROGRESO (TABLA `progreso_usuarios`) ---
+
+def cargar_progreso_version(conn, id_usuario):
+    """
+    Devuelve (completados, total, versión) del usuario. La versión sube con cada cambio en
+    sus objetivos, así que sirve para saber si una copia en caché sigue al día.
+    """
+    fila = conn.execute(
+        'SELECT completados, total, version FROM progreso_usuarios WHERE id_usuario = ?', (id_usuario,)
+    ).fetchone()
+    return (fila[0], fila[1], fila[2]) if fila else (0, 0, 0)
+
+
+def porcentaje_progreso(completados, total):
+    """Porcentaje entero de objetivos completados."""
+    return round(100 * completados / total) if total else 0
+
+
+def reconciliar_progreso(conn):
+    """
+    Reconstruye todos los contadores de progreso a partir de la tabla de objetivos: los
+    rellena en la migración 3 y los corrige con `flask reconciliar-progreso` si algún
+    total o completados no cuadra con las filas del usuario.
+    Devuelve el número de usuarios con contadores.
+    """
+    with basedatos.transaccion(conn):
+        # Se actualizan las filas en lugar de borrarlas: la versión de cada usuario
+        # (migración 8) no debe volver atrás
+        conn.execute('UPDATE progreso_usuarios SET total = 0, completados = 0')
+        conn.execute('''
+            INSERT INTO progreso_usuarios (id_usuario, total, completados)
+            SELECT id_usuario, COUNT(*), SUM(completado != 0) FROM objetivos WHERE 1 GROUP BY id_usuario
+            ON CONFLICT (id_usuario) DO UPDATE SET total = excluded.total, completados = excluded.completados
+        ''')
+    return conn.execute('SELECT COUNT(*) FROM progreso_usuarios WHERE total > 0').fetchone()[0]
+
+
+def migrar_objetivos_texto(conn):
+    """
+    Migración única: pasa los objetivos guardados como texto separado por ';' en
+    `usuarios.objetivos` a filas de la tabla `objetivos` y vacía la columna antigua.
+    Devuelve el número de usuarios migrados.
+    """
+    usuarios = conn.execute(
+        "SELECT id, objetivos FROM usuarios WHERE objetivos IS NOT NULL AND objetivos != ''"
+    ).fetchall()
+    if not usuarios:
+        return 0
+
+    filas = []
+    for id_usuario, texto in usuarios:
+        for objetivo in dict.fromkeys(texto.split(';')):
+            if objetivo:
+                filas.append((id_usuario, objetivo))
+
+    try:
+        with basedatos.transaccion(conn):
+            conn.executemany('INSERT INTO objetivos (id_usuario, objetivo_texto) VALUES (?, ?)', filas)
+            conn.executemany('UPDATE usuarios SET objetivos = NULL WHERE id = ?', [(u[0],) for u in usuarios])
+    except sqlite3.Error as e:
+        print(f"Error al migrar los objetivos: {e}")
+        raise
+    return len(usuarios)
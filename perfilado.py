@@ -0,0 +1,152 @@
+import collections
+import glob
+import hmac
+import os
+import pstats
+import random
+import time
+import cProfile
+from flask import g, request
+
+# --- PERFILADO DE PETICIONES POR MUESTREO ---
+#
+# Con PROFILE_SAMPLE_RATE > 0 se perfila esa fracción de las peticiones; con PROFILE_SECRET
+# configurado, también las que traen la cabecera PROFILE_HEADER con ese secreto. Cada
+# petición perfilada se guarda como un volcado de cProfile en PROFILE_DIR
+# (<endpoint>__<marca>.prof), conservando solo los PROFILE_MAX_FILES más recientes.
+# Si no está activado, no se registra ningún hook y no hay coste por petición.
+#
+# El comando `flask --app app informe-perfiles` combina los volcados por endpoint.
+
+SEPARADOR = '__'
+
+
+class Perfilador:
+    def __init__(self, app):
+        self.fraccion = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.cabecera = app.config.get('PROFILE_HEADER', 'X-Senda7-Perfil')
+        self.secreto = app.config.get('PROFILE_SECRET')
+        self.directorio = app.config.get('PROFILE_DIR', 'perfiles')
+        self.max_archivos = app.config.get('PROFILE_MAX_FILES', 200)
+        os.makedirs(self.directorio, exist_ok=True)
+        app.before_request(self._inicio)
+        app.teardown_request(self._fin)
+
+    def _debe_perfilar(self):
+        if self.secreto:
+            valor = request.headers.get(self.cabecera)
+            if valor and hmac.compare_digest(valor, self.secreto):
+                return True
+        return self.fraccion > 0 and random.random() < self.fraccion
+
+    def _inicio(self):
+        if not self._debe_perfilar():
+            return
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en este hilo
+            return
+        g._perfil = perfil
+
+    def _fin(self, exc=None):
+        perfil = g.pop('_perfil', None)
+        if perfil is None:
+            return
+        perfil.disable()
+        endpoint = request.endpoint or 'desconocido'
+        marca = f"{time.time_ns()}_{os.getpid()}"
+        try:
+            perfil.dump_stats(os.path.join(self.directorio, f"{endpoint}{SEPARADOR}{marca}.prof"))
+            self._rotar()
+        except OSError as e:
+            print(f"No se pudo guardar el perfil de '{endpoint}': {e}")
+
+    def _rotar(self):
+        archivos = glob.glob(os.path.join(self.directorio, '*.prof'))
+        if len(archivos) <= self.max_archivos:
+            return
+        archivos.sort(key=os.path.getmtime)
+        for ruta in archivos[:len(archivos) - self.max_archivos]:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+
+def init_app(app):
+    """Activa el perfilado por muestreo solo si hay fracción o secreto configurados."""
+    if app.config.get('PROFILE_SAMPLE_RATE', 0.0) <= 0 and not app.config.get('PROFILE_SECRET'):
+        return None
+    app.extensions['senda7_perfilador'] = Perfilador(app)
+    return app.extensions['senda7_perfilador']
+
+
+# --- INFORMES A PARTIR DE LOS VOLCADOS ---
+
+def _nombre(func):
+    archivo, linea, nombre = func
+    if archivo == '~':
+        return nombre  # funciones integradas, p. ej. <built-in method ...>
+    return f"{os.path.basename(archivo)}:{linea}({nombre})"
+
+
+def pilas_colapsadas(stats):
+    """
+    Reconstruye pilas aproximadas (formato "a;b;c microsegundos", el de flamegraph.pl y
+    speedscope) a partir del grafo de llamadas de pstats. cProfile solo guarda pares
+    llamador-llamado, así que el tiempo de cada función se reparte entre sus llamadores
+    en proporción al tiempo acumulado de cada llamada.
+    """
+    datos = stats.stats
+    hijos = collections.defaultdict(dict)
+    for func, (_, _, _, _, llamadores) in datos.items():
+        for llamador, (_, _, _, acumulado) in llamadores.items():
+            hijos[llamador][func] = acumulado
+    pilas = collections.Counter()
+
+    def recorrer(func, pila, en_pila, factor):
+        _, _, propio, acumulado, _ = datos[func]
+        if propio * factor > 0:
+            pilas[';'.join(pila)] += propio * factor
+        for hijo, acumulado_arista in hijos.get(func, {}).items():
+            if hijo in en_pila:
+                continue  # recursión: se corta el ciclo
+            total_hijo = datos[hijo][3]
+            if total_hijo <= 0:
+                continue
+            en_pila.add(hijo)
+            recorrer(hijo, pila + [_nombre(hijo)], en_pila, factor * acumulado_arista / total_hijo)
+            en_pila.discard(hijo)
+
+    for func, (_, _, _, _, llamadores) in datos.items():
+        if not llamadores:
+            recorrer(func, [_nombre(func)], {func}, 1.0)
+    return [f"{pila} {int(segundos * 1e6)}" for pila, segundos in pilas.most_common() if segundos >= 1e-6]
+
+
+def informe(directorio, salida, limite=40):
+    """
+    Agrupa los volcados por endpoint y escribe en `salida`, para cada uno:
+    <endpoint>.prof (volcado combinado), <endpoint>.txt (funciones por tiempo acumulado)
+    y <endpoint>.folded (pilas colapsadas para un flame graph).
+    Devuelve {endpoint: número de peticiones combinadas}.
+    """
+    por_endpoint = collections.defaultdict(list)
+    for ruta in glob.glob(os.path.join(directorio, '*.prof')):
+        endpoint = os.path.basename(ruta).split(SEPARADOR, 1)[0]
+        por_endpoint[endpoint].append(ruta)
+
+    os.makedirs(salida, exist_ok=True)
+    resumen = {}
+    for endpoint, rutas in sorted(por_endpoint.items()):
+        stats = pstats.Stats(*rutas)
+        stats.dump_stats(os.path.join(salida, f"{endpoint}.prof"))
+        with open(os.path.join(salida, f"{endpoint}.txt"), 'w', encoding='utf-8') as archivo:
+            archivo.write(f"Endpoint: {endpoint} ({len(rutas)} peticiones perfiladas)\n\n")
+            pstats.Stats(*rutas, stream=archivo).sort_stats('cumulative').print_stats(limite)
+        with open(os.path.join(salida, f"{endpoint}.folded"), 'w', encoding='utf-8') as archivo:
+            archivo.write('\n'.join(pilas_colapsadas(stats)) + '\n')
+        resumen[endpoint] = len(rutas)
+    return resumen
@@ -0,0 +1,51 @@
+import os
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from cache import CacheLRU
+
+# --- PLANTILLAS: CACHÉ DE BYTECODE Y FRAGMENTOS ---
+#
+# La caché de bytecode guarda en disco las plantillas ya compiladas, de modo que un
+# trabajador nuevo no vuelve a compilar el Jinja de cada página en su primera petición
+# (Jinja comprueba el checksum del fuente y recompila si la plantilla cambió).
+#
+# Las partes de una página que no dependen de la petición pueden marcarse con
+#
+#   {% fragmento 'formulario' %} ... {% endfragmento %}
+#
+# y se renderizan una sola vez por proceso. Con la recarga automática de plantillas
+# (modo debug) los fragmentos no se cachean.
+
+
+class ExtensionFragmentos(Extension):
+    """Etiqueta {% fragmento clave %}: cachea el HTML renderizado del bloque por plantilla y clave."""
+
+    tags = {'fragmento'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        cuerpo = parser.parse_statements(['name:endfragmento'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_renderizar', args), [], [], cuerpo).set_lineno(lineno)
+
+    def _renderizar(self, plantilla, clave, caller):
+        cache = self.environment.cache_fragmentos
+        if self.environment.auto_reload or cache is None:
+            return caller()
+        html = cache.obtener((plantilla, clave))
+        if html is None:
+            html = caller()
+            cache.guardar((plantilla, clave), html)
+        return html
+
+
+def init_app(app):
+    """Configura la caché de bytecode en disco y la etiqueta de fragmentos en el entorno Jinja."""
+    entorno = app.jinja_env
+    entorno.add_extension(ExtensionFragmentos)
+    entorno.extend(cache_fragmentos=CacheLRU(app.config.get('TEMPLATE_FRAGMENT_CACHE_SIZE', 256)))
+
+    directorio = app.config.get('TEMPLATE_BYTECODE_DIR')
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+        entorno.bytecode_cache = FileSystemBytecodeCache(directorio, pattern='senda7-%s.cache')
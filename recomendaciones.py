@@ -0,0 +1,260 @@
+import bisect
+import functools
+import json
+import operator
+import string
+from flask import current_app
+
+# --- MOTOR DE RECOMENDACIONES BASADO EN REGLAS ---
+#
+# Las recomendaciones de cada categoría se definen en un archivo JSON (recomendaciones.json):
+#
+#   "categoria": {
+#       "campos": ["campo1", "campo2"],
+#       "validacion": {
+#           "faltan_campos": "Mensaje si falta algún campo",
+#           "enteros": {"campo2": {"no_numero": "...", "no_positivo": "..."}}
+#       },
+#       "bloques": [
+#           {"texto": "Línea fija o con {campo1}"},
+#           {"segun": "campo2", "reglas": [
+#               {"menor_que": 2, "texto": "..."},
+#               {"texto": "Caso por defecto"}
+#           ]}
+#       ]
+#   }
+#
+# Añadir una categoría o una regla es un cambio en el archivo, no en el código.
+
+_formateador = string.Formatter()
+
+
+class ErrorReglas(ValueError):
+    """El archivo de reglas tiene un formato no válido."""
+
+
+def _compilar_texto(texto, campos, categoria):
+    """Convierte un texto en una lista de (literal, campo) ya analizada, o en un str si no tiene campos."""
+    partes = []
+    for literal, campo, _, _ in _formateador.parse(texto):
+        if campo is not None and campo not in campos:
+            raise ErrorReglas(f"El campo '{campo}' no está declarado en la categoría '{categoria}'.")
+        partes.append((literal, campo))
+    if all(campo is None for _, campo in partes):
+        return ''.join(literal for literal, _ in partes)
+    return partes
+
+
+def _campos_de(compilado):
+    return set() if isinstance(compilado, str) else {campo for _, campo in compilado if campo}
+
+
+def _es_fijo(segmento):
+    return segmento[0] == 'texto' and isinstance(segmento[1], str)
+
+
+def _unir_fijos(segmentos):
+    """Une en una sola cadena los segmentos de texto fijo consecutivos."""
+    unidos = []
+    for segmento in segmentos:
+        if _es_fijo(segmento) and unidos and _es_fijo(unidos[-1]):
+            unidos[-1] = ('texto', unidos[-1][1] + '\n' + segmento[1])
+        else:
+            unidos.append(segmento)
+    return unidos
+
+
+def _renderizar(compilado, datos):
+    if isinstance(compilado, str):
+        return compilado
+    return ''.join(literal + (str(datos[campo]) if campo else '') for literal, campo in compilado)
+
+
+class Categoria:
+    """Reglas compiladas de una categoría de recomendación."""
+
+    def __init__(self, nombre, definicion):
+        self.nombre = nombre
+        self.campos = tuple(definicion.get('campos', ()))
+        validacion = definicion.get('validacion', {})
+        self.mensaje_faltan = validacion.get('faltan_campos', "Por favor, completa todos los campos.")
+        self.enteros = validacion.get('enteros', {})
+        for campo in self.enteros:
+            if campo not in self.campos:
+                raise ErrorReglas(f"El campo '{campo}' no está declarado en la categoría '{nombre}'.")
+        segmentos = []
+        usados_en_texto = set()
+        condiciones = []
+
+        for bloque in definicion.get('bloques', ()):
+            if 'texto' in bloque:
+                compilado = _compilar_texto(bloque['texto'], self.campos, nombre)
+                usados_en_texto |= _campos_de(compilado)
+                segmentos.append(('texto', compilado))
+            elif 'segun' in bloque:
+                campo = bloque['segun']
+                if campo not in self.campos:
+                    raise ErrorReglas(f"El campo '{campo}' no está declarado en la categoría '{nombre}'.")
+                reglas = []
+                for regla in bloque.get('reglas', ()):
+                    compilado = _compilar_texto(regla['texto'], self.campos, nombre)
+                    usados_en_texto |= _campos_de(compilado)
+                    reglas.append((regla.get('menor_que'), compilado))
+                limites = tuple(limite for limite, _ in reglas)
+                segmentos.append(('segun', campo, limites, tuple(texto for _, texto in reglas)))
+                condiciones.append((campo, limites))
+            else:
+                raise ErrorReglas(f"Bloque no reconocido en la categoría '{nombre}': {bloque}")
+
+        self.segmentos = _unir_fijos(segmentos)
+        self._campos_texto = tuple(sorted(usados_en_texto))
+        self._condiciones = tuple(
+            (campo, self._preparar_limites(limites, nombre)) for campo, limites in condiciones
+        )
+        # Extractor en C de los valores que aparecen en el texto (siempre devuelve una tupla)
+        if len(self._campos_texto) > 1:
+            self._valores = operator.itemgetter(*self._campos_texto)
+        elif self._campos_texto:
+            campo = self._campos_texto[0]
+            self._valores = lambda datos: (datos[campo],)
+        else:
+            self._valores = lambda datos: ()
+        if len(self._condiciones) == 1:
+            # Caso habitual (un solo campo con reglas): sin bucles en el camino caliente
+            (campo_regla, (numericos, hay_defecto)), = self._condiciones
+            ultimo = len(numericos) if hay_defecto else len(numericos) - 1
+            bisect_right = bisect.bisect_right
+
+            def indices(datos):
+                indice = bisect_right(numericos, datos[campo_regla])
+                return (indice if indice <= ultimo else None,)
+            self._indices = indices
+        elif self._condiciones:
+            indice, condiciones = self._indice_regla, self._condiciones
+            self._indices = lambda datos: tuple(indice(limites, datos[campo]) for campo, limites in condiciones)
+        else:
+            self._indices = lambda datos: ()
+
+    @staticmethod
+    def _preparar_limites(limites, categoria):
+        """Separa los límites 'menor_que' (que deben ser crecientes) de la regla por defecto final."""
+        numericos = [limite for limite in limites if limite is not None]
+        if numericos != sorted(numericos) or None in limites[:len(numericos)]:
+            raise ErrorReglas(f"Las reglas 'menor_que' de '{categoria}' deben ser crecientes y la regla por defecto, la última.")
+        return tuple(numericos), len(limites) > len(numericos)
+
+    @staticmethod
+    def _indice_regla(limites, valor):
+        numericos, hay_defecto = limites
+        indice = bisect.bisect_right(numericos, valor)
+        return indice if indice < len(numericos) or hay_defecto else None
+
+    def validar(self, entrada):
+        """
+        Valida los datos recibidos (formulario o JSON) con las mismas reglas para la web y la API.
+        Devuelve (datos, None) si son válidos o (None, mensaje de error).
+        """
+        datos = {campo: entrada.get(campo) for campo in self.campos}
+        if any(valor is None or valor == '' for valor in datos.values()):
+            return None, self.mensaje_faltan
+        # Desde la API llega cualquier tipo JSON: los campos de texto deben ser cadenas
+        # (también son parte de la clave de la caché) y los enteros, enteros o cadenas
+        if any(not isinstance(valor, str) for campo, valor in datos.items() if campo not in self.enteros):
+            return None, self.mensaje_faltan
+        for campo, mensajes in self.enteros.items():
+            valor = datos[campo]
+            if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+                return None, mensajes['no_numero']
+            try:
+                datos[campo] = int(valor)
+            except (TypeError, ValueError, OverflowError):
+                return None, mensajes['no_numero']
+            if datos[campo] <= 0:
+                return None, mensajes['no_positivo']
+        return datos, None
+
+    def clave(self, datos):
+        """
+        Entradas normalizadas de las que depende el resultado: los valores de los campos que
+        aparecen en el texto y, para las condiciones, el índice de la regla que se cumple
+        (no el valor exacto, de modo que p. ej. 5 y 6 horas comparten entrada en la caché).
+        """
+        return self._valores(datos), self._indices(datos)
+
+    def generar(self, valores, indices):
+        """Construye el texto a partir de la clave normalizada devuelta por clave()."""
+        datos = dict(zip(self._campos_texto, valores))
+        condiciones = iter(indices)
+        lineas = []
+        for segmento in self.segmentos:
+            if segmento[0] == 'texto':
+                lineas.append(_renderizar(segmento[1], datos))
+            else:
+                indice = next(condiciones)
+                if indice is not None:
+                    lineas.append(_renderizar(segmento[3][indice], datos))
+        return "\n".join(lineas)
+
+
+class MotorRecomendaciones:
+    """Genera recomendaciones a partir de las reglas, con una caché LRU del resultado."""
+
+    def __init__(self, reglas, tam_cache=1024):
+        self.categorias = {nombre: Categoria(nombre, definicion) for nombre, definicion in reglas.items()}
+        # lru_cache está implementada en C: acotada, segura entre hilos y con contadores propios
+        self._generar_cacheado = functools.lru_cache(maxsize=tam_cache)(self._generar)
+
+    @classmethod
+    def desde_archivo(cls, ruta, tam_cache=1024):
+        with open(ruta, encoding='utf-8') as archivo:
+            return cls(json.load(archivo), tam_cache)
+
+    def _generar(self, categoria, valores, indices):
+        return self.categorias[categoria].generar(valores, indices)
+
+    def validar(self, categoria, entrada):
+        """Valida la entrada de la categoría; lanza KeyError si la categoría no existe."""
+        return self.categorias[categoria].validar(entrada)
+
+    def generar(self, categoria, **datos):
+        """Devuelve el texto de la recomendación; lanza KeyError si la categoría no existe."""
+        reglas = self.categorias[categoria]
+        return self._generar_cacheado(categoria, reglas._valores(datos), reglas._indices(datos))
+
+    def estadisticas(self):
+        """Contadores de la caché de recomendaciones."""
+        info = self._generar_cacheado.cache_info()
+        total = info.hits + info.misses
+        return {
+            'entradas': info.currsize,
+            'max_entradas': info.maxsize,
+            'aciertos': info.hits,
+            'fallos': info.misses,
+            'tasa_aciertos': round(info.hits / total, 4) if total else 0.0,
+        }
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+def init_app(app):
+    """Carga (una sola vez) las reglas de recomendación de la aplicación."""
+    app.extensions['senda7_recomendaciones'] = MotorRecomendaciones.desde_archivo(
+        app.config['RECOMMENDATION_RULES'],
+        tam_cache=app.config.get('RECOMMENDATION_CACHE_SIZE', 1024),
+    )
+
+
+def get_motor(app=None):
+    """Devuelve el motor de recomendaciones de la aplicación indicada o de la actual."""
+    app = app or current_app
+    return app.extensions['senda7_recomendaciones']
+
+
+def validar(categoria, entrada):
+    """Valida la entrada de la categoría con el motor de la aplicación actual."""
+    return get_motor().validar(categoria, entrada)
+
+
+def generar(categoria, **datos):
+    """Genera la recomendación de la categoría con el motor de la aplicación actual."""
+    return get_motor().generar(categoria, **datos)
@@ -0,0 +1,597 @@
+import abc
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from flask import current_app
+import analitica
+import basedatos
+import historial
+import migraciones
+import objetivos as repo_objetivos
+
+# --- REPOSITORIO DE USUARIOS, OBJETIVOS, SESIONES E HISTORIAL ---
+#
+# Las vistas, los tokens, el historial, los informes y el índice de nombres no escriben
+# SQL para estos datos: se los piden al repositorio de la aplicación, que según
+# STORAGE_BACKEND es
+#  - 'sqlite': todo en DATABASE, como hasta ahora (por defecto);
+#  - 'memoria': diccionarios en el propio proceso, para pruebas, también para el
+#    historial y los informes. Cada proceso tiene los suyos y nada sobrevive a un
+#    reinicio (los comandos de la CLI siguen trabajando sobre DATABASE);
+#  - 'particionado': DATABASE hace de directorio (asigna los ids, garantiza que los
+#    nombres no se repiten y alimenta el índice de nombres) y cada usuario, con sus
+#    objetivos, contadores de progreso, historial y sesiones, vive en uno de
+#    STORAGE_SHARDS archivos según id_usuario % STORAGE_SHARDS. Cada archivo tiene su
+#    propio bloqueo de escritura, así que solo las altas se esperan entre sí; los
+#    usuarios de particiones distintas guardan objetivos, historial o sesiones en
+#    paralelo. Los refresh tokens llevan delante el número de partición ('<n>.'), así
+#    que una sesión se busca en una sola. Los comandos de la CLI siguen trabajando sobre
+#    DATABASE: tras importar usuarios hay que ejecutar repartir-datos. El número de
+#    particiones no se puede cambiar una vez que tienen datos.
+# Los backends SQLite leen con conexiones de solo lectura (mode=ro) de un pool aparte y
+# solo toman una de escritura para escribir: las rutas GET no tocan el pool de escritura.
+#
+# Las filas de usuario son mappings con las columnas de la tabla usuarios (COLUMNAS_USUARIO).
+
+BACKENDS = ('sqlite', 'memoria', 'particionado')
+
+
+COLUMNAS_USUARIO = ('id', 'usuario', 'password', 'pais', 'objetivos', 'fecha_registro')
+
+
+class UsuarioDuplicado(Exception):
+    """El nombre de usuario ya está registrado."""
+
+
+class Repositorio(abc.ABC):
+    """Operaciones que cada backend implementa (un backend incompleto no se puede instanciar)."""
+
+    # Usuarios
+
+    @abc.abstractmethod
+    def usuario_por_id(self, id_usuario):
+        """Fila del usuario o None."""
+
+    @abc.abstractmethod
+    def usuario_por_nombre(self, usuario):
+        """Fila del usuario o None."""
+
+    @abc.abstractmethod
+    def crear_usuario(self, usuario, password_hash, pais):
+        """Inserta el usuario y devuelve su fila. Lanza UsuarioDuplicado si el nombre está ocupado."""
+
+    @abc.abstractmethod
+    def actualizar_password(self, id_usuario, password_hash):
+        """Sustituye el hash de la contraseña del usuario."""
+
+    @abc.abstractmethod
+    def usuarios_desde(self, ultimo_id):
+        """Lista de (id, usuario) con id mayor que `ultimo_id`, por id (para el índice de nombres)."""
+
+    # Objetivos y progreso
+
+    @abc.abstractmethod
+    def cargar_objetivos(self, id_usuario):
+        """Lista de {'texto', 'completado'} en el orden en que se crearon."""
+
+    @abc.abstractmethod
+    def cargar_progreso_version(self, id_usuario):
+        """(completados, total, versión); la versión cambia con cada cambio en sus objetivos."""
+
+    @abc.abstractmethod
+    def guardar_objetivos(self, id_usuario, seleccionados):
+        """Sustituye los objetivos del usuario; los que se mantienen conservan su estado."""
+
+    @abc.abstractmethod
+    def marcar_completado(self, id_usuario, texto, completado=True):
+        """Marca o desmarca un objetivo; devuelve True si el usuario lo tenía."""
+
+    @abc.abstractmethod
+    def resumen_objetivos(self):
+        """Popularidad de los objetivos, como analitica.resumen_objetivos."""
+
+    @abc.abstractmethod
+    def informe(self, dias=30):
+        """Usuarios por país, objetivos y registros por día, como analitica.informe."""
+
+    # Historial de formularios
+
+    @abc.abstractmethod
+    def guardar_historial(self, registros):
+        """Inserta los registros (tuplas con las columnas de historial.SQL_INSERTAR) de una vez."""
+
+    @abc.abstractmethod
+    def cargar_historial(self, id_usuario, antes=None, limite=20):
+        """Una página del historial del usuario, como historial.cargar_historial."""
+
+    # Sesiones (refresh tokens, identificados por una clave derivada del token)
+
+    def prefijo_sesion(self, id_usuario):
+        """
+        Prefijo ('<texto>.') de los refresh tokens del usuario, que se guarda en claro al
+        principio de la clave de la sesión para que el backend la localice ('' si no lo necesita).
+        """
+        return ''
+
+    @abc.abstractmethod
+    def crear_sesion(self, token_hash, id_usuario, caduca):
+        """Guarda la sesión del usuario con la clave `token_hash`, válida hasta `caduca`."""
+
+    @abc.abstractmethod
+    def usuario_de_sesion(self, token_hash, ahora):
+        """Id del usuario si la sesión existe, no está revocada y caduca después de `ahora`."""
+
+    @abc.abstractmethod
+    def revocar_sesion(self, token_hash):
+        """Revoca la sesión; devuelve True si existía."""
+
+    def cerrar(self):
+        """Libera las conexiones abiertas (al terminar un proceso)."""
+
+
+# --- SQLITE (UN ARCHIVO) ---
+
+class RepositorioSQLite(Repositorio):
+    """Un archivo SQLite con un pool de escritura y otro de conexiones de solo lectura."""
+
+    def __init__(self, escritura, lectura):
+        self.escritura = escritura
+        self.lectura = lectura
+
+    @contextlib.contextmanager
+    def _conexion(self, pool):
+        conn = pool.obtener()
+        try:
+            yield conn
+        finally:
+            pool.devolver(conn)
+
+    def usuario_por_id(self, id_usuario):
+        with self._conexion(self.lectura) as conn:
+            return conn.execute('SELECT * FROM usuarios WHERE id = ?', (id_usuario,)).fetchone()
+
+    def usuario_por_nombre(self, usuario):
+        with self._conexion(self.lectura) as conn:
+            return conn.execute('SELECT * FROM usuarios WHERE usuario = ?', (usuario,)).fetchone()
+
+    def crear_usuario(self, usuario, password_hash, pais):
+        with self._conexion(self.escritura) as conn:
+            try:
+                # Un solo INSERT: la restricción UNIQUE decide si el nombre estaba libre
+                # (sin SELECT previo ni ventana entre comprobar e insertar)
+                with conn:
+                    return conn.execute(
+                        'INSERT INTO usuarios (usuario, password, pais) VALUES (?, ?, ?) RETURNING *',
+                        (usuario, password_hash, pais),
+                    ).fetchone()
+            except sqlite3.IntegrityError:
+                raise UsuarioDuplicado(usuario)
+
+    def actualizar_password(self, id_usuario, password_hash):
+        with self._conexion(self.escritura) as conn, conn:
+            conn.execute('UPDATE usuarios SET password = ? WHERE id = ?', (password_hash, id_usuario))
+
+    def copiar_usuario(self, fila):
+        """Inserta la fila de un usuario creado en otro archivo, con su mismo id."""
+        with self._conexion(self.escritura) as conn, conn:
+            conn.execute(
+                'INSERT INTO usuarios (id, usuario, password, pais, objetivos, fecha_registro) VALUES (?, ?, ?, ?, ?, ?)',
+                tuple(fila[columna] for columna in COLUMNAS_USUARIO),
+            )
+
+    def borrar_usuario(self, id_usuario):
+        with self._conexion(self.escritura) as conn, conn:
+            conn.execute('DELETE FROM usuarios WHERE id = ?', (id_usuario,))
+
+    def usuarios_desde(self, ultimo_id):
+        with self._conexion(self.lectura) as conn:
+            return conn.execute('SELECT id, usuario FROM usuarios WHERE id > ? ORDER BY id', (ultimo_id,)).fetchall()
+
+    def cargar_objetivos(self, id_usuario):
+        with self._conexion(self.lectura) as conn:
+            return repo_objetivos.cargar_objetivos(conn, id_usuario)
+
+    def cargar_progreso_version(self, id_usuario):
+        with self._conexion(self.lectura) as conn:
+            return repo_objetivos.cargar_progreso_version(conn, id_usuario)
+
+    def guardar_objetivos(self, id_usuario, seleccionados):
+        with self._conexion(self.escritura) as conn:
+            repo_objetivos.guardar_objetivos(conn, id_usuario, seleccionados)
+
+    def marcar_completado(self, id_usuario, texto, completado=True):
+        with self._conexion(self.escritura) as conn:
+            return repo_objetivos.marcar_completado(conn, id_usuario, texto, completado)
+
+    def resumen_objetivos(self):
+        with self._conexion(self.lectura) as conn:
+            return analitica.resumen_objetivos(conn)
+
+    def informe(self, dias=30):
+        with self._conexion(self.lectura) as conn:
+            return analitica.informe(conn, dias=dias)
+
+    def guardar_historial(self, registros):
+        with self._conexion(self.escritura) as conn, conn:
+            conn.executemany(historial.SQL_INSERTAR, registros)
+
+    def cargar_historial(self, id_usuario, antes=None, limite=20):
+        with self._conexion(self.lectura) as conn:
+            return historial.cargar_historial(conn, id_usuario, antes=antes, limite=limite)
+
+    def crear_sesion(self, token_hash, id_usuario, caduca):
+        with self._conexion(self.escritura) as conn, conn:
+            conn.execute('INSERT INTO sesiones (token_hash, id_usuario, caduca) VALUES (?, ?, ?)',
+                         (token_hash, id_usuario, caduca))
+
+    def usuario_de_sesion(self, token_hash, ahora):
+        with self._conexion(self.lectura) as conn:
+            fila = conn.execute(
+                'SELECT id_usuario FROM sesiones WHERE token_hash = ? AND revocado = 0 AND caduca > ?',
+                (token_hash, ahora),
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def revocar_sesion(self, token_hash):
+        with self._conexion(self.escritura) as conn, conn:
+            return conn.execute('UPDATE sesiones SET revocado = 1 WHERE token_hash = ?', (token_hash,)).rowcount > 0
+
+    def cerrar(self):
+        self.escritura.cerrar_todas()
+        self.lectura.cerrar_todas()
+
+
+# --- SQLITE PARTICIONADO ---
+
+class RepositorioParticionado(Repositorio):
+    """
+    El archivo directorio asigna los ids y reserva los nombres; cada usuario, con sus
+    objetivos, progreso, historial y sesiones, vive en la partición id_usuario % número de
+    particiones (cada una, un RepositorioSQLite).
+    """
+
+    def __init__(self, directorio, particiones):
+        self.directorio = directorio
+        self.particiones = particiones
+
+    def particion(self, id_usuario):
+        return self.particiones[id_usuario % len(self.particiones)]
+
+    def usuario_por_id(self, id_usuario):
+        return self.particion(id_usuario).usuario_por_id(id_usuario)
+
+    def usuario_por_nombre(self, usuario):
+        # El directorio traduce el nombre a id; la fila al día está en la partición
+        fila = self.directorio.usuario_por_nombre(usuario)
+        return self.usuario_por_id(fila['id']) if fila else None
+
+    def crear_usuario(self, usuario, password_hash, pais):
+        # Solo el alta pasa por el bloqueo de escritura del directorio
+        fila = self.directorio.crear_usuario(usuario, password_hash, pais)
+        try:
+            self.particion(fila['id']).copiar_usuario(fila)
+        except Exception:
+            self.directorio.borrar_usuario(fila['id'])
+            raise
+        return fila
+
+    def actualizar_password(self, id_usuario, password_hash):
+        # También en el directorio, para que los comandos de la CLI (exportar-usuarios) lo vean;
+        # solo ocurre al cambiar el método de hash, no en cada inicio de sesión
+        self.particion(id_usuario).actualizar_password(id_usuario, password_hash)
+        self.directorio.actualizar_password(id_usuario, password_hash)
+
+    def usuarios_desde(self, ultimo_id):
+        return self.directorio.usuarios_desde(ultimo_id)
+
+    def cargar_objetivos(self, id_usuario):
+        return self.particion(id_usuario).cargar_objetivos(id_usuario)
+
+    def cargar_progreso_version(self, id_usuario):
+        return self.particion(id_usuario).cargar_progreso_version(id_usuario)
+
+    def guardar_objetivos(self, id_usuario, seleccionados):
+        self.particion(id_usuario).guardar_objetivos(id_usuario, seleccionados)
+
+    def marcar_completado(self, id_usuario, texto, completado=True):
+        return self.particion(id_usuario).marcar_completado(id_usuario, texto, completado)
+
+    def resumen_objetivos(self):
+        return self.informe()['objetivos']
+
+    def informe(self, dias=30):
+        # Cada partición tiene los resúmenes de sus propios usuarios
+        return analitica.combinar_informes(particion.informe(dias) for particion in self.particiones)
+
+    def guardar_historial(self, registros):
+        lotes = {}
+        for registro in registros:
+            lotes.setdefault(registro[0] % len(self.particiones), []).append(registro)
+        pendientes, error = [], None
+        for numero, lote in lotes.items():
+            try:
+                self.particiones[numero].guardar_historial(lote)
+            except sqlite3.Error as e:
+                pendientes.extend(lote)
+                error = e
+        if error is not None:
+            raise historial.LoteIncompleto(str(error), pendientes)
+
+    def cargar_historial(self, id_usuario, antes=None, limite=20):
+        return self.particion(id_usuario).cargar_historial(id_usuario, antes=antes, limite=limite)
+
+    def prefijo_sesion(self, id_usuario):
+        return f"{id_usuario % len(self.particiones)}."
+
+    def _particiones_sesion(self, token_hash):
+        numero, punto, _ = token_hash.partition('.')
+        if not punto:
+            # Sesiones sin prefijo, copiadas de DATABASE por repartir-datos: se buscan en todas
+            return self.particiones
+        if numero.isdigit() and int(numero) < len(self.particiones):
+            return [self.particiones[int(numero)]]
+        return []
+
+    def crear_sesion(self, token_hash, id_usuario, caduca):
+        self.particion(id_usuario).crear_sesion(token_hash, id_usuario, caduca)
+
+    def usuario_de_sesion(self, token_hash, ahora):
+        for particion in self._particiones_sesion(token_hash):
+            id_usuario = particion.usuario_de_sesion(token_hash, ahora)
+            if id_usuario is not None:
+                return id_usuario
+        return None
+
+    def revocar_sesion(self, token_hash):
+        return any(particion.revocar_sesion(token_hash) for particion in self._particiones_sesion(token_hash))
+
+    def cerrar(self):
+        self.directorio.cerrar()
+        for particion in self.particiones:
+            particion.cerrar()
+
+
+# --- MEMORIA (PRUEBAS) ---
+
+class RepositorioMemoria(Repositorio):
+    """Usuarios, objetivos, sesiones e historial en diccionarios del proceso, protegidos por un lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usuarios = {}
+        self._ids = {}  # nombre -> id
+        self._objetivos = {}  # id_usuario -> {texto: completado}, en orden de creación
+        self._versiones = {}  # id_usuario -> versión de sus objetivos
+        self._sesiones = {}  # token_hash -> [id_usuario, caduca, revocado]
+        self._historial = {}  # id_usuario -> [(id, categoria, datos, recomendacion, fecha)], por id
+        self._siguiente_id = 1
+        self._siguiente_historial = 1
+
+    def usuario_por_id(self, id_usuario):
+        with self._lock:
+            fila = self._usuarios.get(id_usuario)
+            return dict(fila) if fila else None
+
+    def usuario_por_nombre(self, usuario):
+        with self._lock:
+            id_usuario = self._ids.get(usuario)
+            return dict(self._usuarios[id_usuario]) if id_usuario is not None else None
+
+    def crear_usuario(self, usuario, password_hash, pais):
+        with self._lock:
+            if usuario in self._ids:
+                raise UsuarioDuplicado(usuario)
+            fila = {
+                'id': self._siguiente_id,
+                'usuario': usuario,
+                'password': password_hash,
+                'pais': pais,
+                'objetivos': None,
+                'fecha_registro': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._siguiente_id += 1
+            self._usuarios[fila['id']] = fila
+            self._ids[usuario] = fila['id']
+            return dict(fila)
+
+    def actualizar_password(self, id_usuario, password_hash):
+        with self._lock:
+            if id_usuario in self._usuarios:
+                self._usuarios[id_usuario]['password'] = password_hash
+
+    def usuarios_desde(self, ultimo_id):
+        with self._lock:
+            # Los ids se asignan en orden creciente y el diccionario conserva ese orden
+            return [(id_usuario, fila['usuario']) for id_usuario, fila in self._usuarios.items() if id_usuario > ultimo_id]
+
+    def cargar_objetivos(self, id_usuario):
+        with self._lock:
+            return [{'texto': texto, 'completado': completado}
+                    for texto, completado in self._objetivos.get(id_usuario, {}).items()]
+
+    def cargar_progreso_version(self, id_usuario):
+        with self._lock:
+            objetivos = self._objetivos.get(id_usuario, {})
+            return sum(objetivos.values()), len(objetivos), self._versiones.get(id_usuario, 0)
+
+    def guardar_objetivos(self, id_usuario, seleccionados):
+        with self._lock:
+            actuales = self._objetivos.get(id_usuario, {})
+            self._objetivos[id_usuario] = {
+                **{texto: completado for texto, completado in actuales.items() if texto in seleccionados},
+                **{texto: False for texto in seleccionados if texto not in actuales},
+            }
+            self._versiones[id_usuario] = self._versiones.get(id_usuario, 0) + 1
+
+    def marcar_completado(self, id_usuario, texto, completado=True):
+        with self._lock:
+            objetivos = self._objetivos.get(id_usuario, {})
+            if texto not in objetivos:
+                return False
+            if objetivos[texto] != bool(completado):
+                objetivos[texto] = bool(completado)
+                self._versiones[id_usuario] = self._versiones.get(id_usuario, 0) + 1
+            return True
+
+    def resumen_objetivos(self):
+        totales = {}
+        with self._lock:
+            for objetivos in self._objetivos.values():
+                for texto, completado in objetivos.items():
+                    total = totales.setdefault(texto, {'objetivo': texto, 'usuarios': 0, 'completados': 0})
+                    total['usuarios'] += 1
+                    total['completados'] += completado
+        return analitica.ordenar_objetivos(totales.values())
+
+    def informe(self, dias=30):
+        desde = (datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=int(dias) - 1)).isoformat()
+        paises, registros = {}, {}
+        with self._lock:
+            for fila in self._usuarios.values():
+                paises[fila['pais']] = paises.get(fila['pais'], 0) + 1
+                dia = fila['fecha_registro'][:10]
+                if dia >= desde:
+                    registros[dia] = registros.get(dia, 0) + 1
+        return {
+            'usuarios': sum(paises.values()),
+            'paises': [{'pais': pais, 'usuarios': usuarios}
+                       for pais, usuarios in sorted(paises.items(), key=lambda item: (-item[1], item[0]))],
+            'objetivos': self.resumen_objetivos(),
+            'registros_por_dia': [{'dia': dia, 'usuarios': usuarios} for dia, usuarios in sorted(registros.items())],
+        }
+
+    def guardar_historial(self, registros):
+        with self._lock:
+            for id_usuario, categoria, datos, recomendacion, fecha in registros:
+                self._historial.setdefault(id_usuario, []).append(
+                    (self._siguiente_historial, categoria, datos, recomendacion, fecha))
+                self._siguiente_historial += 1
+
+    def cargar_historial(self, id_usuario, antes=None, limite=20):
+        with self._lock:
+            filas = [fila for fila in reversed(self._historial.get(id_usuario, ())) if antes is None or fila[0] < antes]
+        siguiente = filas[limite - 1][0] if len(filas) > limite else None
+        registros = [
+            {'categoria': categoria, 'datos': json.loads(datos), 'recomendacion': recomendacion, 'fecha': fecha}
+            for _, categoria, datos, recomendacion, fecha in filas[:limite]
+        ]
+        return registros, siguiente
+
+    def crear_sesion(self, token_hash, id_usuario, caduca):
+        with self._lock:
+            self._sesiones[token_hash] = [id_usuario, caduca, False]
+
+    def usuario_de_sesion(self, token_hash, ahora):
+        with self._lock:
+            sesion = self._sesiones.get(token_hash)
+            if sesion is None or sesion[2] or sesion[1] <= ahora:
+                return None
+            return sesion[0]
+
+    def revocar_sesion(self, token_hash):
+        with self._lock:
+            if token_hash not in self._sesiones:
+                return False
+            self._sesiones[token_hash][2] = True
+            return True
+
+
+# --- ARCHIVOS Y MIGRACIONES ---
+
+def rutas_particiones(config):
+    """Archivos de las particiones ('<DATABASE sin extensión>.particionN.db' por defecto)."""
+    if config.get('STORAGE_BACKEND', 'sqlite') != 'particionado':
+        return []
+    if config.get('STORAGE_SHARD_PATHS'):
+        return list(config['STORAGE_SHARD_PATHS'])
+    base = os.path.splitext(config['DATABASE'])[0]
+    return [f"{base}.particion{numero}.db" for numero in range(config.get('STORAGE_SHARDS', 4))]
+
+
+def rutas(config):
+    """Todos los archivos SQLite de la aplicación: DATABASE y, si las hay, las particiones."""
+    return [config['DATABASE']] + rutas_particiones(config)
+
+
+def migrar(config):
+    """
+    Aplica las migraciones pendientes a DATABASE y a cada partición (todas llevan el mismo
+    esquema, aunque cada una solo use sus tablas). Devuelve {ruta: versiones aplicadas}.
+    """
+    return {ruta: migraciones.migrar(ruta) for ruta in rutas(config)}
+
+
+TABLAS_PARTICIONADAS = (
+    # (tabla, columna con el id del usuario, columnas que se copian)
+    ('usuarios', 'id', ', '.join(COLUMNAS_USUARIO)),
+    ('objetivos', 'id_usuario', 'id, id_usuario, objetivo_texto, completado, fecha_creacion'),
+    ('sesiones', 'id_usuario', 'token_hash, id_usuario, caduca, revocado'),
+    ('historial', 'id_usuario', 'id, id_usuario, categoria, datos, recomendacion, fecha'),
+)
+
+
+def repartir(config):
+    """
+    Copia a cada partición los usuarios de DATABASE que le corresponden, con sus objetivos,
+    sesiones e historial, para pasar una instalación existente al backend particionado o
+    llevar a las particiones los usuarios importados con la CLI (los triggers de la
+    partición rehacen sus contadores y resúmenes). Se puede repetir: lo ya copiado se
+    omite. Las filas de DATABASE se conservan, pero este backend solo lee de ellas los
+    nombres de usuario. Devuelve {ruta: {tabla: filas copiadas}}.
+    """
+    particiones = rutas_particiones(config)
+    copiados = {}
+    for numero, ruta in enumerate(particiones):
+        with contextlib.closing(sqlite3.connect(ruta)) as conn:
+            conn.execute('ATTACH DATABASE ? AS principal', (config['DATABASE'],))
+            with conn:
+                # Los usuarios primero: el resto de tablas apunta a ellos
+                copiados[ruta] = {
+                    tabla: conn.execute(f'''
+                        INSERT OR IGNORE INTO main.{tabla} ({columnas})
+                        SELECT {columnas} FROM principal.{tabla} WHERE {clave} % ? = ?
+                    ''', (len(particiones), numero)).rowcount
+                    for tabla, clave, columnas in TABLAS_PARTICIONADAS
+                }
+            conn.execute('DETACH DATABASE principal')
+    return copiados
+
+
+# --- INTEGRACIÓN CON FLASK ---
+
+def _sqlite(app, ruta):
+    opciones = {
+        'tamano': app.config.get('DB_POOL_SIZE', 8),
+        'busy_timeout_ms': app.config.get('DB_BUSY_TIMEOUT_MS', 5000),
+        'cache_sentencias': app.config.get('DB_CACHED_STATEMENTS', 128),
+    }
+    return RepositorioSQLite(
+        basedatos.PoolConexiones(ruta, **opciones),
+        basedatos.PoolConexiones(ruta, solo_lectura=True, **opciones),
+    )
+
+
+def crear_repositorio(app):
+    backend = app.config.get('STORAGE_BACKEND', 'sqlite')
+    if backend == 'memoria':
+        return RepositorioMemoria()
+    if backend == 'sqlite':
+        return _sqlite(app, app.config['DATABASE'])
+    if backend == 'particionado':
+        particiones = [_sqlite(app, ruta) for ruta in rutas_particiones(app.config)]
+        return RepositorioParticionado(_sqlite(app, app.config['DATABASE']), particiones)
+    raise ValueError(f"STORAGE_BACKEND '{backend}' desconocido; opciones: {', '.join(BACKENDS)}.")
+
+
+def init_app(app):
+    """Crea el repositorio del backend configurado (las conexiones se abren al usarlas)."""
+    app.extensions['senda7_repositorio'] = crear_repositorio(app)
+    return app.extensions['senda7_repositorio']
+
+
+def get_repositorio(app=None):
+    app = app or current_app
+    return app.extensions['senda7_repositorio']
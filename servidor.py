@@ -0,0 +1,302 @@
+"""
+Servidor de producción con trabajadores preforkeados.
+
+El proceso principal aplica las migraciones, crea la aplicación, precarga lo que
+es de solo lectura (plantillas compiladas, reglas de recomendación, estáticos
+comprimidos) y después se bifurca en varios trabajadores que comparten el socket.
+Todo lo cargado antes del fork queda en memoria compartida (copy-on-write) entre
+los trabajadores; gc.freeze() evita que el recolector de basura la vaya copiando.
+
+Cada trabajador atiende las peticiones con un número fijo de hilos. El proceso
+principal vuelve a lanzar los trabajadores que mueran.
+
+Señales:
+    SIGHUP           recarga sin cortar el servicio: el proceso principal se reejecuta
+                     (carga el código nuevo) conservando el socket, lanza trabajadores
+                     nuevos y después detiene de forma ordenada los anteriores.
+    SIGTERM, SIGINT  parada ordenada: los trabajadores terminan las peticiones en curso.
+
+Uso:
+    python servidor.py --host 0.0.0.0 --puerto 8000
+    python servidor.py --trabajadores 4 --hilos 8 --registro-accesos
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+import metricas
+
+ENV_SOCKET = 'SENDA7_SOCKET_FD'
+ENV_ANTERIORES = 'SENDA7_TRABAJADORES_ANTERIORES'
+
+
+def trabajadores_por_defecto():
+    """Dos trabajadores por CPU más uno: cubre las esperas de E/S sin saturar las CPU."""
+    return 2 * (os.cpu_count() or 1) + 1
+
+
+# --- TRABAJADOR ---
+
+class ManejadorPeticiones(WSGIRequestHandler):
+    # Una conexión keep-alive inactiva no puede ocupar un hilo del trabajador indefinidamente
+    timeout = 5
+
+    def log_request(self, *args, **kwargs):
+        # Una línea por petición cuesta tiempo de CPU; solo con --registro-accesos
+        if self.server.registro_accesos:
+            super().log_request(*args, **kwargs)
+
+
+class ServidorTrabajador(BaseWSGIServer):
+    """Servidor WSGI sobre el socket heredado que atiende las peticiones con un pool de hilos fijo."""
+
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, host, puerto, app, hilos, fd, registro_accesos=False):
+        self.registro_accesos = registro_accesos
+        # Antes de super().__init__, que ya llama a server_close() al adoptar el socket heredado
+        self._hilos = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='senda7-peticion')
+        # Un hueco por hilo: sin hilos libres no se hace accept() y la conexión espera en
+        # la cola del socket a que la recoja otro trabajador (o un hilo de este que se libere)
+        self._libres = threading.BoundedSemaphore(hilos)
+        self._entregada = False
+        super().__init__(host, puerto, app, handler=ManejadorPeticiones, fd=fd)
+        # Varios procesos esperan en el mismo socket: el que no gana el accept() sigue esperando
+        self.socket.setblocking(False)
+
+    def _handle_request_noblock(self):
+        # Con espera acotada para que serve_forever siga atendiendo shutdown()
+        if not self._libres.acquire(timeout=0.5):
+            return
+        self._entregada = False
+        try:
+            super()._handle_request_noblock()
+        finally:
+            # Otro trabajador ganó el accept() o la conexión no llegó a un hilo
+            if not self._entregada:
+                self._libres.release()
+
+    def process_request(self, request, client_address):
+        self._hilos.submit(self._atender, request, client_address)
+        self._entregada = True
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._libres.release()
+
+    def cerrar(self):
+        """Cierra el socket y espera a que terminen las peticiones en curso."""
+        self.server_close()
+        self._hilos.shutdown(wait=True)
+
+
+def cerrar_aplicacion(app):
+    """Libera lo que la aplicación tenga en marcha en este proceso (historial, métricas, pools)."""
+    app.extensions['senda7_historial'].detener()
+    extension_metricas = app.extensions['senda7_metricas']
+    if extension_metricas.directorio:
+        extension_metricas.volcar()
+    app.extensions['senda7_hashing'].cerrar()
+    app.extensions['senda7_pool'].cerrar_todas()
+    app.extensions['senda7_repositorio'].cerrar()
+
+
+def ejecutar_trabajador(app, sock, host, hilos, registro_accesos=False):
+    for senal in (signal.SIGHUP, signal.SIGINT):
+        signal.signal(senal, signal.SIG_IGN)
+    servidor = ServidorTrabajador(host, sock.getsockname()[1], app, hilos, sock.fileno(), registro_accesos)
+
+    def parar(*_):
+        # shutdown() espera a que termine serve_forever, así que se llama desde otro hilo
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, parar)
+
+    try:
+        servidor.serve_forever(poll_interval=0.5)
+    finally:
+        servidor.cerrar()
+        cerrar_aplicacion(app)
+
+
+# --- PROCESO PRINCIPAL ---
+
+class Maestro:
+    def __init__(self, app, sock, host, trabajadores, hilos, registro_accesos=False, espera_parada=30.0):
+        self.app = app
+        self.sock = sock
+        self.host = host
+        self.trabajadores = trabajadores
+        self.hilos = hilos
+        self.registro_accesos = registro_accesos
+        self.espera_parada = espera_parada
+        self.directorio_metricas = app.config.get('METRICS_DIR')
+        self.pids = {}  # pid -> momento de arranque
+        self.saliendo = set()  # trabajadores de la generación anterior que terminan sus peticiones
+        self._senal = None
+
+    def lanzar_trabajador(self):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                ejecutar_trabajador(self.app, self.sock, self.host, self.hilos, self.registro_accesos)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                codigo = 1
+            finally:
+                os._exit(codigo)
+        self.pids[pid] = time.monotonic()
+
+    def _recibir_senal(self, senal, _frame):
+        self._senal = senal
+
+    def _recoger_hijos(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.directorio_metricas and (pid in self.pids or pid in self.saliendo):
+                metricas.archivar_proceso(self.directorio_metricas, pid)
+            if pid in self.pids:
+                arranque = self.pids.pop(pid)
+                if self._senal is None:
+                    print(f"El trabajador {pid} ha terminado; se lanza otro.")
+                    if time.monotonic() - arranque < 1.0:
+                        time.sleep(1.0)  # evita un bucle de relanzamientos si falla al arrancar
+                    self.lanzar_trabajador()
+            self.saliendo.discard(pid)
+
+    def _terminar(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def recargar(self):
+        """Se reejecuta con el código actual, pasando el socket y los trabajadores que deben terminar."""
+        print("Recargando...")
+        self.sock.set_inheritable(True)
+        os.environ[ENV_SOCKET] = str(self.sock.fileno())
+        os.environ[ENV_ANTERIORES] = ','.join(str(pid) for pid in self.pids.keys() | self.saliendo)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def parar(self):
+        print("Deteniendo los trabajadores...")
+        self._terminar(self.pids.keys() | self.saliendo)
+        limite = time.monotonic() + self.espera_parada
+        while (self.pids or self.saliendo) and time.monotonic() < limite:
+            self._recoger_hijos()
+            time.sleep(0.1)
+        self._terminar(self.pids.keys() | self.saliendo)  # segundo aviso a los que sigan vivos
+
+    def ejecutar(self, anteriores=()):
+        signal.signal(signal.SIGHUP, self._recibir_senal)
+        signal.signal(signal.SIGTERM, self._recibir_senal)
+        signal.signal(signal.SIGINT, self._recibir_senal)
+
+        # Lo cargado hasta aquí no cambia: se aparta del recolector para que no ensucie las páginas compartidas
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.trabajadores):
+            self.lanzar_trabajador()
+        # Los trabajadores de la generación anterior (tras una recarga) terminan cuando ya hay nuevos
+        self.saliendo.update(anteriores)
+        self._terminar(anteriores)
+        print(f"Servidor en http://{self.host}:{self.sock.getsockname()[1]} "
+              f"({self.trabajadores} trabajadores x {self.hilos} hilos, proceso principal {os.getpid()})")
+
+        while True:
+            time.sleep(0.5)
+            self._recoger_hijos()
+            if self._senal == signal.SIGHUP:
+                self.recargar()
+            elif self._senal is not None:
+                self.parar()
+                return
+
+
+def abrir_socket(host, puerto):
+    """Reutiliza el socket de la generación anterior (recarga) o abre uno nuevo."""
+    if ENV_SOCKET in os.environ:
+        return socket.socket(fileno=int(os.environ.pop(ENV_SOCKET)))
+    familia = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, puerto))
+    sock.listen(2048)
+    return sock
+
+
+def precargar(app):
+    """
+    Compila todas las plantillas y carga el índice de nombres de usuario en el proceso
+    principal para que los trabajadores los hereden.
+    """
+    for nombre in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nombre)
+    import disponibilidad
+    import repositorio
+    repo = repositorio.get_repositorio(app)
+    try:
+        disponibilidad.get_indice(app).sincronizar(repo)
+    finally:
+        # Las conexiones abiertas en el proceso principal no deben pasar a los hijos
+        repo.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('SENDA7_HOST', '127.0.0.1'))
+    parser.add_argument('--puerto', type=int, default=int(os.environ.get('SENDA7_PUERTO', 8000)))
+    parser.add_argument('--trabajadores', type=int, default=int(os.environ.get('SENDA7_TRABAJADORES', 0)) or None,
+                        help="procesos trabajadores (por defecto, 2 x CPU + 1)")
+    parser.add_argument('--hilos', type=int, default=int(os.environ.get('SENDA7_HILOS', 4)),
+                        help="hilos por trabajador")
+    parser.add_argument('--registro-accesos', action='store_true',
+                        help="escribe una línea por petición en la salida de errores")
+    args = parser.parse_args()
+    trabajadores = args.trabajadores or trabajadores_por_defecto()
+
+    anteriores = [int(pid) for pid in os.environ.pop(ENV_ANTERIORES, '').split(',') if pid]
+    sock = abrir_socket(args.host, args.puerto)
+
+    import repositorio
+    from app import crear_app
+    app = crear_app({
+        # Los trabajadores ya son procesos: el hash se calcula en el hilo de la petición
+        # (hashlib.scrypt libera el GIL) en lugar de abrir un pool de procesos en cada uno
+        'HASH_POOL_WORKERS': 0,
+        'DB_POOL_SIZE': args.hilos,
+        # /metrics suma los contadores que cada trabajador vuelca en este directorio
+        'METRICS_DIR': os.environ.get('SENDA7_METRICS_DIR')
+        or os.path.join(tempfile.gettempdir(), f'senda7-metricas-{args.puerto}'),
+    })
+    repositorio.migrar(app.config)
+    precargar(app)
+    if not anteriores:
+        # Tras una recarga los trabajadores anteriores siguen contando; al arrancar, no
+        metricas.limpiar_directorio(app.config['METRICS_DIR'])
+
+    Maestro(app, sock, args.host, trabajadores, args.hilos, args.registro_accesos).ejecutar(anteriores)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import datetime
+import hashlib
+import secrets
+import time
+import jwt
+from flask import current_app
+from cache import CacheLRU
+from repositorio import get_repositorio
+
+# --- TOKENS JWT CON RENOVACIÓN DESLIZANTE ---
+
+COOKIE_TOKEN = 'token'
+COOKIE_REFRESH = 'refresh_token'
+CABECERA_TOKEN_RENOVADO = 'X-Token-Renovado'
+
+
+def init_app(app):
+    """Crea la memoria de tokens ya verificados de la aplicación."""
+    app.extensions['senda7_tokens_memo'] = CacheLRU(app.config.get('TOKEN_MEMO_SIZE', 8192))
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _clave_sesion(refresh_token):
+    # Lo que precede al último punto es el prefijo del repositorio (p. ej. la partición) y se
+    # guarda en claro para localizar la sesión; el resto es el digest del token entero
+    prefijo, punto, _ = refresh_token.rpartition('.')
+    return prefijo + punto + _digest(refresh_token)
+
+
+def emitir_token(user_id):
+    """Genera un token de acceso JWT con la duración configurada."""
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    return jwt.encode({
+        'user_id': user_id,
+        'iat': ahora,
+        'exp': ahora + current_app.config['TOKEN_LIFETIME'],
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
+
+
+def token_de_cabecera(request):
+    """Devuelve el token de una cabecera 'Authorization: Bearer <token>', o None."""
+    cabecera = request.headers.get('Authorization', '')
+    tipo, _, token = cabecera.partition(' ')
+    if tipo.lower() == 'bearer' and token.strip():
+        return token.strip()
+    return None
+
+
+def decodificar_token(token):
+    """
+    Verifica y decodifica el token de acceso.
+    Los tokens ya verificados se recuerdan (por su digest) hasta que caducan,
+    de modo que las peticiones repetidas no vuelven a comprobar la firma.
+    Lanza las mismas excepciones que jwt.decode.
+    """
+    memo = current_app.extensions['senda7_tokens_memo']
+    clave = _digest(token)
+    data = memo.obtener(clave)
+    if data is not None:
+        return data
+
+    data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+    restante = data['exp'] - time.time()
+    if restante > 0:
+        memo.guardar(clave, data, ttl=restante)
+    return data
+
+
+def debe_renovarse(data):
+    """Indica si al token le queda menos del margen configurado para caducar."""
+    margen = current_app.config['TOKEN_REFRESH_MARGIN'].total_seconds()
+    return data['exp'] - time.time() < margen
+
+
+# --- REFRESH TOKENS REVOCABLES ---
+
+def crear_refresh_token(user_id):
+    """Crea un refresh token opaco y guarda solo su digest como sesión del usuario."""
+    repo = get_repositorio()
+    token = repo.prefijo_sesion(user_id) + secrets.token_urlsafe(32)
+    caduca = datetime.datetime.now(datetime.timezone.utc) + current_app.config['REFRESH_TOKEN_LIFETIME']
+    repo.crear_sesion(_clave_sesion(token), user_id, caduca.timestamp())
+    return token
+
+
+def usar_refresh_token(token):
+    """Devuelve el id del usuario si el refresh token es válido, no ha caducado y no fue revocado."""
+    return get_repositorio().usuario_de_sesion(_clave_sesion(token), time.time())
+
+
+def revocar_refresh_token(token):
+    """Marca el refresh token como revocado."""
+    get_repositorio().revocar_sesion(_clave_sesion(token))
+
+
+# --- COOKIES ---
+
+def establecer_cookies(response, token, refresh_token=None):
+    """Guarda el token de acceso (y opcionalmente el refresh token) en cookies httponly."""
+    response.set_cookie(COOKIE_TOKEN, token, httponly=True, samesite='Lax')
+    if refresh_token:
+        response.set_cookie(
+            COOKIE_REFRESH, refresh_token, httponly=True, samesite='Lax',
+            max_age=int(current_app.config['REFRESH_TOKEN_LIFETIME'].total_seconds()),
+        )
+    return response
+
+
+def borrar_cookies(response):
+    """Elimina las cookies de sesión."""
+    response.delete_cookie(COOKIE_TOKEN)
+    response.delete_cookie(COOKIE_REFRESH)
+    return response